@@ -4,6 +4,57 @@ __author__ = 'Hugo Berg'
 __email__ = 'hb11002@icloud.com'
 __version__ = '0.1.5'
 
+import importlib
+import sys
+from types import ModuleType
+
 import rocket_snake.constants as constants
 import rocket_snake.custom_exceptions as exceptions
-from rocket_snake.client import RLS_Client
+
+# These are imported the first time they are used, since the client imports aiohttp which is slow to import.
+# Structure: {attribute name: (module name, attribute in module or None for the module itself)}
+_lazy_attributes = {
+    "RLS_Client": ("rocket_snake.client", "RLS_Client"),
+    "client": ("rocket_snake.client", None),
+    "crawler": ("rocket_snake.crawler", None),
+    "basic_requests": ("rocket_snake.basic_requests", None),
+    "data_classes": ("rocket_snake.data_classes", None),
+    "gateway": ("rocket_snake.gateway", None),
+    "hedging": ("rocket_snake.hedging", None),
+    "identity_map": ("rocket_snake.identity_map", None),
+    "jobs": ("rocket_snake.jobs", None),
+    "leaderboards": ("rocket_snake.leaderboards", None),
+    "monitoring": ("rocket_snake.monitoring", None),
+    "player_cache": ("rocket_snake.player_cache", None),
+    "population": ("rocket_snake.population", None),
+    "rank_history": ("rocket_snake.rank_history", None),
+    "negative_cache": ("rocket_snake.negative_cache", None),
+    "response_cache": ("rocket_snake.response_cache", None),
+    "search_index": ("rocket_snake.search_index", None),
+    "serialization": ("rocket_snake.serialization", None),
+    "simulation": ("rocket_snake.simulation", None),
+    "tiers": ("rocket_snake.tiers", None),
+}
+
+
+class _LazyModule(ModuleType):
+    """The type of this package, which imports the attributes in _lazy_attributes when they are first accessed."""
+
+    def __getattr__(self, name):
+        if name not in _lazy_attributes:
+            raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+        module_name, attribute_name = _lazy_attributes[name]
+        value = importlib.import_module(module_name)
+        if attribute_name is not None:
+            value = getattr(value, attribute_name)
+
+        # We only do this once, the next access is a normal attribute lookup
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(_lazy_attributes))
+
+
+sys.modules[__name__].__class__ = _LazyModule
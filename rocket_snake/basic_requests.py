@@ -15,10 +15,12 @@
 """
 
 import asyncio
+import functools
+import itertools
 import json
 import time
 import urllib.parse as url_parser
-from collections import deque
+from collections import OrderedDict, deque
 from sys import exc_info
 from traceback import format_exception
 
@@ -26,11 +28,41 @@ import aiohttp
 import async_timeout
 
 from . import custom_exceptions
+from .monitoring import PHASE_BODY, PHASE_CONNECT, PHASE_DECODE, PHASE_ERROR, PHASE_HTTP, PHASE_OFFLOADED_DECODE, \
+    PHASE_QUEUE, PHASE_TTFB
 
 # This is used to keep track of the queues for each key, structure: {API_KEY: deque([task1, task2, task3])}
 ratelimit_key_queue_map = {}
-# This is used to keep track of the last times a key was used, structure: {API_KEY: float (time.time())}
+# This is used to keep track of the last times a key was used, structure: {API_KEY: float (clock())}
 ratelimit_key_time_map = {}
+# This is used to keep track of how long each request holds the front of the queue, as an exponential moving average,
+# structure: {API_KEY: float (seconds)}
+ratelimit_key_service_time_map = {}
+
+# The least amount of time we allow between requests with the same key, which means the request budget is 1 / this per second
+# This is a big optimizer, but the best value depends on a users ping to the api server. The optimal value can be calculated by ((0.5 seconds) - (user_ping in seconds)) + safety_margin
+throughput_time_seconds = 0.5
+
+# The url all endpoints are relative to (the api version is appended to this)
+api_url = "http://api.rocketleaguestats.com/v"
+
+# The clock the ratelimiting uses, a function that returns seconds. The simulator replaces this with its virtual clock
+clock = time.time
+# The clock the times passed to trace functions are from
+trace_clock = time.perf_counter
+
+# Unique numbers for the requests in the ratelimiting queues, so requests queued at the same time can't be mixed up
+_task_numbers = itertools.count()
+
+# This is used to remember the validators of responses, so they can be sent with conditional requests,
+# structure: OrderedDict({(endpoint, params, parser): (etag, last_modified, parsed_response)}),
+# least recently used first
+response_validator_map = OrderedDict()
+# The maximum amount of responses that are remembered in response_validator_map
+response_validator_map_size = 256
+
+# Responses this long or longer (in characters) are parsed in the parse executor, if one is given to basic_request
+parse_offload_length = 65536
 
 
 def _get_float(data, default):
@@ -47,46 +79,210 @@ def _get_int(data, default):
         return default
 
 
+def estimated_wait(api_key: str):
+    """
+    Estimates how long a new rate limited request with a key would have to wait before it's sent, in seconds.
+    That is the spacing left since the last request, plus one turn for each request in the queue, where each turn is
+    assumed to take as long as requests recently have, but never less than throughput_time_seconds.
+    """
+    queue_length = len(ratelimit_key_queue_map.get(api_key, ()))
+    spacing_left = 0.0 if api_key not in ratelimit_key_time_map else \
+        max(0.0, throughput_time_seconds - (clock() - ratelimit_key_time_map[api_key]))
+
+    return spacing_left + queue_length * max(throughput_time_seconds, ratelimit_key_service_time_map.get(api_key, 0))
+
+
+def _create_session(loop: asyncio.AbstractEventLoop, trace_configs: list = None):
+    if trace_configs:
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False), loop=loop,
+                                     trace_configs=trace_configs)
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False), loop=loop)
+
+
+# A function that creates the HTTP session for a request from the event loop and a list of aiohttp.TraceConfig objects
+# (or None). The simulator replaces this with one that creates sessions to its modeled server
+session_factory = _create_session
+
+
+def _connection_trace_configs(trace, endpoint: str):
+    """Creates the trace configs that report the connection setup of a request to trace, if aiohttp supports it."""
+    if not hasattr(aiohttp, "TraceConfig"):
+        # aiohttp 2 doesn't have tracing
+        return None
+
+    async def on_connection_create_start(session, context, params):
+        context.connect_start = trace_clock()
+
+    async def on_connection_create_end(session, context, params):
+        trace(PHASE_CONNECT, context.connect_start, trace_clock(), endpoint)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return [trace_config]
+
+
+def _validator_key(endpoint: str, params: dict, parser=None):
+    return endpoint, tuple(sorted((str(key), str(value)) for key, value in (params or {}).items())), \
+        None if parser is None else "{0}.{1}".format(getattr(parser, "__module__", None),
+                                                     getattr(parser, "__qualname__", repr(parser)))
+
+
+def _cache_key(endpoint: str, params: dict, json_data):
+    return endpoint, tuple(sorted((str(key), str(value)) for key, value in (params or {}).items())), \
+        None if json_data is None else json.dumps(json_data, sort_keys=True)
+
+
+def _parse_response_text(response_text: str, parser=None):
+    """Decodes a JSON response and applies the parser to it, if there is one. Runs in parse executors."""
+    parsed_response = json.loads(response_text)
+    return parsed_response if parser is None else parser(parsed_response)
+
+
+async def _decode_response(loop: asyncio.AbstractEventLoop, response_text, endpoint: str, parser=None,
+                           parse_executor=None, trace=None):
+    """Decodes and parses a response, in the parse executor if it's big enough (see basic_request)."""
+    decode_start = trace_clock()
+    if parse_executor is not None and len(response_text) >= parse_offload_length:
+        # Big responses would block the event loop for too long
+        parsed_response = await loop.run_in_executor(parse_executor, _parse_response_text, response_text, parser)
+        decode_phase = PHASE_OFFLOADED_DECODE
+    else:
+        parsed_response = _parse_response_text(response_text, parser)
+        decode_phase = PHASE_DECODE
+
+    if trace is not None:
+        trace(decode_phase, decode_start, trace_clock(), endpoint)
+
+    return parsed_response
+
+
 async def basic_request(loop: asyncio.AbstractEventLoop, api_key: str, timeout_seconds: float, endpoint: str, *args,
-                        method: str = "get", handle_ratelimiting: bool = False, _cur_retry: int = 6, **kwargs):
-    """Does a basic request. Not threadsafe for the same api key with multiple clients."""
+                        method: str = "get", handle_ratelimiting: bool = False, use_validators: bool = False,
+                        max_queue_depth: int = None, max_queue_wait_seconds: float = None, parser=None,
+                        parse_executor=None, trace=None, cache=None, bypass_cache: bool = False,
+                        base_url: str = None, _cur_retry: int = 6, **kwargs):
+    """
+    Does a basic request. Not threadsafe for the same api key with multiple clients.
+    If use_validators is True, GET requests send the ETag and Last-Modified validators of the previous response to the
+    same endpoint and params, and if the server responds with 304 the previously parsed response is returned.
+    If handle_ratelimiting is True, and the queue for the key is longer than max_queue_depth or the estimated wait is
+    longer than max_queue_wait_seconds, a QueueFullError is raised instead of queueing the request.
+    If parser is given, it's called with the decoded JSON and its result is returned instead.
+    If parse_executor (a :class:`concurrent.futures.Executor`) is given, responses that are at least
+    parse_offload_length long are decoded and parsed in it instead of on the event loop.
+    For process pool executors, parser has to be a module level function.
+    If trace is given, it's called with (phase, start, end, endpoint) after each phase of the request (see the
+    PHASE_* constants in :mod:`monitoring`), where start and end are trace_clock (:func:`time.perf_counter`) times.
+    If cache (a :class:`response_cache.ResponseCache`) is given, fresh responses in it are returned without doing a
+    request, and if the server responds with 5xx or 429, a stale response in it is returned (with the status code of
+    the error) instead of raising an exception, if the cache allows it. If bypass_cache is True, the request is done
+    even if there is a fresh response in the cache (and the cache is updated with the new response).
+    If base_url is given, the endpoint is relative to it instead of api_url (for example to use a gateway).
+    """
+
+    url = (api_url if base_url is None else base_url) + endpoint
 
     global ratelimit_key_queue_map, ratelimit_key_time_map
 
-    api_url = "http://api.rocketleaguestats.com/v"
-
     if "headers" not in kwargs:
         kwargs["headers"] = {}
 
     kwargs["headers"]["Authorization"] = api_key
 
+    cache_key = None
+    cached_response = None
+    if cache is not None:
+        cache_key = _cache_key(endpoint, kwargs.get("params", None), kwargs.get("json", None))
+        cached_response = cache.get(cache_key, count=not bypass_cache)
+
+        if cached_response is not None and cached_response[1] and not bypass_cache:
+            # It's fresh, so we don't need to wait for the ratelimiting or do a request
+            return 200, await _decode_response(loop, cached_response[0], endpoint, parser, parse_executor, trace)
+
+    validator_key = None
+    validated_response = None
+    if use_validators and method == "get":
+        validator_key = _validator_key(endpoint, kwargs.get("params", None), parser)
+        validated_response = response_validator_map.get(validator_key, None)
+
+        if validated_response is not None:
+            response_validator_map.move_to_end(validator_key)
+            if validated_response[0] is not None:
+                kwargs["headers"]["If-None-Match"] = validated_response[0]
+            if validated_response[1] is not None:
+                kwargs["headers"]["If-Modified-Since"] = validated_response[1]
+
     if handle_ratelimiting:
         key_queue = ratelimit_key_queue_map.get(api_key, None)
 
-        our_task_num = time.time()
+        # We don't queue requests that would wait for too long anyway
+        if max_queue_depth is not None and key_queue is not None and len(key_queue) >= max_queue_depth:
+            raise custom_exceptions.QueueFullError(
+                    "There are already {0} requests queued for this API key, which is the maximum."
+                    .format(len(key_queue)))
+        if max_queue_wait_seconds is not None and estimated_wait(api_key) > max_queue_wait_seconds:
+            raise custom_exceptions.QueueFullError(
+                    "The estimated wait for this API key is {0} seconds, which is more than the maximum of {1} seconds."
+                    .format(round(estimated_wait(api_key), 3), max_queue_wait_seconds))
+
+        our_task_num = next(_task_numbers)
+        queue_start = trace_clock()
 
         if key_queue is None or len(key_queue) == 0:
             ratelimit_key_queue_map[api_key] = deque([our_task_num])
         else:
             ratelimit_key_queue_map[api_key].append(our_task_num)
 
-        # We wait until it's our turn
-        while ratelimit_key_queue_map[api_key][0] != our_task_num:
-            # Basically, this shouldn't be too large because that increases latency, but not too small because that increases cpu usage.
-            await asyncio.sleep(0.1)
-
-        # Now it's our turn
-        # The least amount of time we allow between requests
-        # This is a big optimizer, but the best value depends on a users ping to the api server. The optimal value can be calculated by ((0.5 seconds) - (user_ping in seconds)) + safety_margin
-        throughput_time_seconds = 0.5
-        if time.time() - ratelimit_key_time_map.get(api_key, 0) < throughput_time_seconds:
-            await asyncio.sleep(throughput_time_seconds - (time.time() - ratelimit_key_time_map[api_key]))
+        try:
+            # We wait until it's our turn
+            while ratelimit_key_queue_map[api_key][0] != our_task_num:
+                # Basically, this shouldn't be too large because that increases latency, but not too small because that increases cpu usage.
+                await asyncio.sleep(0.1)
+
+            # Now it's our turn
+            our_turn_time = clock()
+            # A key that hasn't been used doesn't have to wait, whatever the clock's epoch is
+            spacing_left = 0.0 if api_key not in ratelimit_key_time_map else \
+                throughput_time_seconds - (our_turn_time - ratelimit_key_time_map[api_key])
+            if spacing_left > 0:
+                await asyncio.sleep(spacing_left)
+        except BaseException:
+            # If we are cancelled while waiting, we can't keep our place in the queue, or nobody after us would get a turn
+            try:
+                ratelimit_key_queue_map[api_key].remove(our_task_num)
+            except ValueError:
+                pass
+            raise
+
+        if trace is not None:
+            trace(PHASE_QUEUE, queue_start, trace_clock(), endpoint)
 
     try:
+        http_start = trace_clock()
         with async_timeout.timeout(timeout_seconds, loop=loop):
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False), loop=loop) as session:
-                async with getattr(session, method)(api_url + endpoint, *args, **kwargs) as response:
+            async with session_factory(loop, None if trace is None else _connection_trace_configs(trace, endpoint)) \
+                    as session:
+                async with getattr(session, method)(url, *args, **kwargs) as response:
+                    if trace is not None:
+                        headers_time = trace_clock()
+                        trace(PHASE_TTFB, http_start, headers_time, endpoint)
+
+                    if response.status == 304 and validated_response is not None:
+                        # Nothing has changed since the last time, so we don't need to read or parse anything
+                        if trace is not None:
+                            trace(PHASE_HTTP, http_start, trace_clock(), endpoint)
+                        if cached_response is not None:
+                            # The cached response is the same as the current one, so it's fresh again
+                            cache.store(cache_key, cached_response[0])
+                        return response.status, validated_response[2]
+
                     response_text = await response.text()
+                    if trace is not None:
+                        body_time = trace_clock()
+                        trace(PHASE_BODY, headers_time, body_time, endpoint)
+                        trace(PHASE_HTTP, http_start, body_time, endpoint)
+
                     if response.status == 429:
                         # If we should handle this we wait for the rate-limit period to end
                         if handle_ratelimiting:
@@ -98,7 +294,17 @@ async def basic_request(loop: asyncio.AbstractEventLoop, api_key: str, timeout_s
                                 return await basic_request(loop=loop, api_key=api_key, timeout_seconds=timeout_seconds,
                                                            endpoint=endpoint, *args, method=method,
                                                            handle_ratelimiting=handle_ratelimiting,
+                                                           use_validators=use_validators,
+                                                           max_queue_depth=max_queue_depth,
+                                                           max_queue_wait_seconds=max_queue_wait_seconds,
+                                                           parser=parser, parse_executor=parse_executor,
+                                                           trace=trace, cache=cache, bypass_cache=bypass_cache,
+                                                           base_url=base_url,
                                                            _cur_retry=_cur_retry - 1, **kwargs)
+                        stale_response = cache.get_stale(cached_response) if cache is not None else None
+                        if stale_response is not None:
+                            return response.status, await _decode_response(loop, stale_response, endpoint, parser,
+                                                                           parse_executor, trace)
                         raise custom_exceptions.RateLimitError(
                                 "The HTTP response code was 429, which means you were rate-limited.")
                     elif response.status == 404:
@@ -108,26 +314,56 @@ async def basic_request(loop: asyncio.AbstractEventLoop, api_key: str, timeout_s
                         raise custom_exceptions.InvalidAPIKeyError(
                                 "The HTTP response code was 401, which means that your API key wasn't valid.")
                     elif response.status >= 300:
+                        stale_response = cache.get_stale(cached_response) \
+                            if cache is not None and response.status >= 500 else None
+                        if stale_response is not None:
+                            return response.status, await _decode_response(loop, stale_response, endpoint, parser,
+                                                                           parse_executor, trace)
+
                         # We make sure we don't leak the API key
                         kwargs["headers"]["Authorization"] = "Not included in log to prevent leaking."
-                        raise custom_exceptions.APIBadResponseCodeError(
+                        error_start = trace_clock()
+                        error = custom_exceptions.APIBadResponseCodeError(
                                 "The HTTP response code was {0}, which is not a good one. \n"
                                 "The response headers were: \n{6}\n"
                                 "The response was: \n{2}\n"
                                 "The query headers were: \n{1}\n"
                                 "The query was a {3} one, and the endpoint was {4}.\n{5}"
                                     .format(response.status, kwargs["headers"],
-                                            "\n\t".join((await response.text()).split("\n")), method.upper(),
-                                            api_url + endpoint,
+                                            "\n\t".join(response_text.split("\n")), method.upper(),
+                                            url,
                                             "The json data sent to the endpoint by the API was:\n{0}\n"
                                             .format(kwargs["json"]) if "json" in kwargs else "",
                                             dict(response.headers)))
-                    return response.status, json.loads(response_text)
+                        if trace is not None:
+                            trace(PHASE_ERROR, error_start, trace_clock(), endpoint)
+                        raise error
+
+                    parsed_response = await _decode_response(loop, response_text, endpoint, parser, parse_executor,
+                                                             trace)
+
+                    if cache_key is not None:
+                        cache.store(cache_key, response_text)
+
+                    if validator_key is not None:
+                        etag = response.headers.get("ETag", None)
+                        last_modified = response.headers.get("Last-Modified", None)
+
+                        if etag is None and last_modified is None:
+                            # The server doesn't support validators for this, so we don't keep anything around
+                            response_validator_map.pop(validator_key, None)
+                        else:
+                            response_validator_map[validator_key] = (etag, last_modified, parsed_response)
+                            response_validator_map.move_to_end(validator_key)
+                            while len(response_validator_map) > response_validator_map_size:
+                                response_validator_map.popitem(last=False)
+
+                    return response.status, parsed_response
     except (asyncio.TimeoutError, json.JSONDecodeError, UnicodeDecodeError) as e:
         # We didn't succeed with loading the url
         raise custom_exceptions.APIServerError(
                 "Got an error when trying to request {0} from the api. More info:\n\n{1}".format(
-                        api_url + endpoint, "".join(format_exception(*exc_info()))))
+                        url, "".join(format_exception(*exc_info()))))
 
     finally:
 
@@ -140,18 +376,29 @@ async def basic_request(loop: asyncio.AbstractEventLoop, api_key: str, timeout_s
                     pass
 
             # We set the last time this key was used
-            ratelimit_key_time_map[api_key] = time.time()
+            ratelimit_key_time_map[api_key] = clock()
+
+            service_time = ratelimit_key_time_map[api_key] - our_turn_time
+            ratelimit_key_service_time_map[api_key] = service_time if api_key not in ratelimit_key_service_time_map \
+                else 0.8 * ratelimit_key_service_time_map[api_key] + 0.2 * service_time
 
 
 def _add_request_parameters(func):
     """A decorator that adds some parameters to the decorated function, so those can be passed to basic_request."""
 
     # The function the decorator returns
+    @functools.wraps(func)
     async def decorated_func(*args, api_key: str = "", handle_ratelimiting: bool = False, timeout_seconds: float = 15,
-                             api_version: int = 1, loop: asyncio.AbstractEventLoop = None, **kwargs):
+                             api_version: int = 1, loop: asyncio.AbstractEventLoop = None,
+                             use_validators: bool = False, max_queue_depth: int = None,
+                             max_queue_wait_seconds: float = None, parser=None, parse_executor=None, trace=None,
+                             cache=None, bypass_cache: bool = False, base_url: str = None, **kwargs):
         return await func(*args, api_key=api_key, loop=loop,
                           handle_ratelimiting=handle_ratelimiting, api_version=api_version,
-                          timeout_seconds=timeout_seconds)
+                          timeout_seconds=timeout_seconds, use_validators=use_validators,
+                          max_queue_depth=max_queue_depth, max_queue_wait_seconds=max_queue_wait_seconds,
+                          parser=parser, parse_executor=parse_executor, trace=trace, cache=cache,
+                          bypass_cache=bypass_cache, base_url=base_url)
 
     return decorated_func
 
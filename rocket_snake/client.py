@@ -1,8 +1,34 @@
 import asyncio
-
-from . import basic_requests, custom_exceptions, data_classes
+import itertools
+import json
+import os
+import time
+
+from . import basic_requests, custom_exceptions, data_classes, leaderboards
+from .hedging import Hedger
+from .identity_map import PlayerIdentityMap
+from .monitoring import PHASE_BUILD, PHASE_REQUEST, LoopLagMonitor, SlowRequestLog
+from .negative_cache import NegativeCache
+from .player_cache import PlayerCache
+from .response_cache import ResponseCache
+from .search_index import PlayerSearchIndex
 from .constants import *
 
+# The version of the reference data snapshot file format, snapshots with other versions aren't loaded
+REFERENCE_SNAPSHOT_VERSION = 1
+
+
+def _parse_players(raw_players_data: list):
+    """Creates the players of a leaderboard. Module level, so it can run in a process pool."""
+    return [data_classes.Player.from_raw(raw_player_data) for raw_player_data in raw_players_data]
+
+
+def _parse_search_page(raw_page: dict):
+    """Creates the players of a search results page. Module level, so it can run in a process pool."""
+    page = dict(raw_page)
+    page["data"] = _parse_players(raw_page["data"])
+    return page
+
 
 class RLS_Client(object):
     """
@@ -14,17 +40,78 @@ class RLS_Client(object):
                 When this is True automatic ratelimiting is enabled.
     :param event_loop: The asyncio event loop that should be used.
                 If not supplied, the default one returned by ``asyncio.get_event_loop()`` is used.
+    :param conditional_requests: If the client should send the ETag and Last-Modified validators of previous responses,
+                so the api can respond with 304 Not Modified and the previously parsed response can be reused.
+                Servers that don't support validators are handled like normal.
+    :param search_index: An index that every player the client sees is added to, which lets
+                :func:`RLS_Client.search_player` answer searches without requests.
+                Pass ``True`` to use a new empty index, or an existing (e.g. loaded) index.
+    :param hedging: If slow requests should be hedged, that is, if a duplicate request should be sent when a request
+                is slower than most requests to the same endpoint (by default only :func:`RLS_Client.get_players`).
+                The first response is used. Duplicates are only sent when no other requests are waiting for the rate
+                limiting. Pass ``True`` to use the default settings, or a :class:`hedging.Hedger` to configure it.
+    :param max_queue_depth: The maximum number of requests that may wait for the ratelimiting (per api key).
+                Requests over it fail immediately with :class:`exceptions.QueueFullError`.
+    :param max_queue_wait_seconds: The maximum estimated time a request may have to wait for the ratelimiting
+                (see :attr:`RLS_Client.estimated_wait`). Requests over it fail immediately with
+                :class:`exceptions.QueueFullError`.
+    :param parse_executor: An executor to decode and parse big leaderboard and search responses in, instead of
+                on the event loop. Responses shorter than ``basic_requests.parse_offload_length`` are still parsed
+                on the event loop. A :class:`concurrent.futures.ProcessPoolExecutor` avoids the GIL.
+    :param monitor: A monitor that measures the lag of the event loop and records how long each phase of the client's
+                requests takes. It's started on the event loop of the client by the first request, and stopped by
+                :func:`RLS_Client.close`. Pass ``True`` to use the default settings.
+    :param response_cache: A cache of the api's responses, which is used for all requests. Fresh responses are used
+                without doing requests, and stale ones when the api responds with an error (see
+                :class:`response_cache.ResponseCache`). Pass ``True`` to use an in-memory cache with the default
+                settings.
+    :param negative_cache: Remembers the players the api couldn't find, so :func:`RLS_Client.get_player` and
+                :func:`RLS_Client.get_players` don't request them again until they expire from it. Pass ``True`` to use
+                the default settings.
+    :param player_cache: Keeps every player the client sees in any response (including leaderboards and searches),
+                and :func:`RLS_Client.get_player` and :func:`RLS_Client.get_players` use the ones that are fresh
+                instead of requesting them. Pass ``True`` to use the default settings.
+    :param identity_map: Makes the client return one shared :class:`data_classes.Player` object per player, which is
+                updated in place when newer data of the player arrives, instead of a new object for each response
+                (see :class:`identity_map.PlayerIdentityMap`). Pass ``True`` to use one.
+    :param slow_request_seconds: If supplied, requests that take at least this long are logged (see
+                :class:`monitoring.SlowRequestLog`, which is kept as ``slow_request_log``) with how long each of
+                their phases took.
+    :param api_url: The url the api is at, without the version, like ``basic_requests.api_url``. Use this to make the
+                client use a gateway (see :mod:`gateway`), like ``"http://localhost:8080/v"``.
     :param _api_version: What version endpoint to use.
              Do not change if you don't know what you're doing.
     :type api_key: :class:`str`
     :type auto_rate_limit: :class:`bool`, default is ``True``.
     :type event_loop: :class:`asyncio.AbstractEventLoop`
+    :type conditional_requests: :class:`bool`, default is ``False``.
+    :type search_index: :class:`search_index.PlayerSearchIndex` or :class:`bool`, default is ``None`` (no index).
+    :type hedging: :class:`hedging.Hedger` or :class:`bool`, default is ``None`` (no hedging).
+    :type max_queue_depth: :class:`int`, default is ``None`` (no maximum).
+    :type max_queue_wait_seconds: :class:`float`, default is ``None`` (no maximum).
+    :type parse_executor: :class:`concurrent.futures.Executor`, default is ``None`` (everything is parsed inline).
+    :type monitor: :class:`monitoring.LoopLagMonitor` or :class:`bool`, default is ``None`` (no monitoring).
+    :type response_cache: :class:`response_cache.ResponseCache` or :class:`bool`, default is ``None`` (no caching).
+    :type negative_cache: :class:`negative_cache.NegativeCache` or :class:`bool`, default is ``None``
+        (missing players are always requested).
+    :type player_cache: :class:`player_cache.PlayerCache` or :class:`bool`, default is ``None`` (players are always
+        requested).
+    :type identity_map: :class:`identity_map.PlayerIdentityMap` or :class:`bool`, default is ``None`` (every
+        response has new player objects).
+    :type slow_request_seconds: :class:`float`, default is ``None`` (no slow request log).
+    :type api_url: :class:`str`, default is ``None`` (``basic_requests.api_url``, the RLS api).
     :param _api_version: :class:`int`, default is ``1``.
 
     """
 
     def __init__(self, api_key: str = None, auto_rate_limit: bool = True,
-                 event_loop: asyncio.AbstractEventLoop = None, _api_version: int = 1):
+                 event_loop: asyncio.AbstractEventLoop = None, conditional_requests: bool = False,
+                 search_index: PlayerSearchIndex = None, hedging: Hedger = None, max_queue_depth: int = None,
+                 max_queue_wait_seconds: float = None, parse_executor=None,
+                 monitor: LoopLagMonitor = None, response_cache: ResponseCache = None,
+                 negative_cache: NegativeCache = None, player_cache: PlayerCache = None,
+                 identity_map: PlayerIdentityMap = None, slow_request_seconds: float = None, api_url: str = None,
+                 _api_version: int = 1):
 
         if api_key is None:
             raise custom_exceptions.NoAPIKeyError("No api key was supplied to client initialization.")
@@ -38,8 +125,307 @@ class RLS_Client(object):
         else:
             self._event_loop = event_loop
 
+        self.conditional_requests = conditional_requests
+
+        # Not "or None", an empty search index is falsy
+        self.search_index = PlayerSearchIndex() if search_index is True else \
+            (None if search_index is False else search_index)
+
+        self.hedger = Hedger() if hedging is True else (hedging or None)
+
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+
+        self.parse_executor = parse_executor
+
+        # The monitor is started by the first request, so creating a client doesn't leave a task running
+        self.monitor = LoopLagMonitor() if monitor is True else (monitor or None)
+
+        self.response_cache = ResponseCache() if response_cache is True else (response_cache or None)
+
+        # Not "or None", an empty negative cache is falsy
+        self.negative_cache = NegativeCache() if negative_cache is True else \
+            (None if negative_cache is False else negative_cache)
+        self.player_cache = PlayerCache() if player_cache is True else \
+            (None if player_cache is False else player_cache)
+        self.identity_map = PlayerIdentityMap() if identity_map is True else \
+            (None if identity_map is False else identity_map)
+
+        # The callables spans are traced to, see add_trace_hook
+        self._trace_hooks = []
+        self._request_ids = itertools.count()
+
+        self.slow_request_log = None
+        if slow_request_seconds is not None:
+            self.slow_request_log = SlowRequestLog(slow_request_seconds)
+            self.add_trace_hook(self.slow_request_log)
+
+        # The latest raw reference data (platforms, playlists, seasons and tiers), {name: raw data}
+        self._reference_data = {}
+        # When the reference data was fetched, {name: float (time.time())}
+        self._reference_data_times = {}
+        # If the reference data should be served from _reference_data instead of being requested, True after loading
+        # a snapshot
+        self._serve_reference_data = False
+        self._reference_refresh_task = None
+
+        self.api_url = api_url
+
         self._api_version = _api_version
 
+    def close(self):
+        """
+        Stops the background work of the client: the monitor and the refresh of the reference data.
+        The client can still be used, and a new request starts the monitor again.
+        """
+        if self.monitor is not None:
+            self.monitor.stop()
+        if self._reference_refresh_task is not None:
+            self._reference_refresh_task.cancel()
+            self._reference_refresh_task = None
+
+    async def _request(self, request_func, *args, build=None, force_request: bool = False, **kwargs):
+        """
+        Calls one of the :mod:`basic_requests` functions with the settings of this client.
+        If build is given, it's called with the response, and what it returns is returned (and traced as the build
+        phase of the request).
+        If force_request is True, the request is done even if the response cache has a fresh response.
+        """
+
+        if self.monitor is not None and not self.monitor.running:
+            self.monitor.start(self._event_loop)
+
+        endpoint = request_func.__name__
+        trace = None
+        if self.monitor is not None or self._trace_hooks:
+            request_id = next(self._request_ids)
+
+            def trace(phase, start, end, _):
+                # The spans are named by the basic_requests function, not the url, so the client's phases match them
+                self._emit_span(data_classes.TraceSpan(phase, start, end, endpoint, request_id))
+
+            request_start = basic_requests.trace_clock()
+
+        def do_request(handle_ratelimiting: bool = self.auto_ratelimit):
+            return request_func(*args, api_key=self._api_key, api_version=self._api_version, loop=self._event_loop,
+                                handle_ratelimiting=handle_ratelimiting, use_validators=self.conditional_requests,
+                                max_queue_depth=self.max_queue_depth,
+                                max_queue_wait_seconds=self.max_queue_wait_seconds,
+                                parse_executor=self.parse_executor,
+                                trace=trace, cache=self.response_cache, bypass_cache=force_request,
+                                base_url=self.api_url, **kwargs)
+
+        try:
+            if self.hedger is None:
+                response = await do_request()
+            else:
+                # The original request holds the front of the rate limiting queue until it's done,
+                # so the duplicate can't wait in the queue, and is only sent if the rate limiting has room for it
+                response = await self.hedger.run(endpoint, do_request,
+                                                 hedge_factory=lambda: self._hedge_request(do_request),
+                                                 budget_available=self._has_spare_budget)
+
+            if build is None:
+                return response
+
+            build_start = basic_requests.trace_clock()
+            built = build(response)
+            if trace is not None:
+                trace(PHASE_BUILD, build_start, basic_requests.trace_clock(), endpoint)
+            return built
+        finally:
+            if trace is not None:
+                trace(PHASE_REQUEST, request_start, basic_requests.trace_clock(), endpoint)
+
+    def add_trace_hook(self, callback):
+        """
+        Adds a callable that is called with a :class:`data_classes.TraceSpan` after each phase of every request:
+        waiting for the rate limiting, connecting, waiting for and reading the response, decoding it, and building
+        the returned objects, followed by a span of the whole request (see the PHASE_* constants in
+        :mod:`monitoring`). The callable is called on the event loop, so it should be quick.
+
+        Nothing is traced if there are no hooks (and no monitor), so hooks have no cost when unused.
+        :class:`monitoring.SlowRequestLog` is a hook that logs slow requests.
+
+        :param callback: The callable.
+        :type callback: A function that takes a :class:`data_classes.TraceSpan`.
+        """
+        self._trace_hooks.append(callback)
+
+    def remove_trace_hook(self, callback):
+        self._trace_hooks.remove(callback)
+
+    def _emit_span(self, span):
+        if self.monitor is not None:
+            self.monitor.record_span(span.phase, span.start, span.end, span.endpoint)
+        for hook in self._trace_hooks:
+            hook(span)
+
+    @property
+    def estimated_wait(self):
+        """
+        The estimated time, in seconds, a new request would have to wait for the ratelimiting before being sent.
+        Useful for degrading gracefully before requests start failing with :class:`exceptions.QueueFullError`.
+        """
+        return basic_requests.estimated_wait(self._api_key) if self.auto_ratelimit else 0.0
+
+    def _has_spare_budget(self):
+        """If nothing but the current request is waiting for the rate limiting, and the spacing allows a request."""
+        if not self.auto_ratelimit:
+            return True
+        return len(basic_requests.ratelimit_key_queue_map.get(self._api_key, ())) <= 1 and \
+            (self._api_key not in basic_requests.ratelimit_key_time_map or
+             basic_requests.clock() - basic_requests.ratelimit_key_time_map[self._api_key] >=
+             basic_requests.throughput_time_seconds)
+
+    async def _hedge_request(self, do_request):
+        # We count the duplicate against the rate limiting, even though it skips the queue
+        basic_requests.ratelimit_key_time_map[self._api_key] = basic_requests.clock()
+        return await do_request(handle_ratelimiting=False)
+
+    def _player_from_raw(self, raw_player_data: dict, platform: str = None):
+        """
+        Creates a :class:`data_classes.Player` from the raw player data the api returns.
+        If platform isn't supplied, it is read from the raw data (the leaderboard and search endpoints include it).
+        """
+        return self._player_seen(data_classes.Player.from_raw(raw_player_data, platform))
+
+    # The request functions of the reference data, {name: basic_requests function}
+    _reference_requests = {
+        "platforms": basic_requests.get_platforms,
+        "playlists": basic_requests.get_playlists,
+        "seasons": basic_requests.get_seasons,
+        "tiers": basic_requests.get_tiers,
+    }
+
+    # How old served reference data may be, in seconds, {name: max age}. The playlists include their populations,
+    # which the api updates every few minutes, so they can't be served for as long as the rest.
+    _reference_max_ages = {
+        "playlists": 5 * 60,
+    }
+
+    async def _get_reference_data(self, name: str, force_request: bool = False):
+        """
+        Gets raw reference data, from the loaded snapshot if there is one and the data isn't too old for it.
+        If force_request is True, it's requested even if it's in the snapshot or the response cache.
+        """
+        if self._serve_reference_data and not force_request and name in self._reference_data:
+            max_age_seconds = self._reference_max_ages.get(name, None)
+            if max_age_seconds is None or time.time() - self._reference_data_times.get(name, 0) <= max_age_seconds:
+                return self._reference_data[name]
+
+        raw_data = await self._request(self._reference_requests[name], force_request=force_request)
+        self._reference_data[name] = raw_data
+        self._reference_data_times[name] = time.time()
+        return raw_data
+
+    def load_reference_snapshot(self, path: str, refresh: bool = True):
+        """
+        Loads reference data (platforms, playlists, seasons and tiers) from a snapshot file saved with
+        :func:`RLS_Client.save_reference_snapshot`. After this, :func:`RLS_Client.get_platforms`,
+        :func:`RLS_Client.get_seasons` and :func:`RLS_Client.get_tiers` return the loaded data without doing any
+        requests, even if it's stale. :func:`RLS_Client.get_playlists` only does so while the playlists are at most 5
+        minutes old, because their populations change all the time, and requests them after that.
+
+        :param path: The path of the snapshot file.
+        :param refresh: If True, the reference data is refreshed in the background (see
+            :func:`RLS_Client.refresh_reference_data`) and the snapshot file is updated.
+        :type path: :class:`str`
+        :type refresh: :class:`bool`, default is ``True``.
+        :return Whether a snapshot was loaded. It isn't if the file doesn't exist, is damaged, or has another version.
+            If it isn't loaded but refresh is True, the refresh is still started.
+        :rtype :class:`bool`
+        """
+        loaded = False
+        try:
+            with open(path, "r", encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+
+            if snapshot.get("version", None) == REFERENCE_SNAPSHOT_VERSION and \
+                    snapshot.get("api_version", None) == self._api_version and \
+                    set(snapshot.get("data", {})) == set(self._reference_requests):
+                self._reference_data.update(snapshot["data"])
+                self._reference_data_times.update(snapshot["fetched_at"])
+                self._serve_reference_data = True
+                loaded = True
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+        if refresh and (self._reference_refresh_task is None or self._reference_refresh_task.done()):
+            self._reference_refresh_task = asyncio.ensure_future(self._refresh_reference_data_quietly(path),
+                                                                 loop=self._event_loop)
+
+        return loaded
+
+    async def _refresh_reference_data_quietly(self, snapshot_path: str):
+        try:
+            await self.refresh_reference_data(snapshot_path)
+        except ConnectionError:
+            # We keep using the stale data if the api doesn't cooperate
+            pass
+
+    async def refresh_reference_data(self, snapshot_path: str = None):
+        """
+        Requests all the reference data again, and serves the new data from then on.
+
+        :param snapshot_path: If supplied, the snapshot file at this path is updated with the new data.
+        :type snapshot_path: :class:`str`
+        """
+        for name in self._reference_requests:
+            await self._get_reference_data(name, force_request=True)
+
+        self._serve_reference_data = True
+
+        if snapshot_path is not None:
+            self._write_reference_snapshot(snapshot_path)
+
+    async def save_reference_snapshot(self, path: str):
+        """
+        Saves the reference data (platforms, playlists, seasons and tiers) to a snapshot file, which can be loaded by
+        :func:`RLS_Client.load_reference_snapshot`. Reference data that the client hasn't fetched yet is requested
+        first.
+
+        :param path: The path of the snapshot file. The file is replaced atomically.
+        :type path: :class:`str`
+        """
+        for name in self._reference_requests:
+            if name not in self._reference_data:
+                await self._get_reference_data(name)
+
+        self._write_reference_snapshot(path)
+
+    def _write_reference_snapshot(self, path: str):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as snapshot_file:
+            json.dump({"version": REFERENCE_SNAPSHOT_VERSION, "api_version": self._api_version,
+                       "saved_at": time.time(), "fetched_at": self._reference_data_times,
+                       "data": self._reference_data}, snapshot_file)
+        os.replace(temp_path, path)
+
+    def _player_seen(self, player, fetched_at: float = None):
+        """
+        Called with every player the client creates from api data, returns the player to use.
+        fetched_at is when the data was fetched, now if not supplied.
+        """
+        if self.identity_map is not None:
+            player = self.identity_map.canonical(player, fetched_at)
+        if self.negative_cache is not None:
+            self.negative_cache.discard(player.uid, player.platform)
+        if self.search_index is not None:
+            self.search_index.add(player)
+        if self.player_cache is not None:
+            self.player_cache.add(player, fetched_at)
+
+        return player
+
+    def _players_seen(self, players: list):
+        return [self._player_seen(player) for player in players]
+
+    def _search_page_seen(self, page: dict):
+        page = dict(page)
+        page["data"] = self._players_seen(page["data"])
+        return page
+
     async def get_platforms(self):
         """
         Gets the supported platforms for the api.
@@ -48,9 +434,7 @@ class RLS_Client(object):
         :rtype :class:`list` of :class:`str`.
         """
 
-        raw_playlist_data = await basic_requests.get_platforms(api_key=self._api_key, api_version=self._api_version,
-                                                               loop=self._event_loop,
-                                                               handle_ratelimiting=self.auto_ratelimit)
+        raw_playlist_data = await self._get_reference_data("platforms")
 
         return [ID_PLATFORM_LUT.get(plat_id, None) for plat_id in [entry["id"] for entry in raw_playlist_data] if
                 ID_PLATFORM_LUT.get(plat_id, None) is not None]
@@ -62,10 +446,10 @@ class RLS_Client(object):
         :return The supported playlists (basically gamemodes, separate per platform) for the api.
         :rtype A :class:`list` of :class:`data_classes.Playlists`.
         """
-        raw_playlist_data = await basic_requests.get_playlists(api_key=self._api_key, api_version=self._api_version,
-                                                               loop=self._event_loop,
-                                                               handle_ratelimiting=self.auto_ratelimit)
+        return self._playlists_from_raw(await self._get_reference_data("playlists"))
 
+    @staticmethod
+    def _playlists_from_raw(raw_playlist_data: list):
         playlists = []
 
         for raw_playlist in raw_playlist_data:
@@ -84,9 +468,7 @@ class RLS_Client(object):
             which means it's the current season.
         :rtype A :class:`list` of :class:`data_classes.Seasons`.
         """
-        raw_seasons_data = await basic_requests.get_seasons(api_key=self._api_key, api_version=self._api_version,
-                                                            loop=self._event_loop,
-                                                            handle_ratelimiting=self.auto_ratelimit)
+        raw_seasons_data = await self._get_reference_data("seasons")
 
         seasons = []
 
@@ -105,9 +487,7 @@ class RLS_Client(object):
         :return The supported tiers for the api.
         :rtype A :class:`list` of :class:`data_classes.Tiers`.
         """
-        raw_tiers_data = await basic_requests.get_tiers(api_key=self._api_key, api_version=self._api_version,
-                                                        loop=self._event_loop,
-                                                        handle_ratelimiting=self.auto_ratelimit)
+        raw_tiers_data = await self._get_reference_data("tiers")
 
         tiers = []
 
@@ -130,22 +510,29 @@ class RLS_Client(object):
         :raise: :class:`exceptions.APINotFoundError` if the player could be found.
         """
 
-        # If the player couldn't be found, the server returns a 404
+        if self.player_cache is not None:
+            player = self.player_cache.get(unique_id, platform)
+            if player is not None:
+                return player
 
-        raw_player_data = await basic_requests.get_player(unique_id, PLATFORM_ID_LUT[platform],
-                                                          api_key=self._api_key, api_version=self._api_version,
-                                                          loop=self._event_loop,
-                                                          handle_ratelimiting=self.auto_ratelimit)
+        if self.negative_cache is not None and (unique_id, platform) in self.negative_cache:
+            self.negative_cache.skipped += 1
+            raise custom_exceptions.APINotFoundError(
+                    "The requested resource could not be found by the RLS API (recently).")
 
-        # We have some valid player data
-        player = data_classes.Player(raw_player_data["uniqueId"], raw_player_data["displayName"], platform,
-                                     avatar_url=raw_player_data["avatar"], profile_url=raw_player_data["profileUrl"],
-                                     signature_url=raw_player_data["signatureUrl"], stats=raw_player_data["stats"],
-                                     ranked_seasons=data_classes.RankedSeasons(raw_player_data["rankedSeasons"]))
+        # If the player couldn't be found, the server returns a 404
+        try:
+            # We have some valid player data if this doesn't raise
+            player = await self._request(basic_requests.get_player, unique_id, PLATFORM_ID_LUT[platform],
+                                         build=lambda raw_player_data: self._player_from_raw(raw_player_data, platform))
+        except custom_exceptions.APINotFoundError:
+            if self.negative_cache is not None:
+                self.negative_cache.add(unique_id, platform)
+            raise
 
         return player
 
-    async def get_players(self, unique_id_platform_pairs: list):
+    async def get_players(self, unique_id_platform_pairs: list, force_request: bool = False):
         """
         Does what :func:`RLS_Client.get_player` does but for up to 10 players at once.
 
@@ -160,6 +547,9 @@ class RLS_Client(object):
             where both the unique ids and platforms are strings. The platform strings can be found in :mod:`rocket_snake.constants`,
             and the unique ids are of the same type as what :func:`RLS_Client.get_player` uses.
             Example: ``[("ExampleUniqueID1", constants.STEAM), ("ExampleUniqueID1OnXBOX", constants.XBOX1)]``
+        :param force_request: If True, the players are requested even if they are fresh in the player cache or the
+            response cache.
+        :type force_request: :class:`bool`, default is ``False``.
 
         :return The players that could be found.
         :rtype A :class:`list` of :class:`data_classes.Player` objects.
@@ -172,32 +562,65 @@ class RLS_Client(object):
             raise ValueError("The list of unique ids and platforms was not between 1 and 10 inclusive. Length was: {0}"
                              .format(len(unique_id_platform_pairs)))
 
-        # We convert the platforms to platform ids
-        unique_id_platform_pairs = [(entry[0], PLATFORM_ID_LUT[entry[1]]) for entry in unique_id_platform_pairs]
-
-        # If no player could be found, the server returns a 404
-        raw_players_data = await basic_requests.get_player_batch(tuple(unique_id_platform_pairs),
-                                                                 api_key=self._api_key, api_version=self._api_version,
-                                                                 loop=self._event_loop,
-                                                                 handle_ratelimiting=self.auto_ratelimit)
-
-        players = {
-            raw_player_data["uniqueId"]: data_classes.Player(raw_player_data["uniqueId"],
-                                                             raw_player_data["displayName"],
-                                                             ID_PLATFORM_LUT[req_pair[1]],
-                                                             avatar_url=raw_player_data["avatar"],
-                                                             profile_url=raw_player_data["profileUrl"],
-                                                             signature_url=raw_player_data["signatureUrl"],
-                                                             stats=raw_player_data["stats"],
-                                                             ranked_seasons=data_classes.RankedSeasons(
-                                                                     raw_player_data["rankedSeasons"]))
-            for raw_player_data, req_pair in
-            list(zip(raw_players_data, unique_id_platform_pairs))}
+        requested_pairs = [tuple(entry) for entry in unique_id_platform_pairs]
+
+        # {(unique id, platform): data_classes.Player}, the same unique id can be used on several platforms
+        players = {}
+        if self.player_cache is not None and not force_request:
+            # The players the client has recently seen don't need to be requested
+            for unique_id, platform in requested_pairs:
+                player = self.player_cache.get(unique_id, platform)
+                if player is not None:
+                    players[(unique_id, platform)] = player
+            requested_pairs = [entry for entry in requested_pairs if entry not in players]
+
+        if self.negative_cache is not None:
+            # We don't request the players the api recently couldn't find
+            num_not_cached = len(requested_pairs)
+            requested_pairs = [entry for entry in requested_pairs if entry not in self.negative_cache]
+            self.negative_cache.skipped += num_not_cached - len(requested_pairs)
+
+            if not requested_pairs and not players:
+                raise custom_exceptions.APINotFoundError(
+                        "The requested resources could not be found by the RLS API (recently).")
+
+        if requested_pairs:
+            # We convert the platforms to platform ids
+            requested_id_pairs = [(entry[0], PLATFORM_ID_LUT[entry[1]]) for entry in requested_pairs]
+
+            # {(unique id, platform id): (unique id, platform)}, the api leaves out the players it can't find, so the
+            # results can't be zipped with the requested players
+            requested_entries = {id_pair: entry for id_pair, entry in zip(requested_id_pairs, requested_pairs)}
+
+            def build(raw_players_data):
+                built_players = {}
+                for raw_player_data in raw_players_data:
+                    entry = requested_entries.get((raw_player_data["uniqueId"], int(raw_player_data["platform"]["id"])))
+                    if entry is not None:
+                        built_players[entry] = self._player_from_raw(raw_player_data, entry[1])
+                return built_players
+
+            # If no player could be found, the server returns a 404
+            try:
+                players.update(await self._request(basic_requests.get_player_batch, tuple(requested_id_pairs),
+                                                   build=build, force_request=force_request))
+            except custom_exceptions.APINotFoundError:
+                if self.negative_cache is not None:
+                    for unique_id, platform in requested_pairs:
+                        self.negative_cache.add(unique_id, platform)
+                if not players:
+                    raise
+                # Some of the players were cached, so not all of them are missing
+
+            if self.negative_cache is not None:
+                for unique_id, platform in requested_pairs:
+                    if (unique_id, platform) not in players:
+                        self.negative_cache.add(unique_id, platform)
 
         ordered_players = []
 
         for unique_id, platform in unique_id_platform_pairs:
-            ordered_players.append(players.get(unique_id, None))
+            ordered_players.append(players.get((unique_id, platform), None))
 
         return ordered_players
 
@@ -212,19 +635,9 @@ class RLS_Client(object):
         :rtype A :class:`list` of :class:`data_classes.Player` objects,
         where the first one is the one with the highest rank in the requested playlist and current season, and the list is descending.
         """
-        raw_leaderboard_data = await basic_requests.get_ranked_leaderboard(
-                playlist if isinstance(playlist, int) else playlist.id, api_key=self._api_key,
-                api_version=self._api_version, loop=self._event_loop, handle_ratelimiting=self.auto_ratelimit)
-
-        leaderboard_players = [data_classes.Player(raw_player_data["uniqueId"], raw_player_data["displayName"],
-                                                   raw_player_data["platform"]["name"],
-                                                   avatar_url=raw_player_data["avatar"],
-                                                   profile_url=raw_player_data["profileUrl"],
-                                                   signature_url=raw_player_data["signatureUrl"],
-                                                   stats=raw_player_data["stats"],
-                                                   ranked_seasons=data_classes.RankedSeasons(
-                                                           raw_player_data["rankedSeasons"]))
-                               for raw_player_data in raw_leaderboard_data]
+        leaderboard_players = await self._request(basic_requests.get_ranked_leaderboard,
+                                                  playlist if isinstance(playlist, int) else playlist.id,
+                                                  parser=_parse_players, build=self._players_seen)
 
         return leaderboard_players
 
@@ -238,40 +651,95 @@ class RLS_Client(object):
         :rtype A :class:`list` of :class:`data_classes.Player` objects,
         where the first one is the one with the highest amount of the requested stat, and the list is descending.
         """
-        raw_leaderboard_data = await basic_requests.get_stats_leaderboard(
-                stat_type, api_key=self._api_key, api_version=self._api_version, loop=self._event_loop,
-                handle_ratelimiting=self.auto_ratelimit)
-
-        leaderboard_players = [data_classes.Player(raw_player_data["uniqueId"], raw_player_data["displayName"],
-                                                   raw_player_data["platform"]["name"],
-                                                   avatar_url=raw_player_data["avatar"],
-                                                   profile_url=raw_player_data["profileUrl"],
-                                                   signature_url=raw_player_data["signatureUrl"],
-                                                   stats=raw_player_data["stats"],
-                                                   ranked_seasons=data_classes.RankedSeasons(
-                                                           raw_player_data["rankedSeasons"]))
-                               for raw_player_data in raw_leaderboard_data]
+        leaderboard_players = await self._request(basic_requests.get_stats_leaderboard, stat_type,
+                                                  parser=_parse_players, build=self._players_seen)
 
         return leaderboard_players
 
-    async def search_player(self, display_name: str, get_all: bool=False):
+    async def get_all_leaderboards(self, playlists=RANKED_PLAYLISTS_IDS, stat_types=LEADERBOARD_TYPES):
+        """
+        Gets several ranked and stat leaderboards concurrently (all of them by default), and merges them so every player
+        is a single :class:`data_classes.Player` object, even if the player is on several leaderboards.
+        The requests still go through the rate limiting of the client.
+
+        :param playlists: The ranked playlists to get leaderboards for.
+        :param stat_types: The stat types to get leaderboards for.
+        :type playlists: An iterable of playlist ids or :class:`data_classes.Playlist` objects,
+            default is ``RANKED_PLAYLISTS_IDS``.
+        :type stat_types: An iterable of the ``LEADERBOARD_*`` constants in :mod:`rocket_snake.constants`,
+            default is ``LEADERBOARD_TYPES``.
+        :return The merged leaderboards, see :func:`leaderboards.MergedLeaderboards.top` for the top players by
+            any stat or rank.
+        :rtype A :class:`leaderboards.MergedLeaderboards`, with ``(leaderboards.RANKED, playlist_id)`` and
+            ``(leaderboards.STATS, stat_type)`` as leaderboards.
+        """
+        boards = [(leaderboards.RANKED, playlist if isinstance(playlist, int) else playlist.id)
+                  for playlist in sorted(playlists, key=lambda playlist: getattr(playlist, "id", playlist))]
+        boards += [(leaderboards.STATS, stat_type) for stat_type in sorted(stat_types)]
+
+        raw_leaderboards_data = await asyncio.gather(*[
+            self._request(basic_requests.get_ranked_leaderboard if board_type == leaderboards.RANKED else
+                          basic_requests.get_stats_leaderboard, board_id) for board_type, board_id in boards])
+
+        build_start = basic_requests.trace_clock()
+        # {(uid, platform): data_classes.Player}, so each player is only created once
+        players = {}
+        merged_boards = {}
+
+        for board, raw_leaderboard_data in zip(boards, raw_leaderboards_data):
+            merged_boards[board] = []
+
+            for raw_player_data in raw_leaderboard_data:
+                key = data_classes.player_key(raw_player_data["uniqueId"], raw_player_data["platform"]["name"])
+                if key not in players:
+                    players[key] = self._player_from_raw(raw_player_data)
+                merged_boards[board].append(players[key])
+
+        if self.monitor is not None or self._trace_hooks:
+            # The players of all the requests are built together, so this isn't part of any of them, and is traced as
+            # a request of its own
+            request_id = next(self._request_ids)
+            build_end = basic_requests.trace_clock()
+            self._emit_span(data_classes.TraceSpan(PHASE_BUILD, build_start, build_end, "get_all_leaderboards",
+                                                   request_id))
+            self._emit_span(data_classes.TraceSpan(PHASE_REQUEST, build_start, build_end, "get_all_leaderboards",
+                                                   request_id))
+
+        return leaderboards.MergedLeaderboards(merged_boards)
+
+    async def search_player(self, display_name: str, get_all: bool=False, local: bool = False,
+                            merge_local: bool = False):
         """
         Searches for a displayname and returns the results, this does not search all of Rocket League, but only the https://rocketleaguestats.com database.
 
+        If the client has a search index (see the ``search_index`` parameter of :class:`RLS_Client`), the players the
+        client has already seen can be searched too. The local search is case-insensitive and matches the start
+        of display names.
+
         :param display_name: The displayname you want to search for.
         :param get_all: Whether to get all search results or not.
             If this is True, the function may take many seconds to return,
             since it will get all the search results from the API one page at a time.
             If this is False, the function will only return with the first (called "page" in the http api) 20 results or less.
+        :param local: If True, only the search index is searched, and no requests are done.
+        :param merge_local: If True, the players in the search index that match but weren't in the api's results
+            are added after the api's results.
         :type display_name: :class:`str`
         :type :class:`bool`, default is ``False``.
+        :type local: :class:`bool`, default is ``False``.
+        :type merge_local: :class:`bool`, default is ``False``.
         :return The search results.
         :rtype A :class:`list` of :class:`data_classes.Player` objects, where the first one is the top result.
             If the search didn't return any players, this :class:`list` is empty (``[]``).
         """
-        raw_leader_board_data = [await basic_requests.search_players(display_name, 0, api_key=self._api_key,
-                                        api_version=self._api_version, loop=self._event_loop,
-                                        handle_ratelimiting=self.auto_ratelimit)]
+        if (local or merge_local) and self.search_index is None:
+            raise ValueError("Local searches need the client to have a search index.")
+
+        if local:
+            return self.search_index.search(display_name)
+
+        raw_leader_board_data = [await self._request(basic_requests.search_players, display_name, 0,
+                                                     parser=_parse_search_page, build=self._search_page_seen)]
 
         if get_all:
             # We calculate the number of pages to get
@@ -280,18 +748,18 @@ class RLS_Client(object):
 
             # We get all the other pages
             for i in range(1, num_pages):
-                raw_leader_board_data.append(await basic_requests.search_players(display_name, i, api_key=self._api_key,
-                                        api_version=self._api_version, loop=self._event_loop,
-                                        handle_ratelimiting=self.auto_ratelimit))
+                raw_leader_board_data.append(await self._request(basic_requests.search_players, display_name, i,
+                                                                 parser=_parse_search_page,
+                                                                 build=self._search_page_seen))
 
-        # We transform the pages into Player objects
-        sorted_results = []
+        # We put the players of all the pages together
+        results = []
         for page in raw_leader_board_data:
-            sorted_results.extend(page["data"])
-
-        return [data_classes.Player(raw_player_data["uniqueId"], raw_player_data["displayName"],
-                                    raw_player_data["platform"]["name"], avatar_url=raw_player_data["avatar"],
-                                    profile_url=raw_player_data["profileUrl"], signature_url=raw_player_data["signatureUrl"],
-                                    stats=raw_player_data["stats"],
-                                    ranked_seasons=data_classes.RankedSeasons(raw_player_data["rankedSeasons"]))
-                for raw_player_data in sorted_results]
+            results.extend(page["data"])
+
+        if merge_local:
+            found = {(player.uid, player.platform) for player in results}
+            results.extend(player for player in self.search_index.search(display_name)
+                           if (player.uid, player.platform) not in found)
+
+        return results
@@ -0,0 +1,243 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+A crawler that discovers players by walking leaderboards and search results, in bounded memory.
+Seen players and searched names are remembered with Bloom filters, and the work left to do is kept in bounded queues.
+"""
+
+import asyncio
+import hashlib
+import math
+from collections import deque
+
+from . import custom_exceptions
+from .data_classes import player_key
+
+
+class BloomFilter(object):
+    """
+    A set that only answers "maybe in the set" or "definitely not in the set", in a fixed amount of memory.
+
+    :param capacity: How many items the filter is sized for.
+    :param error_rate: The probability of a false "maybe in the set" when the filter holds capacity items.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("The capacity has to be positive, and the error rate between 0 and 1.")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def __len__(self):
+        """The number of items that have been added (items that were maybe already in the filter aren't counted)."""
+        return self._count
+
+    def _positions(self, item: str):
+        # Double hashing, the positions are h1 + i * h2 for i in range(num_hashes)
+        digest = hashlib.sha1(item.encode("utf-8")).digest()
+        first_hash = int.from_bytes(digest[:8], "little")
+        second_hash = int.from_bytes(digest[8:16], "little") | 1
+        return [(first_hash + i * second_hash) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, item: str):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def add(self, item: str):
+        """
+        Adds an item to the filter.
+
+        :return True if the item definitely wasn't in the filter before, False if it maybe was.
+        :rtype :class:`bool`
+        """
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+
+        if added:
+            self._count += 1
+        return added
+
+
+class PlayerCrawler(object):
+    """
+    Discovers players, starting from leaderboards, search queries and known (uid, platform) pairs.
+    The display name of every discovered player is used as a new search query, so the crawl keeps expanding.
+    Every discovered player is passed to the sink exactly once (except for Bloom filter false positives, which are
+    skipped).
+
+    All requests are done by the client, so they go through its rate limiting. Known players are fetched 10 at a time
+    with :func:`rocket_snake.RLS_Client.get_players`.
+
+    :param client: The client to do the requests with.
+    :param sink: Called with every discovered :class:`data_classes.Player`. May be a coroutine function.
+    :param max_frontier: The maximum number of pending searches and the maximum number of pending players to fetch.
+        When a queue is full, new work for it is dropped (and counted in ``dropped``).
+    :param expected_players: How many players the Bloom filters are sized for.
+    :param error_rate: The false positive rate of the Bloom filters at expected_players.
+    :param expand_searches: If the display names of discovered players should be searched for.
+    :type client: :class:`rocket_snake.RLS_Client`
+    :type sink: A callable.
+    :type max_frontier: :class:`int`, default is ``10000``.
+    :type expected_players: :class:`int`, default is ``1000000``.
+    :type error_rate: :class:`float`, default is ``0.001``.
+    :type expand_searches: :class:`bool`, default is ``True``.
+    """
+
+    batch_size = 10
+
+    def __init__(self, client, sink, max_frontier: int = 10000, expected_players: int = 1000000,
+                 error_rate: float = 0.001, expand_searches: bool = True):
+        self._client = client
+        self._sink = sink
+        self.max_frontier = max_frontier
+        self.expand_searches = expand_searches
+
+        self._seen_players = BloomFilter(expected_players, error_rate)
+        self._seen_queries = BloomFilter(expected_players, error_rate)
+
+        # (uid, platform) pairs of players that have to be fetched
+        self.player_frontier = deque()
+        # Display names that have to be searched for
+        self.search_frontier = deque()
+
+        self.discovered = 0
+        self.requests = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _player_item(uid: str, platform: str):
+        return "{1}\n{0}".format(*player_key(uid, platform))
+
+    def _enqueue(self, frontier: deque, item, seen: BloomFilter, seen_item: str):
+        if seen_item in seen:
+            return
+
+        if len(frontier) >= self.max_frontier:
+            # The item isn't marked as seen, so it can still be added when there is room again
+            self.dropped += 1
+        else:
+            seen.add(seen_item)
+            frontier.append(item)
+
+    def add_search(self, query: str):
+        """
+        Adds a search query to the crawl, unless it has already been searched for.
+        If the search frontier is full, the query is dropped, and can be added again later.
+        """
+        query = query.casefold()
+        if query:
+            self._enqueue(self.search_frontier, query, self._seen_queries, query)
+
+    def add_player(self, uid: str, platform: str):
+        """
+        Adds a player to fetch to the crawl, unless the player has already been discovered.
+        If the player frontier is full, the player is dropped, and can be added again later.
+        """
+        self._enqueue(self.player_frontier, (uid, platform), self._seen_players, self._player_item(uid, platform))
+
+    async def seed_leaderboards(self, playlists=None, stat_types=None):
+        """
+        Discovers all the players on the leaderboards (all of them by default).
+        The leaderboards contain all player data already, so the players aren't fetched again.
+        """
+        kwargs = {}
+        if playlists is not None:
+            kwargs["playlists"] = playlists
+        if stat_types is not None:
+            kwargs["stat_types"] = stat_types
+
+        merged_leaderboards = await self._client.get_all_leaderboards(**kwargs)
+        self.requests += len(merged_leaderboards.boards)
+
+        for player in merged_leaderboards.players.values():
+            await self._discover(player)
+
+    async def _discover(self, player, already_marked: bool = False):
+        if not already_marked and not self._seen_players.add(self._player_item(player.uid, player.platform)):
+            return
+
+        self.discovered += 1
+        if self.expand_searches and player.display_name:
+            self.add_search(player.display_name)
+
+        result = self._sink(player)
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            await result
+
+    async def step(self):
+        """
+        Does a single request worth of crawling. A full batch of players is fetched before searching, so the
+        player frontier doesn't grow, and searches are done before partial batches, so batches are as full as possible.
+
+        :return False if there was nothing left to crawl, True otherwise.
+        :rtype :class:`bool`
+        """
+        if self.player_frontier and (len(self.player_frontier) >= self.batch_size or not self.search_frontier):
+            batch = [self.player_frontier.popleft() for _ in range(min(self.batch_size, len(self.player_frontier)))]
+            self.requests += 1
+
+            try:
+                players = await self._client.get_players(batch)
+            except custom_exceptions.APINotFoundError:
+                # None of the players in the batch could be found
+                return True
+
+            for player in players:
+                if player is not None:
+                    await self._discover(player, already_marked=True)
+
+        elif self.search_frontier:
+            query = self.search_frontier.popleft()
+            self.requests += 1
+
+            try:
+                players = await self._client.search_player(query)
+            except custom_exceptions.APINotFoundError:
+                return True
+
+            for player in players:
+                await self._discover(player)
+
+        else:
+            return False
+
+        return True
+
+    async def run(self, max_players: int = None, max_requests: int = None):
+        """
+        Crawls until there is nothing left to crawl or a limit is reached.
+        If a request fails, the exception is raised, and the crawl can be continued by calling this again.
+
+        :param max_players: Stop after this many players have been discovered in total.
+        :param max_requests: Stop after this many requests have been done in total.
+        :return The number of players that have been discovered in total.
+        :rtype :class:`int`
+        """
+        while (max_players is None or self.discovered < max_players) and \
+                (max_requests is None or self.requests < max_requests):
+            if not await self.step():
+                break
+
+        return self.discovered
@@ -38,3 +38,7 @@ class RateLimitError(APIBadResponseCodeError):
 
 class InvalidAPIKeyError(APIBadResponseCodeError):
     pass
+
+
+class QueueFullError(ConnectionError):
+    pass
@@ -24,6 +24,15 @@ from collections import namedtuple
 from . import constants
 
 
+def player_key(unique_id: str, platform: str):
+    """
+    The key that identifies a player everywhere, a (uid, casefolded platform) tuple. Platforms are compared
+    case-insensitively, because players from leaderboards and searches have the api's platform names, which can differ
+    from the platform constants.
+    """
+    return unique_id, platform.casefold()
+
+
 class Tier(namedtuple("Tier", ("id", "name"))):
     """
     Represents a tier. Unless otherwise specified, this will be created with data from the last season.
@@ -116,7 +125,24 @@ class RankedSeasons(object):
     def __iter__(self):
         return iter(self.ranked_seasons)
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Creates a RankedSeasons from a dict in the same form as :func:`RankedSeasons.to_dict` returns."""
+        return cls(data)
+
+    def to_dict(self):
+        """
+        Converts this to plain dicts, in the same form as the api uses:
+        {season_id: {playlist_id: {"rankPoints": ..., "division": ..., "matchesPlayed": ..., "tier": ...}}}
+        """
+        return {season_id: {playlist_id: dict(rank._asdict()) for playlist_id, rank in ranked_season.items()}
+                for season_id, ranked_season in self.ranked_seasons.items()}
+
     def __getattr__(self, item):
+        if item == "ranked_seasons":
+            # This happens when the object is created without __init__ (e.g. by pickle), and would recurse forever
+            raise AttributeError(item)
+
         regular_functions = {
             "__init__": self.__init__,
             "__getitem__": self.__getitem__,
@@ -150,6 +176,40 @@ class Player(object):
         self.stats = stats
         self.ranked_seasons = ranked_seasons
 
+    @classmethod
+    def from_raw(cls, raw_player_data: dict, platform: str = None):
+        """
+        Creates a Player from the raw player data the api returns.
+        If platform isn't supplied, it is read from the raw data (the leaderboard and search endpoints include it).
+        """
+        return cls(raw_player_data["uniqueId"], raw_player_data["displayName"],
+                   raw_player_data["platform"]["name"] if platform is None else platform,
+                   avatar_url=raw_player_data["avatar"], profile_url=raw_player_data["profileUrl"],
+                   signature_url=raw_player_data["signatureUrl"], stats=raw_player_data["stats"],
+                   ranked_seasons=RankedSeasons(raw_player_data["rankedSeasons"]))
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Creates a Player from a dict in the same form as :func:`Player.to_dict` returns."""
+        return cls(data["uid"], data["display_name"], data["platform"], avatar_url=data.get("avatar_url", None),
+                   profile_url=data.get("profile_url", None), signature_url=data.get("signature_url", None),
+                   stats=data.get("stats", None),
+                   ranked_seasons=None if data.get("ranked_seasons", None) is None else
+                   RankedSeasons.from_dict(data["ranked_seasons"]))
+
+    def to_dict(self):
+        """Converts this player to a dict of plain (JSON serializable) values."""
+        return {
+            "uid": self.uid,
+            "display_name": self.display_name,
+            "platform": self.platform,
+            "avatar_url": self.avatar_url,
+            "profile_url": self.profile_url,
+            "signature_url": self.signature_url,
+            "stats": None if self.stats is None else dict(self.stats),
+            "ranked_seasons": None if self.ranked_seasons is None else self.ranked_seasons.to_dict(),
+        }
+
     def __str__(self):
         return ("Rocket League player \'{0}\' with unique id {1}:\n\t"
                 "Platform: {2}, id {3}\n\t"
@@ -164,3 +224,56 @@ class Player(object):
 
     def __repr__(self):
         return str(self)
+
+
+class LeaderboardSnapshot(namedtuple("LeaderboardSnapshot", ("board", "players", "fetched_at"))):
+    """
+    Represents the latest known state of a single leaderboard.
+    Fields:
+        board: tuple; The leaderboard this is a snapshot of, see :mod:`rocket_snake.leaderboards`.
+        players: tuple; The players on the leaderboard, where the first one is the top player (descending).
+        fetched_at: float; A timestamp of when the leaderboard was fetched (see output of time.time()).
+    """
+    pass
+
+
+class LeaderboardDiff(namedtuple("LeaderboardDiff", ("board", "entered", "exited", "moved", "stat_deltas"))):
+    """
+    Represents the changes to a leaderboard between two snapshots. Players are identified by :func:`player_key`
+    tuples, (uid, casefolded platform).
+    Fields:
+        board: tuple; The leaderboard that changed.
+        entered: list; The Player objects that are on the new snapshot but weren't on the old one.
+        exited: list; The Player objects that were on the old snapshot but aren't on the new one.
+        moved: dict; {player key: (old_rank, new_rank)} for players whose position changed. Ranks start at 1.
+        stat_deltas: dict; {player key: {stat_name: change}} for players whose stats changed.
+    """
+    pass
+
+
+class RankRecord(namedtuple("RankRecord", ("timestamp", "uid", "platform", "season", "playlist", "rankPoints",
+                                           "division", "tier", "matchesPlayed"))):
+    """
+    Represents the rank of a player on a playlist in a season at a point in time, see :mod:`rocket_snake.rank_history`.
+    Fields:
+        timestamp: float; When the rank was recorded (seconds since unix epoch, see output of time.time()).
+        uid: str; The unique id of the player.
+        platform: str; The platform of the player. Corresponds to the platforms in the module constants.
+        season: int; The id of the season.
+        playlist: int; The id of the playlist.
+        rankPoints, division, tier, matchesPlayed: int; The same as in SeasonPlaylistRank, None if unknown.
+    """
+    pass
+
+
+class TraceSpan(namedtuple("TraceSpan", ("phase", "start", "end", "endpoint", "request_id"))):
+    """
+    Represents a timed phase of a request done by :class:`rocket_snake.RLS_Client`, see
+    :func:`RLS_Client.add_trace_hook`.
+    Fields:
+        phase: str; One of the PHASE_* constants in :mod:`rocket_snake.monitoring`.
+        start, end: float; When the phase started and ended, :func:`time.perf_counter` times.
+        endpoint: str; The name of the :mod:`rocket_snake.basic_requests` function of the request.
+        request_id: int; Identifies the request, all the spans of a request have the same id.
+    """
+    pass
@@ -0,0 +1,174 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+A local HTTP server with the same endpoints as the RLS api, which does the requests of many clients (in any number of
+processes) with one api key, one rate limiting queue and one response cache. Identical requests that arrive while one
+is already being done wait for it instead of being done again.
+
+Run it with ``python -m rocket_snake.gateway --api-key KEY``, and point clients at it with the ``api_url`` parameter of
+:class:`rocket_snake.RLS_Client`, like ``RLS_Client(api_key="anything", api_url="http://127.0.0.1:8080/v")``.
+The clients' api keys aren't used.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+from . import basic_requests, custom_exceptions
+from .response_cache import DiskBackend, MemoryBackend, ResponseCache
+
+# The response code the gateway responds with for each exception of a request to the api, the first match is used
+ERROR_STATUSES = (
+    (custom_exceptions.APINotFoundError, 404),
+    (custom_exceptions.InvalidAPIKeyError, 401),
+    (custom_exceptions.RateLimitError, 429),
+    (custom_exceptions.QueueFullError, 503),
+    (custom_exceptions.APIBadResponseCodeError, 502),
+    (custom_exceptions.APIServerError, 504),
+)
+
+
+class Gateway(object):
+    """
+    The gateway server, see the module documentation.
+
+    :param api_key: The key all the requests to the api are done with.
+    :param response_cache: The cache of responses shared by all clients, an in-memory cache with the default
+        settings if not supplied.
+    :param timeout_seconds: The timeout of requests to the api.
+    :param conditional_requests: If the gateway should do conditional requests (see :class:`rocket_snake.RLS_Client`).
+    :param max_queue_wait_seconds: The maximum estimated wait for the rate limiting, requests over it get a 503.
+    :type api_key: :class:`str`
+    :type response_cache: :class:`response_cache.ResponseCache`
+    :type timeout_seconds: :class:`float`, default is ``15``.
+    :type conditional_requests: :class:`bool`, default is ``True``.
+    :type max_queue_wait_seconds: :class:`float`, default is ``None`` (no maximum).
+    """
+
+    def __init__(self, api_key: str, response_cache: ResponseCache = None, timeout_seconds: float = 15,
+                 conditional_requests: bool = True, max_queue_wait_seconds: float = None):
+        if not api_key:
+            raise custom_exceptions.NoAPIKeyError("No api key was supplied to the gateway.")
+
+        self._api_key = api_key
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.timeout_seconds = timeout_seconds
+        self.conditional_requests = conditional_requests
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+
+        # {(method, endpoint, params, body): asyncio.Task}, the requests to the api that are being done
+        self._in_flight = {}
+
+        self.requests = 0
+        # How many requests waited for an identical request instead of being done
+        self.joined_requests = 0
+
+    def make_app(self):
+        """Creates the :class:`aiohttp.web.Application` of the gateway."""
+        app = web.Application()
+        app.router.add_get("/gateway/stats", self.handle_stats)
+        app.router.add_route("*", r"/v{version:\d+}/{endpoint:.+}", self.handle_request)
+        return app
+
+    async def handle_stats(self, request):
+        return web.json_response({
+            "requests": self.requests,
+            "joined_requests": self.joined_requests,
+            "in_flight": len(self._in_flight),
+            "estimated_wait": basic_requests.estimated_wait(self._api_key),
+            "cache": self.response_cache.stats,
+        })
+
+    async def handle_request(self, request):
+        self.requests += 1
+
+        endpoint = "{0}/{1}".format(request.match_info["version"], request.match_info["endpoint"])
+        params = tuple(sorted(request.query.items()))
+        body = await request.read() if request.can_read_body else b""
+        key = (request.method, endpoint, params, body)
+
+        task = self._in_flight.get(key, None)
+        if task is None:
+            task = asyncio.ensure_future(self._request(request.method.lower(), endpoint, dict(params),
+                                                       json.loads(body.decode("utf-8")) if body else None))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.joined_requests += 1
+
+        try:
+            # Shielded, so a client that disconnects doesn't cancel the request for the others waiting for it
+            status, data = await asyncio.shield(task)
+        except ConnectionError as e:
+            error_status = next((status for exception_type, status in ERROR_STATUSES
+                                 if isinstance(e, exception_type)), 502)
+            return web.json_response({"code": error_status, "message": str(e).split("\n", 1)[0]},
+                                     status=error_status)
+
+        headers = {}
+        if status >= 300 and status != 304:
+            # The api responded with an error, and this is a stale response from the cache
+            headers["Warning"] = "110 - \"Response is Stale\""
+        return web.json_response(data, headers=headers)
+
+    async def _request(self, method: str, endpoint: str, params: dict, json_data):
+        kwargs = {}
+        if params:
+            kwargs["params"] = params
+        if json_data is not None:
+            kwargs["json"] = json_data
+
+        return await basic_requests.basic_request(
+                asyncio.get_event_loop(), self._api_key, self.timeout_seconds, endpoint, method=method,
+                handle_ratelimiting=True, use_validators=self.conditional_requests,
+                max_queue_wait_seconds=self.max_queue_wait_seconds, cache=self.response_cache, **kwargs)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m rocket_snake.gateway",
+                                     description="Serves the RLS api locally, with shared rate limiting and caching.")
+    parser.add_argument("--api-key", default=os.environ.get("RLS_API_KEY", None),
+                        help="The RLS api key, the RLS_API_KEY environment variable by default.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-directory", default=None,
+                        help="Keep the response cache in this directory instead of in memory.")
+    parser.add_argument("--cache-megabytes", type=float, default=32, help="The size of the in-memory cache.")
+    parser.add_argument("--throughput-time-seconds", type=float, default=basic_requests.throughput_time_seconds,
+                        help="The least time between requests to the api.")
+    parser.add_argument("--max-queue-wait-seconds", type=float, default=None,
+                        help="Respond with 503 instead of queueing requests that would wait longer than this.")
+    args = parser.parse_args(args)
+
+    if not args.api_key:
+        parser.error("An api key is needed, use --api-key or set RLS_API_KEY.")
+
+    basic_requests.throughput_time_seconds = args.throughput_time_seconds
+
+    backend = DiskBackend(args.cache_directory) if args.cache_directory is not None else \
+        MemoryBackend(int(args.cache_megabytes * 1024 * 1024))
+    gateway = Gateway(args.api_key, response_cache=ResponseCache(backend),
+                      max_queue_wait_seconds=args.max_queue_wait_seconds)
+
+    web.run_app(gateway.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Hedged requests: if a request is slower than most requests to the same endpoint, a duplicate is sent, and whichever
+responds first is used.
+"""
+
+import asyncio
+import math
+from collections import deque
+
+
+class LatencyTracker(object):
+    """
+    Keeps the latest latencies of each endpoint, to compute percentiles from.
+
+    :param window: How many latencies are kept per endpoint.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        # {endpoint: deque([latency in seconds])}
+        self._latencies = {}
+
+    def record(self, endpoint: str, latency: float):
+        self._latencies.setdefault(endpoint, deque(maxlen=self.window)).append(latency)
+
+    def count(self, endpoint: str):
+        return len(self._latencies.get(endpoint, ()))
+
+    def percentile(self, endpoint: str, percentile: float):
+        """Gets a percentile (0 to 100) of the latencies of an endpoint, or None if none are known."""
+        latencies = sorted(self._latencies.get(endpoint, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, max(0, int(math.ceil(percentile / 100 * len(latencies))) - 1))]
+
+
+class Hedger(object):
+    """
+    Decides when to hedge requests, and runs the hedged requests.
+
+    A request is hedged when it hasn't responded within the given percentile of the observed latencies of its endpoint.
+    The first successful response is used and the other request is cancelled.
+
+    :param percentile: The latency percentile after which a request is hedged.
+    :param min_samples: How many latencies of an endpoint have to be observed before its requests are hedged,
+        at least 1.
+    :param max_hedge_fraction: The maximum fraction of requests that may be hedges, so hedging never takes more
+        than this fraction of the rate budget.
+    :param min_delay_seconds: The minimum time to wait before hedging, regardless of the percentile.
+    :param endpoints: The names of the :mod:`basic_requests` functions to hedge, or None to hedge all of them.
+    :type percentile: :class:`float`, default is ``95``.
+    :type min_samples: :class:`int`, default is ``20``.
+    :type max_hedge_fraction: :class:`float`, default is ``0.1``.
+    :type min_delay_seconds: :class:`float`, default is ``1``.
+    :type endpoints: An iterable of :class:`str`, default is ``("get_player_batch",)``.
+    """
+
+    def __init__(self, percentile: float = 95, min_samples: int = 20, max_hedge_fraction: float = 0.1,
+                 min_delay_seconds: float = 1, endpoints=("get_player_batch",)):
+        if min_samples < 1:
+            raise ValueError("At least one latency has to be observed before hedging, min_samples was {0}."
+                             .format(min_samples))
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_fraction = max_hedge_fraction
+        self.min_delay_seconds = min_delay_seconds
+        self.endpoints = None if endpoints is None else set(endpoints)
+
+        self.latencies = LatencyTracker()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self, endpoint: str):
+        """Gets how long a request to an endpoint may take before it's hedged, or None if it shouldn't be hedged."""
+        if (self.endpoints is not None and endpoint not in self.endpoints) or \
+                self.latencies.count(endpoint) < self.min_samples:
+            return None
+        return max(self.min_delay_seconds, self.latencies.percentile(endpoint, self.percentile))
+
+    def _may_hedge(self):
+        return self.hedges + 1 <= self.max_hedge_fraction * self.requests
+
+    async def run(self, endpoint: str, request_factory, hedge_factory=None, budget_available=None):
+        """
+        Does a request, and hedges it if it's too slow.
+
+        :param endpoint: The name of the endpoint, latencies are tracked per endpoint.
+        :param request_factory: A function that returns a new coroutine for the request.
+        :param hedge_factory: A function that returns a new coroutine for the duplicate request.
+            If not supplied, request_factory is used.
+        :param budget_available: A function that returns whether the rate limiting allows a duplicate request now.
+        :return What the first successful request returned.
+        """
+        self.requests += 1
+        delay = self.hedge_delay(endpoint)
+        # The loop's clock, like the hedge delay, so the latencies are right with any event loop
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        primary = asyncio.ensure_future(request_factory())
+        hedge = None
+
+        # Whatever happens (including the caller being cancelled while we wait), no request is left running
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+
+            if delay is None or done or not self._may_hedge() or \
+                    (budget_available is not None and not budget_available()):
+                result = await primary
+                self.latencies.record(endpoint, loop.time() - start_time)
+                return result
+
+            self.hedges += 1
+            hedge = asyncio.ensure_future((hedge_factory or request_factory)())
+            pending = {primary, hedge}
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for finished in done:
+                    if finished.exception() is None:
+                        if finished is hedge:
+                            self.hedge_wins += 1
+                        self.latencies.record(endpoint, loop.time() - start_time)
+                        return finished.result()
+
+                if not pending:
+                    # Both failed, so we raise the exception of one of them
+                    raise done.pop().exception()
+        finally:
+            for request in (primary, hedge):
+                if request is not None and not request.done():
+                    request.cancel()
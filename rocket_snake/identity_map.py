@@ -0,0 +1,96 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""Makes the client return one shared player object per player, instead of a new one for every response."""
+
+import weakref
+
+from . import basic_requests
+from .data_classes import player_key
+
+# The fields of a player that are updated when newer data of the player arrives
+_DATA_FIELDS = ("display_name", "avatar_url", "profile_url", "signature_url", "stats", "ranked_seasons")
+
+
+class PlayerIdentityMap(object):
+    """
+    Keeps the :class:`data_classes.Player` object of every player that is in use, by (uid, platform), and only holds
+    weak references, so players nothing else uses are forgotten (see the ``identity_map`` parameter of
+    :class:`rocket_snake.RLS_Client`).
+
+    When newer data of a player arrives, the existing object is updated in place and returned instead, so every
+    result that contains the player shares (and sees the latest data of) one object. Fields the newer data doesn't
+    have (None) keep their old values, since some endpoints don't return every field. Data that was fetched before
+    the data the shared object has is ignored.
+    """
+
+    def __init__(self):
+        # {(uid, casefolded platform): data_classes.Player}
+        self._players = weakref.WeakValueDictionary()
+        # {data_classes.Player: when its data was fetched}, for the shared objects
+        self._fetched_at = weakref.WeakKeyDictionary()
+
+        # How many players were replaced by the existing object
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._players)
+
+    def __contains__(self, unique_id_platform_pair):
+        return player_key(*unique_id_platform_pair) in self._players
+
+    def get(self, unique_id: str, platform: str):
+        """Gets the object of a player, or None if it isn't in use."""
+        return self._players.get(player_key(unique_id, platform), None)
+
+    def canonical(self, player, fetched_at: float = None):
+        """
+        Gets the shared object of a player, after updating it with the data of ``player`` if that data is at least as
+        new as the shared object's. If there is no shared object yet, ``player`` becomes it.
+
+        :param fetched_at: When the data of ``player`` was fetched, in :func:`basic_requests.clock` time. Now if not
+            supplied.
+        :rtype :class:`data_classes.Player`
+        """
+        fetched_at = basic_requests.clock() if fetched_at is None else fetched_at
+        key = player_key(player.uid, player.platform)
+        existing = self._players.get(key, None)
+
+        if existing is None:
+            self._players[key] = player
+            self._fetched_at[player] = fetched_at
+            return player
+        if existing is player:
+            self._fetched_at[player] = max(fetched_at, self._fetched_at.get(player, fetched_at))
+            return player
+
+        self.reused += 1
+        if fetched_at < self._fetched_at.get(existing, fetched_at):
+            # The shared object already has newer data
+            return existing
+        self._fetched_at[existing] = fetched_at
+
+        # The fields are replaced, not changed, so anyone who kept an old field (like a stats dict) keeps the old data
+        for field in _DATA_FIELDS:
+            value = getattr(player, field)
+            if value is not None:
+                setattr(existing, field, value)
+
+        return existing
+
+    def clear(self):
+        self._players.clear()
+        self._fetched_at.clear()
@@ -0,0 +1,317 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+A durable queue of fetches (players, searches and leaderboards) kept in an SQLite database, so that a large job can
+be stopped or crash and be continued later without redoing the work that is done.
+
+The database has a ``jobs`` table with the state of each fetch, and a ``results`` table with the fetched data as
+JSON. Changes are committed in batches (checkpoints), so a crash loses at most one batch of work, which is done again.
+"""
+
+import asyncio
+import json
+import sqlite3
+
+from . import basic_requests, custom_exceptions, data_classes
+
+KIND_PLAYER = "player"
+KIND_SEARCH = "search"
+KIND_RANKED_LEADERBOARD = "ranked_leaderboard"
+KIND_STATS_LEADERBOARD = "stats_leaderboard"
+
+STATE_PENDING = 0
+STATE_IN_FLIGHT = 1
+STATE_DONE = 2
+STATE_FAILED = 3
+
+_STATE_NAMES = {STATE_PENDING: "pending", STATE_IN_FLIGHT: "in_flight", STATE_DONE: "done", STATE_FAILED: "failed"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    error TEXT,
+    UNIQUE (kind, key)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, kind, id);
+CREATE TABLE IF NOT EXISTS results (
+    job_id INTEGER PRIMARY KEY REFERENCES jobs (id),
+    data TEXT NOT NULL
+);
+"""
+
+
+def _player_key(unique_id: str, platform: str):
+    return "{0}\n{1}".format(platform, unique_id)
+
+
+def _decode_key(kind: str, key: str):
+    """Converts a key from the database back to what was added: a (unique id, platform) pair, playlist id or str."""
+    if kind == KIND_PLAYER:
+        platform, unique_id = key.split("\n", 1)
+        return unique_id, platform
+    if kind == KIND_RANKED_LEADERBOARD:
+        return int(key)
+    return key
+
+
+class JobQueue(object):
+    """
+    A durable queue of fetches, see the module documentation. Work is added with the ``add_*`` methods (adding work
+    that is already in the queue does nothing), and done with :func:`JobQueue.run`. When the queue is opened again
+    after a crash, the work that was in flight is pending again.
+
+    :param path: The path of the SQLite database, which is created if it doesn't exist.
+    :param checkpoint_every: How many finished fetches are committed at once.
+    :param max_attempts: How many times a fetch is tried before it's marked as failed.
+    :type path: :class:`str`
+    :type checkpoint_every: :class:`int`, default is ``100``.
+    :type max_attempts: :class:`int`, default is ``3``.
+    """
+
+    players_per_request = 10
+
+    def __init__(self, path: str, checkpoint_every: int = 100, max_attempts: int = 3):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.max_attempts = max_attempts
+
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+        # The work that was in flight when the queue was last used is done again
+        self._connection.execute("UPDATE jobs SET state = ? WHERE state = ?", (STATE_PENDING, STATE_IN_FLIGHT))
+        self._connection.commit()
+
+        self._unsaved = 0
+        self.requests = 0
+        self.checkpoints = 0
+        # How many fetches have been finished since run was last called, and when it was called
+        self._finished_this_run = 0
+        self._run_started_at = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Commits the finished work and closes the database."""
+        if self._connection is not None:
+            self.checkpoint()
+            self._connection.close()
+            self._connection = None
+
+    def checkpoint(self):
+        """Commits the finished work now."""
+        self._connection.commit()
+        self._unsaved = 0
+        self.checkpoints += 1
+
+    def _add(self, kind: str, keys):
+        now = basic_requests.clock()
+        cursor = self._connection.executemany(
+                "INSERT OR IGNORE INTO jobs (kind, key, state, updated_at) VALUES (?, ?, ?, ?)",
+                ((kind, key, STATE_PENDING, now) for key in keys))
+        self._connection.commit()
+        return cursor.rowcount
+
+    def add_players(self, unique_id_platform_pairs):
+        """
+        Adds players to fetch. Players are fetched 10 at a time with :func:`rocket_snake.RLS_Client.get_players`.
+
+        :param unique_id_platform_pairs: The players, as in :func:`rocket_snake.RLS_Client.get_players`.
+        :return How many players were added (players that were already in the queue aren't).
+        :rtype :class:`int`
+        """
+        return self._add(KIND_PLAYER, (_player_key(unique_id, platform)
+                                       for unique_id, platform in unique_id_platform_pairs))
+
+    def add_searches(self, display_names):
+        """Adds display names to search for (all pages of results), and returns how many were added."""
+        return self._add(KIND_SEARCH, display_names)
+
+    def add_ranked_leaderboards(self, playlists):
+        """Adds ranked leaderboards to fetch, by playlist id or :class:`data_classes.Playlist`."""
+        return self._add(KIND_RANKED_LEADERBOARD, (str(playlist if isinstance(playlist, int) else playlist.id)
+                                                   for playlist in playlists))
+
+    def add_stats_leaderboards(self, stat_types):
+        """Adds stat leaderboards to fetch, by the ``LEADERBOARD_*`` constants in :mod:`rocket_snake.constants`."""
+        return self._add(KIND_STATS_LEADERBOARD, stat_types)
+
+    def counts(self):
+        """Gets how many fetches are pending, in_flight, done and failed, as a dict."""
+        counts = {name: 0 for name in _STATE_NAMES.values()}
+        for state, count in self._connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+            counts[_STATE_NAMES[state]] = count
+        return counts
+
+    def progress(self):
+        """
+        Gets the counts (see :func:`JobQueue.counts`), the fraction of fetches that are finished (done or failed),
+        and the rate of fetches per second and the estimated seconds left, from the current or latest run. The rate
+        and the estimate are None before anything has been finished.
+
+        :rtype :class:`dict`
+        """
+        progress = self.counts()
+        total = sum(progress.values())
+        left = progress["pending"] + progress["in_flight"]
+        progress["finished_fraction"] = (total - left) / total if total else 1.0
+
+        elapsed = None if self._run_started_at is None else basic_requests.clock() - self._run_started_at
+        rate = self._finished_this_run / elapsed if elapsed and self._finished_this_run else None
+        progress["per_second"] = rate
+        progress["eta_seconds"] = None if rate is None else left / rate
+        return progress
+
+    def _claim(self):
+        """Marks the next fetch (up to 10 for players) as in flight, and returns the [(id, kind, key)] of them."""
+        first = self._connection.execute("SELECT id, kind, key FROM jobs WHERE state = ? ORDER BY id LIMIT 1",
+                                         (STATE_PENDING,)).fetchone()
+        if first is None:
+            return []
+
+        if first[1] == KIND_PLAYER:
+            jobs = self._connection.execute(
+                    "SELECT id, kind, key FROM jobs WHERE state = ? AND kind = ? ORDER BY id LIMIT ?",
+                    (STATE_PENDING, KIND_PLAYER, self.players_per_request)).fetchall()
+        else:
+            jobs = [first]
+
+        self._connection.executemany("UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                                     ((STATE_IN_FLIGHT, basic_requests.clock(), job[0]) for job in jobs))
+        return jobs
+
+    def _finish(self, job_id: int, state: int, data=None, error: str = None):
+        self._connection.execute("UPDATE jobs SET state = ?, updated_at = ?, error = ? WHERE id = ?",
+                                 (state, basic_requests.clock(), error, job_id))
+        if state == STATE_DONE:
+            self._connection.execute("INSERT OR REPLACE INTO results (job_id, data) VALUES (?, ?)",
+                                     (job_id, json.dumps(data)))
+
+        if state != STATE_PENDING:
+            self._finished_this_run += 1
+            self._unsaved += 1
+            if self._unsaved >= self.checkpoint_every:
+                self.checkpoint()
+
+    def _retry_or_fail(self, job_id: int, error: Exception):
+        attempts = self._connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        self._finish(job_id, STATE_FAILED if attempts >= self.max_attempts else STATE_PENDING,
+                     error="{0}: {1}".format(type(error).__name__, str(error).split("\n", 1)[0]))
+
+    async def _fetch(self, client, kind: str, keys: list):
+        """Fetches the data for some jobs of one kind, as a list with the data of each job."""
+        if kind == KIND_PLAYER:
+            pairs = [_decode_key(kind, key) for key in keys]
+            try:
+                players = await client.get_players(pairs)
+            except custom_exceptions.APINotFoundError:
+                players = [None] * len(pairs)
+            return [None if player is None else player.to_dict() for player in players]
+
+        if kind == KIND_SEARCH:
+            players = await client.search_player(keys[0], get_all=True)
+        elif kind == KIND_RANKED_LEADERBOARD:
+            players = await client.get_ranked_leaderboard(_decode_key(kind, keys[0]))
+        elif kind == KIND_STATS_LEADERBOARD:
+            players = await client.get_stats_leaderboard(keys[0])
+        else:
+            raise ValueError("Unknown kind of job: {0}".format(kind))
+
+        return [[player.to_dict() for player in players]]
+
+    async def _work(self, client, max_fetches):
+        while max_fetches is None or self._finished_this_run < max_fetches:
+            jobs = self._claim()
+            if not jobs:
+                return
+
+            self.requests += 1
+            try:
+                results = await self._fetch(client, jobs[0][1], [job[2] for job in jobs])
+            except custom_exceptions.APINotFoundError:
+                results = [[]] * len(jobs)
+            except ConnectionError as e:
+                for job in jobs:
+                    self._retry_or_fail(job[0], e)
+                continue
+
+            for job, data in zip(jobs, results):
+                self._finish(job[0], STATE_DONE, data)
+
+    async def run(self, client, concurrency: int = 4, max_fetches: int = None):
+        """
+        Does the pending fetches with a client until there are none left. Fetches that fail with a
+        :class:`ConnectionError` are tried again later, up to max_attempts times.
+
+        :param client: The client to do the requests with. The requests go through its rate limiting.
+        :param concurrency: How many requests are waiting for the client at once. More than one keeps the rate
+            limiting busy while slow requests (like :func:`rocket_snake.RLS_Client.get_players`) are being done.
+        :param max_fetches: Stop after about this many fetches have been finished.
+        :type client: :class:`rocket_snake.RLS_Client`
+        :type concurrency: :class:`int`, default is ``4``.
+        :type max_fetches: :class:`int`, default is ``None`` (no maximum).
+        :return How many fetches were finished.
+        :rtype :class:`int`
+        """
+        self._finished_this_run = 0
+        self._run_started_at = basic_requests.clock()
+
+        try:
+            await asyncio.gather(*[self._work(client, max_fetches) for _ in range(concurrency)])
+        finally:
+            self.checkpoint()
+
+        return self._finished_this_run
+
+    def results(self, kind: str = None):
+        """
+        Iterates over the fetched data, in the order the work was added.
+
+        :param kind: Only the data of this kind of fetch (one of the ``KIND_*`` constants), all kinds if None.
+        :return (kind, key, data) tuples. For players, the key is the (unique id, platform) pair and the data is a
+            :class:`data_classes.Player` (None if it couldn't be found). For searches and leaderboards, the key is
+            the display name, playlist id or stat type, and the data is a :class:`list` of
+            :class:`data_classes.Player`.
+        :rtype An iterator of :class:`tuple`
+        """
+        query = "SELECT jobs.kind, jobs.key, results.data FROM jobs JOIN results ON results.job_id = jobs.id"
+        parameters = ()
+        if kind is not None:
+            query += " WHERE jobs.kind = ?"
+            parameters = (kind,)
+
+        for row_kind, key, data in self._connection.execute(query + " ORDER BY jobs.id", parameters):
+            data = json.loads(data)
+            if row_kind == KIND_PLAYER:
+                data = None if data is None else data_classes.Player.from_dict(data)
+            else:
+                data = [data_classes.Player.from_dict(player_data) for player_data in data]
+            yield row_kind, _decode_key(row_kind, key), data
+
+    def failures(self):
+        """Iterates over the (kind, key, error) of the fetches that failed, with keys as in :func:`JobQueue.results`."""
+        for kind, key, error in self._connection.execute("SELECT kind, key, error FROM jobs WHERE state = ? "
+                                                         "ORDER BY id", (STATE_FAILED,)):
+            yield kind, _decode_key(kind, key), error
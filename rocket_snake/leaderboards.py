@@ -0,0 +1,426 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Keeps snapshots of the leaderboards up to date in the background, so they can be read without any requests.
+Leaderboards are identified by tuples, ``(RANKED, playlist_id)`` for ranked leaderboards and ``(STATS, stat_type)``
+for stat leaderboards.
+"""
+
+import asyncio
+import bisect
+import copy
+import heapq
+import time
+
+from . import basic_requests, data_classes
+from .constants import LEADERBOARD_TYPES, RANKED_PLAYLISTS_IDS
+
+RANKED = "ranked"  # The first element of a ranked leaderboard tuple
+STATS = "stats"  # The first element of a stat leaderboard tuple
+
+# All the leaderboards the api has, useful for looping over
+ALL_BOARDS = tuple([(RANKED, playlist_id) for playlist_id in sorted(RANKED_PLAYLISTS_IDS)] +
+                   [(STATS, stat_type) for stat_type in sorted(LEADERBOARD_TYPES)])
+
+
+def player_key(player):
+    """The key that identifies a player across leaderboards, see :func:`data_classes.player_key`."""
+    return data_classes.player_key(player.uid, player.platform)
+
+
+def rank_points(player, playlist_id: int, season_id=None):
+    """
+    Gets the rank points of a player in a playlist, or None if the player doesn't have any.
+
+    :param season_id: The season to get the rank points from. If not supplied, the latest season the player has
+        ranked data for is used.
+    """
+    if not player.ranked_seasons:
+        return None
+
+    if season_id is None:
+        season_id = max(player.ranked_seasons, key=lambda season: int(season))
+
+    if season_id not in player.ranked_seasons:
+        season_id = str(season_id)
+        if season_id not in player.ranked_seasons:
+            return None
+
+    rank = player.ranked_seasons[season_id].get(str(playlist_id), None) or \
+        player.ranked_seasons[season_id].get(playlist_id, None)
+    return None if rank is None else rank.rankPoints
+
+
+def _metric_function(metric):
+    """Turns a metric (a stat name, a ranked playlist id or a function) into a function of a player."""
+    if callable(metric):
+        return metric
+    elif isinstance(metric, int):
+        return lambda player: rank_points(player, metric)
+    elif isinstance(metric, str):
+        return lambda player: None if not player.stats else player.stats.get(metric, None)
+    else:
+        raise ValueError("Unknown metric: {0}".format(metric))
+
+
+def diff_snapshots(board, old_players, new_players):
+    """
+    Computes what changed on a leaderboard between two lists of players.
+
+    :return The changes.
+    :rtype A :class:`data_classes.LeaderboardDiff`.
+    """
+    old_ranks = {player_key(player): rank for rank, player in enumerate(old_players, 1)}
+    new_ranks = {player_key(player): rank for rank, player in enumerate(new_players, 1)}
+    old_by_key = {player_key(player): player for player in old_players}
+
+    entered = [player for player in new_players if player_key(player) not in old_ranks]
+    exited = [player for player in old_players if player_key(player) not in new_ranks]
+
+    moved = {}
+    stat_deltas = {}
+    for player in new_players:
+        key = player_key(player)
+        if key not in old_ranks:
+            continue
+
+        if old_ranks[key] != new_ranks[key]:
+            moved[key] = (old_ranks[key], new_ranks[key])
+
+        old_player = old_by_key[key]
+        # Unchanged players are reused between snapshots, so they can't have any deltas
+        if old_player is player or not old_player.stats or not player.stats:
+            continue
+
+        deltas = {stat: value - old_player.stats.get(stat, 0) for stat, value in player.stats.items()
+                  if isinstance(value, (int, float)) and value != old_player.stats.get(stat, 0)}
+        if deltas:
+            stat_deltas[key] = deltas
+
+    return data_classes.LeaderboardDiff(board, entered, exited, moved, stat_deltas)
+
+
+class MergedLeaderboards(object):
+    """
+    A set of leaderboards where each player, identified by :func:`data_classes.player_key`, is a single shared
+    :class:`data_classes.Player` object across all the leaderboards. Created by
+    :func:`rocket_snake.RLS_Client.get_all_leaderboards`.
+
+    :var boards: The leaderboards, {board: list of players}, where each list is in the api's order (descending).
+    :var players: All the players on any of the leaderboards, {(uid, casefolded platform): player}.
+    """
+
+    def __init__(self, boards: dict):
+        self.boards = boards
+        self.players = {}
+
+        for board_players in boards.values():
+            for player in board_players:
+                self.players.setdefault(player_key(player), player)
+
+    def __getitem__(self, board):
+        return self.boards[board]
+
+    def __len__(self):
+        return len(self.players)
+
+    def top(self, k: int, metric):
+        """
+        Gets the top players of all the leaderboards by a metric. Players without a value for the metric are left out.
+
+        :param k: The number of players to get.
+        :param metric: What to order the players by. Either a stat name (one of the ``LEADERBOARD_*`` constants), a
+            ranked playlist id (orders by rank points in the latest season), or a function that takes a player and
+            returns a value (or None).
+        :return The top players, descending.
+        :rtype A :class:`list` of :class:`data_classes.Player` objects.
+        """
+        metric_function = _metric_function(metric)
+        valued_players = ((metric_function(player), index, player) for index, player in enumerate(self.players.values()))
+
+        # The index is there so players with equal values are never compared
+        return [player for value, index, player in
+                heapq.nlargest(k, (entry for entry in valued_players if entry[0] is not None),
+                               key=lambda entry: (entry[0], -entry[1]))]
+
+
+class LeaderboardRefresher(object):
+    """
+    Refreshes a set of leaderboards in the background and keeps the latest snapshot of each one.
+    The refreshes are spread evenly over the refresh interval, so the refresher never uses more than one request
+    per ``interval_seconds / len(boards)`` seconds of the rate budget.
+
+    Players whose raw data hasn't changed since the last refresh are reused instead of being parsed again.
+    If the client has an identity map, the snapshots hold copies of the players as they were on the leaderboard,
+    since the client's shared players are updated in place by other responses.
+
+    :param client: The client to do the requests with.
+    :param boards: The leaderboards to keep up to date. If not supplied, all leaderboards (``ALL_BOARDS``) are used.
+    :param interval_seconds: How often each leaderboard should be refreshed.
+    :type client: :class:`rocket_snake.RLS_Client`
+    :type boards: An iterable of leaderboard tuples.
+    :type interval_seconds: :class:`float`, default is ``300``.
+    """
+
+    def __init__(self, client, boards=None, interval_seconds: float = 300):
+        self._client = client
+        self.boards = tuple(ALL_BOARDS if boards is None else boards)
+
+        if not self.boards:
+            raise ValueError("At least one leaderboard has to be refreshed.")
+
+        self.interval_seconds = interval_seconds
+
+        # {board: data_classes.LeaderboardSnapshot}
+        self._snapshots = {}
+        # {board: data_classes.LeaderboardDiff}
+        self._diffs = {}
+        # {board: {(uid, platform): (raw_player_data, data_classes.Player)}}
+        self._raw_players = {}
+        # {board: Exception}, the error from the last refresh of each board, if it failed
+        self._errors = {}
+
+        self._listeners = []
+        self._task = None
+
+    @property
+    def spacing_seconds(self):
+        """The time between two consecutive refreshes, never less than what the rate limiting allows."""
+        return max(self.interval_seconds / len(self.boards), basic_requests.throughput_time_seconds)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def add_listener(self, callback):
+        """Adds a callable that is called with every :class:`data_classes.LeaderboardDiff` after a refresh."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def snapshot(self, board):
+        """
+        Gets the latest snapshot of a leaderboard, without doing any requests.
+
+        :return The snapshot, or None if the leaderboard hasn't been fetched yet.
+        :rtype A :class:`data_classes.LeaderboardSnapshot`.
+        """
+        return self._snapshots.get(board, None)
+
+    def players(self, board):
+        """Gets the players on the latest snapshot of a leaderboard, or an empty list if it hasn't been fetched yet."""
+        snapshot = self._snapshots.get(board, None)
+        return [] if snapshot is None else list(snapshot.players)
+
+    def last_diff(self, board):
+        """Gets the :class:`data_classes.LeaderboardDiff` from the latest refresh of a leaderboard, or None."""
+        return self._diffs.get(board, None)
+
+    def last_error(self, board):
+        """Gets the exception the latest refresh of a leaderboard failed with, or None if it succeeded."""
+        return self._errors.get(board, None)
+
+    async def refresh(self, board):
+        """
+        Fetches a leaderboard now and updates its snapshot.
+
+        :return What changed since the previous snapshot. On the first refresh, every player has entered.
+        :rtype A :class:`data_classes.LeaderboardDiff`.
+        """
+        board_type, board_id = board
+        if board_type == RANKED:
+            raw_leaderboard_data = await self._client._request(basic_requests.get_ranked_leaderboard, board_id)
+        elif board_type == STATS:
+            raw_leaderboard_data = await self._client._request(basic_requests.get_stats_leaderboard, board_id)
+        else:
+            raise ValueError("Unknown leaderboard: {0}".format(board))
+
+        old_raw_players = self._raw_players.get(board, {})
+        new_raw_players = {}
+        players = []
+
+        for raw_player_data in raw_leaderboard_data:
+            key = data_classes.player_key(raw_player_data["uniqueId"], raw_player_data["platform"]["name"])
+            old_entry = old_raw_players.get(key, None)
+
+            if old_entry is not None and old_entry[0] == raw_player_data:
+                # The client still sees the player, even if we don't create it again. With an identity map, the
+                # snapshot's copy is older than what the shared player might have been updated with since, so it
+                # isn't seen again
+                player = old_entry[1]
+                if self._client.identity_map is None:
+                    self._client._player_seen(player)
+            else:
+                player = self._client._player_from_raw(raw_player_data)
+                if self._client.identity_map is not None:
+                    # The client's player is shared and updated in place by other responses, so the snapshot keeps
+                    # a copy of the player as it is on this leaderboard
+                    player = copy.copy(player)
+
+            new_raw_players[key] = (raw_player_data, player)
+            players.append(player)
+
+        old_snapshot = self._snapshots.get(board, None)
+        diff = diff_snapshots(board, () if old_snapshot is None else old_snapshot.players, players)
+
+        self._raw_players[board] = new_raw_players
+        self._snapshots[board] = data_classes.LeaderboardSnapshot(board, tuple(players), time.time())
+        self._diffs[board] = diff
+        self._errors.pop(board, None)
+
+        for listener in list(self._listeners):
+            listener(diff)
+
+        return diff
+
+    def start(self):
+        """Starts refreshing in the background on the client's event loop. Does nothing if already running."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run(), loop=self._client._event_loop)
+
+    def stop(self):
+        """Stops refreshing in the background. The snapshots are kept."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            for board in self.boards:
+                try:
+                    await self.refresh(board)
+                except ConnectionError as e:
+                    # We keep the old snapshot if the api didn't cooperate
+                    self._errors[board] = e
+
+                await asyncio.sleep(self.spacing_seconds)
+
+
+class LeaderboardRanks(object):
+    """
+    Answers where a value or a player would rank on leaderboards, without any requests. The values of each leaderboard
+    (rank points for ranked leaderboards, the stat for stat leaderboards) are kept in a sorted list, so a query is a
+    binary search.
+
+    When given a refresher, the leaderboards are kept up to date with it. Only the players whose values changed since the
+    last refresh are moved in the sorted lists.
+
+    Ranks are 1 for the highest value, and a value lower than every value on a leaderboard ranks just below it, since
+    the api only has the top of each leaderboard.
+
+    :param refresher: The refresher to keep the leaderboards up to date with.
+    :type refresher: :class:`LeaderboardRefresher`
+    """
+
+    def __init__(self, refresher: LeaderboardRefresher = None):
+        # {board: [values, ascending]}
+        self._values = {}
+        # {board: {(uid, platform): (data_classes.Player, value)}}
+        self._players = {}
+
+        self._refresher = refresher
+        if refresher is not None:
+            for board in refresher.boards:
+                if refresher.snapshot(board) is not None:
+                    self.update(board, refresher.snapshot(board).players)
+            refresher.add_listener(self._refreshed)
+
+    @property
+    def boards(self):
+        return tuple(self._values)
+
+    def close(self):
+        """Stops following the refresher."""
+        if self._refresher is not None:
+            self._refresher.remove_listener(self._refreshed)
+            self._refresher = None
+
+    def _refreshed(self, diff):
+        self.update(diff.board, self._refresher.snapshot(diff.board).players)
+
+    def update(self, board, players):
+        """Replaces the players of a leaderboard. Only the values of players that changed are moved."""
+        metric = _metric_function(board[1])
+        values = self._values.setdefault(board, [])
+        old_players = self._players.get(board, {})
+        new_players = {}
+
+        for player in players:
+            key = player_key(player)
+            old_entry = old_players.pop(key, None)
+            # Players can be the same objects as before with new values, when an identity map updates them in place
+            value = metric(player)
+
+            if old_entry is not None and old_entry[1] == value:
+                new_players[key] = (player, value)
+                continue
+
+            if old_entry is not None and old_entry[1] is not None:
+                del values[bisect.bisect_left(values, old_entry[1])]
+
+            if value is not None:
+                bisect.insort(values, value)
+            new_players[key] = (player, value)
+
+        # The players that are left have left the leaderboard
+        for _, value in old_players.values():
+            if value is not None:
+                del values[bisect.bisect_left(values, value)]
+
+        self._players[board] = new_players
+
+    def _value(self, board, value_or_player):
+        if isinstance(value_or_player, (int, float)):
+            return value_or_player
+        return _metric_function(board[1])(value_or_player)
+
+    def rank(self, board, value_or_player):
+        """
+        Gets the rank a value (rank points or a stat) or a player would have on a leaderboard.
+
+        :return The rank, 1 being the top, or None if the leaderboard isn't known or the player doesn't have a value
+            for it.
+        :rtype :class:`int`
+        """
+        value = self._value(board, value_or_player)
+        values = self._values.get(board, None)
+        if value is None or values is None:
+            return None
+
+        # Players with the same value share the best rank
+        return len(values) - bisect.bisect_right(values, value) + 1
+
+    def percentile(self, board, value_or_player):
+        """
+        Gets the percentage of the players on a leaderboard that have a value lower than or the same as a value or a
+        player.
+
+        :return The percentile, from 0 to 100, or None if the leaderboard isn't known, is empty or the player doesn't
+            have a value for it.
+        :rtype :class:`float`
+        """
+        value = self._value(board, value_or_player)
+        values = self._values.get(board, None)
+        if value is None or not values:
+            return None
+
+        return 100 * bisect.bisect_right(values, value) / len(values)
+
+    def values(self, board):
+        """Gets the values of a leaderboard, ascending."""
+        return list(self._values.get(board, ()))
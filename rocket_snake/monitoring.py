@@ -0,0 +1,269 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Measures how late the event loop runs scheduled callbacks (its lag), and how long each phase of the client's requests
+takes, to find out if and where the client blocks the event loop.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from collections import deque
+
+# The phases of a request
+PHASE_QUEUE = "queue"  # Waiting for the ratelimiting
+PHASE_HTTP = "http"  # Sending the request and reading the response
+PHASE_CONNECT = "connect"  # Connecting to the api server (part of http, needs aiohttp 3)
+PHASE_TTFB = "ttfb"  # From starting the request to receiving the response headers (part of http)
+PHASE_BODY = "body"  # Reading the response body (part of http)
+PHASE_DECODE = "decode"  # Decoding (and parsing, if the request has a parser) the JSON on the event loop
+PHASE_OFFLOADED_DECODE = "offloaded_decode"  # Decoding (and parsing) in the parse executor
+PHASE_ERROR = "error"  # Creating the exception for a bad response
+PHASE_BUILD = "build"  # Creating data_classes objects in the client
+PHASE_REQUEST = "request"  # All of a client request, from queueing to building
+
+# The phases that run on the event loop without yielding, so they block it for their whole duration
+BLOCKING_PHASES = {PHASE_DECODE, PHASE_ERROR, PHASE_BUILD}
+
+
+class Histogram(object):
+    """
+    A histogram of durations with fixed buckets, so it uses the same memory no matter how many durations it has.
+
+    :param bounds: The upper bounds of the buckets in seconds, ascending. A last bucket without upper bound is added.
+    """
+
+    default_bounds = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30)
+
+    def __init__(self, bounds=default_bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float):
+        """Gets the upper bound of the bucket the percentile (0 to 100) is in, capped at the maximum."""
+        if not self.count:
+            return 0.0
+
+        needed = percentile / 100 * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= needed and count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        """Gets the count, mean, 50th, 90th and 99th percentiles and maximum as a dict."""
+        return {"count": self.count, "mean": self.mean, "p50": self.percentile(50), "p90": self.percentile(90),
+                "p99": self.percentile(99), "max": self.max}
+
+
+class LoopLagMonitor(object):
+    """
+    Measures the lag of an event loop by regularly scheduling a sleep and measuring how late it wakes up, and records
+    the durations of the phases of the client's requests (pass it to :class:`rocket_snake.RLS_Client` as ``monitor``).
+
+    Blocking phases (see ``BLOCKING_PHASES``) that take longer than slow_seconds are counted as slow. When the lag is
+    over slow_seconds, the blocking phases that ran while the loop was late are counted in ``lag_phases``, so the lag
+    is attributed to the phases that caused it. Lag while no blocking phase ran is counted in ``unattributed_lag``.
+
+    :param interval_seconds: How often the lag is measured.
+    :param slow_seconds: How long a blocking phase may take, and how much lag there may be, before it's counted as
+        slow.
+    :type interval_seconds: :class:`float`, default is ``0.05``.
+    :type slow_seconds: :class:`float`, default is ``0.01``.
+    """
+
+    # How many of the latest blocking spans are kept to attribute lag to
+    recent_spans = 256
+
+    def __init__(self, interval_seconds: float = 0.05, slow_seconds: float = 0.01):
+        self.interval_seconds = interval_seconds
+        self.slow_seconds = slow_seconds
+
+        self.lag = Histogram()
+        # {phase: Histogram}
+        self.phases = {}
+        # {phase: number of times it blocked the event loop for longer than slow_seconds}
+        self.slow_phases = {}
+        # {endpoint: {phase: total seconds}}, for the blocking phases
+        self.blocking_by_endpoint = {}
+        # {phase: number of slow lag samples it ran during}
+        self.lag_phases = {}
+        # The number of slow lag samples no blocking phase ran during
+        self.unattributed_lag = 0
+
+        # (start, end, phase) of the latest blocking spans
+        self._blocking_spans = deque(maxlen=self.recent_spans)
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        """Starts measuring the lag of the loop (the default event loop if not supplied). Does nothing if running."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run(), loop=loop)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected_wake = time.perf_counter() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.add_lag(expected_wake, time.perf_counter())
+
+    def add_lag(self, expected_wake: float, wake: float):
+        """
+        Records a lag sample of a callback that was scheduled for expected_wake but ran at wake
+        (:func:`time.perf_counter` times). If the lag is slow, it's attributed to the blocking phases that ran between
+        the two.
+        """
+        lag = max(0.0, wake - expected_wake)
+        self.lag.add(lag)
+        if lag <= self.slow_seconds:
+            return
+
+        phases = {phase for start, end, phase in self._blocking_spans if start < wake and end > expected_wake}
+        for phase in phases:
+            self.lag_phases[phase] = self.lag_phases.get(phase, 0) + 1
+        if not phases:
+            self.unattributed_lag += 1
+
+    def record_span(self, phase: str, start: float, end: float, endpoint: str = None):
+        """Records that a phase of a request to an endpoint ran from start to end (:func:`time.perf_counter` times)."""
+        duration = end - start
+        self.phases.setdefault(phase, Histogram()).add(duration)
+
+        if phase in BLOCKING_PHASES:
+            self._blocking_spans.append((start, end, phase))
+            if duration > self.slow_seconds:
+                self.slow_phases[phase] = self.slow_phases.get(phase, 0) + 1
+
+            endpoint_phases = self.blocking_by_endpoint.setdefault(endpoint, {})
+            endpoint_phases[phase] = endpoint_phases.get(phase, 0.0) + duration
+
+    def report(self):
+        """
+        Gets everything that has been measured.
+
+        :return {"loop_lag": summary, "phases": {phase: summary}, "slow_phases": {phase: count},
+            "lag_phases": {phase: count}, "unattributed_lag": count,
+            "blocking_by_endpoint": {endpoint: {phase: seconds}}}, where the summaries are from
+            :func:`Histogram.summary`.
+        :rtype :class:`dict`
+        """
+        return {
+            "loop_lag": self.lag.summary(),
+            "phases": {phase: histogram.summary() for phase, histogram in self.phases.items()},
+            "slow_phases": dict(self.slow_phases),
+            "lag_phases": dict(self.lag_phases),
+            "unattributed_lag": self.unattributed_lag,
+            "blocking_by_endpoint": {endpoint: dict(phases) for endpoint, phases in self.blocking_by_endpoint.items()},
+        }
+
+    def format_report(self):
+        """Gets the report as a human readable string, with times in milliseconds."""
+        lines = ["Event loop lag: " + self._format_summary(self.lag.summary())]
+        if self.lag_phases or self.unattributed_lag:
+            lines.append("Slow lag during: {0}".format(", ".join(
+                    ["{0} {1}".format(phase, count) for phase, count in sorted(self.lag_phases.items())] +
+                    ["no request phase {0}".format(self.unattributed_lag)] * bool(self.unattributed_lag))))
+
+        for phase, histogram in sorted(self.phases.items()):
+            lines.append("Phase {0}{1}: {2}{3}".format(
+                    phase, " (blocking)" if phase in BLOCKING_PHASES else "", self._format_summary(histogram.summary()),
+                    ", {0} slow".format(self.slow_phases[phase]) if phase in self.slow_phases else ""))
+
+        for endpoint, phases in sorted(self.blocking_by_endpoint.items(), key=lambda item: -sum(item[1].values())):
+            lines.append("Blocked by {0}: {1}".format(endpoint, ", ".join(
+                    "{0} {1} ms".format(phase, round(seconds * 1000, 2)) for phase, seconds in sorted(phases.items()))))
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def _format_summary(summary: dict):
+        return "{0} samples, mean {1} ms, p50 {2} ms, p90 {3} ms, p99 {4} ms, max {5} ms".format(
+                summary["count"], *(round(summary[key] * 1000, 2) for key in ("mean", "p50", "p90", "p99", "max")))
+
+
+class SlowRequestLog(object):
+    """
+    A trace hook (see :func:`rocket_snake.RLS_Client.add_trace_hook`) that keeps and logs the requests that took at
+    least threshold_seconds, with how long each of their phases took.
+
+    The requests are logged as warnings to the ``rocket_snake.monitoring`` logger.
+
+    :param threshold_seconds: How long a request has to take to be slow.
+    :param max_entries: How many of the latest slow requests are kept in ``entries``.
+    :type threshold_seconds: :class:`float`, default is ``1``.
+    :type max_entries: :class:`int`, default is ``100``.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, threshold_seconds: float = 1, max_entries: int = 100):
+        self.threshold_seconds = threshold_seconds
+        # The latest slow requests, as (request span, [the spans of its phases]) tuples
+        self.entries = deque(maxlen=max_entries)
+        # {request id: [spans]}, for the requests that haven't finished yet
+        self._pending = {}
+
+    def __call__(self, span):
+        if span.request_id is None:
+            # The span isn't part of a request, so there's nothing to collect it with
+            return
+
+        if span.phase != PHASE_REQUEST:
+            self._pending.setdefault(span.request_id, []).append(span)
+            return
+
+        spans = self._pending.pop(span.request_id, [])
+        if span.end - span.start >= self.threshold_seconds:
+            self.entries.append((span, spans))
+            self.logger.warning(self.format_entry(span, spans))
+
+    @staticmethod
+    def format_entry(request_span, spans):
+        """Formats a slow request as a single line, with the total time of each phase in milliseconds."""
+        phase_seconds = {}
+        for span in spans:
+            phase_seconds[span.phase] = phase_seconds.get(span.phase, 0.0) + span.end - span.start
+
+        return "Slow request {0} to {1}: {2} ms ({3})".format(
+                request_span.request_id, request_span.endpoint,
+                round((request_span.end - request_span.start) * 1000, 2),
+                ", ".join("{0} {1} ms".format(phase, round(seconds * 1000, 2))
+                          for phase, seconds in phase_seconds.items()))
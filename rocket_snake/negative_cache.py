@@ -0,0 +1,90 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""Remembers the players the api couldn't find, so they aren't requested again for a while."""
+
+import hashlib
+from collections import OrderedDict
+
+from . import basic_requests
+from .data_classes import player_key
+
+
+def _player_hash(unique_id: str, platform: str):
+    # 8 bytes per player instead of the strings, the chance of a collision is negligible
+    return int.from_bytes(hashlib.sha1("{0}\0{1}".format(*player_key(unique_id, platform)).encode("utf-8"))
+                          .digest()[:8], "little")
+
+
+class NegativeCache(object):
+    """
+    A set of (unique id, platform) pairs the api reported as missing, where each pair is forgotten after ttl_seconds.
+    When there are more than max_entries pairs, the oldest ones are forgotten first.
+
+    Pairs are kept as 64 bit hashes, so the memory used doesn't depend on the length of the unique ids.
+
+    :param ttl_seconds: How long a missing player is remembered.
+    :param max_entries: The maximum amount of missing players remembered.
+    :type ttl_seconds: :class:`float`, default is ``3600``.
+    :type max_entries: :class:`int`, default is ``100000``.
+    """
+
+    def __init__(self, ttl_seconds: float = 60 * 60, max_entries: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # {hash: expiry time}, in the order the entries expire, because they all have the same ttl
+        self._expiry_times = OrderedDict()
+
+        # How many requests for players have been skipped because of this
+        self.skipped = 0
+
+    def __len__(self):
+        self._expire()
+        return len(self._expiry_times)
+
+    def __contains__(self, unique_id_platform_pair):
+        player_hash = _player_hash(*unique_id_platform_pair)
+        expiry_time = self._expiry_times.get(player_hash, None)
+
+        if expiry_time is None:
+            return False
+        if expiry_time <= basic_requests.clock():
+            del self._expiry_times[player_hash]
+            return False
+        return True
+
+    def add(self, unique_id: str, platform: str):
+        """Remembers that a player is missing (for ttl_seconds from now)."""
+        self._expire()
+
+        player_hash = _player_hash(unique_id, platform)
+        self._expiry_times.pop(player_hash, None)
+        self._expiry_times[player_hash] = basic_requests.clock() + self.ttl_seconds
+
+        while len(self._expiry_times) > self.max_entries:
+            self._expiry_times.popitem(last=False)
+
+    def discard(self, unique_id: str, platform: str):
+        """Forgets that a player is missing, for example because the player has been seen."""
+        self._expiry_times.pop(_player_hash(unique_id, platform), None)
+
+    def clear(self):
+        self._expiry_times.clear()
+
+    def _expire(self):
+        now = basic_requests.clock()
+        while self._expiry_times and next(iter(self._expiry_times.values())) <= now:
+            self._expiry_times.popitem(last=False)
@@ -0,0 +1,247 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Keeps the players the client has seen in any response, so they can be used instead of requesting them again, and
+refreshes the most used ones in the background.
+"""
+
+import asyncio
+import heapq
+import logging
+from collections import OrderedDict
+
+from . import basic_requests, custom_exceptions
+from .constants import ALL_PLATFORMS
+from .data_classes import player_key
+
+# {casefolded platform: platform constant}, to request players with the platform names the api uses for them
+_PLATFORM_CONSTANTS = {platform.casefold(): platform for platform in ALL_PLATFORMS}
+
+
+class PlayerCache(object):
+    """
+    The latest data of players, with the times they were fetched at. The client adds every player it creates to it
+    (see the ``player_cache`` parameter of :class:`rocket_snake.RLS_Client`), including the players on leaderboards
+    and in search results, and :func:`RLS_Client.get_player` and :func:`RLS_Client.get_players` use the players in it
+    that are fresh instead of requesting them.
+
+    How often each player is looked up is counted too, as a popularity that halves every
+    ``popularity_half_life_seconds`` without lookups. :class:`RefreshScheduler` uses it to choose what to refresh.
+
+    :param max_age_seconds: How long after being fetched a player is fresh.
+    :param max_players: The maximum amount of players kept, the least recently fetched are removed first.
+    :param popularity_half_life_seconds: How fast the popularity of players that aren't looked up decays.
+    :type max_age_seconds: :class:`float`, default is ``300``.
+    :type max_players: :class:`int`, default is ``100000``.
+    :type popularity_half_life_seconds: :class:`float`, default is ``3600``.
+    """
+
+    def __init__(self, max_age_seconds: float = 5 * 60, max_players: int = 100000,
+                 popularity_half_life_seconds: float = 60 * 60):
+        self.max_age_seconds = max_age_seconds
+        self.max_players = max_players
+        self.popularity_half_life_seconds = popularity_half_life_seconds
+        # {(uid, casefolded platform): (fetched at, data_classes.Player)}, least recently fetched first
+        self._players = OrderedDict()
+        # {(uid, casefolded platform): (popularity, when it was last updated)}, only for players that are kept
+        self._popularity = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._players)
+
+    def add(self, player, fetched_at: float = None):
+        """Adds a player, replacing any older data of the same player. fetched_at is now if not supplied."""
+        key = player_key(player.uid, player.platform)
+        self._players.pop(key, None)
+        self._players[key] = (basic_requests.clock() if fetched_at is None else fetched_at, player)
+
+        while len(self._players) > self.max_players:
+            evicted_key, _ = self._players.popitem(last=False)
+            self._popularity.pop(evicted_key, None)
+
+    def get(self, unique_id: str, platform: str, max_age_seconds: float = None):
+        """
+        Gets a player if it's fresh, and counts it as a hit or a miss.
+
+        :param max_age_seconds: How old the player may be, the max_age_seconds of the cache if not supplied.
+        :return The player, or None if it isn't in the cache or isn't fresh.
+        :rtype :class:`data_classes.Player`
+        """
+        key = player_key(unique_id, platform)
+        entry = self._players.get(key, None)
+        max_age_seconds = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+        now = basic_requests.clock()
+
+        if entry is not None:
+            # Stale players are wanted too, they are the ones worth refreshing
+            self._popularity[key] = (self._decayed_popularity(key, now) + 1, now)
+
+        if entry is None or now - entry[0] > max_age_seconds:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    def fetched_at(self, unique_id: str, platform: str):
+        """Gets when a player was fetched, or None if it isn't in the cache."""
+        entry = self._players.get(player_key(unique_id, platform), None)
+        return None if entry is None else entry[0]
+
+    def _decayed_popularity(self, key, now: float):
+        popularity, updated_at = self._popularity.get(key, (0.0, now))
+        return popularity * 0.5 ** ((now - updated_at) / self.popularity_half_life_seconds)
+
+    def popularity(self, unique_id: str, platform: str):
+        """Gets how often a player has been looked up, where older lookups count less (see the class description)."""
+        return self._decayed_popularity(player_key(unique_id, platform), basic_requests.clock())
+
+    def most_valuable(self, k: int, min_age_seconds: float = 0):
+        """
+        Gets the players that are most worth refreshing, by their age (relative to max_age_seconds) times their
+        popularity. Players that have never been looked up, or were fetched less than min_age_seconds ago, aren't
+        included.
+
+        :return Up to k players, the most valuable first.
+        :rtype A :class:`list` of :class:`data_classes.Player`
+        """
+        now = basic_requests.clock()
+        candidates = []
+
+        for key in self._popularity:
+            fetched_at, player = self._players[key]
+            age = now - fetched_at
+            if age >= min_age_seconds:
+                candidates.append((age / self.max_age_seconds * self._decayed_popularity(key, now), player))
+
+        return [player for _, player in heapq.nlargest(k, candidates, key=lambda candidate: candidate[0])]
+
+    def discard(self, unique_id: str, platform: str):
+        key = player_key(unique_id, platform)
+        self._players.pop(key, None)
+        self._popularity.pop(key, None)
+
+    def clear(self):
+        self._players.clear()
+        self._popularity.clear()
+
+
+class RefreshScheduler(object):
+    """
+    Refreshes the players in a client's player cache that are most worth it (see :func:`PlayerCache.most_valuable`)
+    in the background, 10 at a time, with a fraction of the rate budget.
+
+    A refresh is only done when nothing else is waiting for the client's rate limiting, so live requests always come
+    first, and refreshes are spaced so they never use more than budget_fraction of the requests the rate limiting
+    allows.
+
+    :param client: The client to do the requests with. It has to have a player cache.
+    :param budget_fraction: The largest fraction of the rate budget used for refreshes, from 0 to 1.
+    :param min_age_seconds: Players fetched less than this long ago aren't refreshed.
+    :type client: :class:`rocket_snake.RLS_Client`
+    :type budget_fraction: :class:`float`, default is ``0.25``.
+    :type min_age_seconds: :class:`float`, default is ``60``.
+    """
+
+    batch_size = 10
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, client, budget_fraction: float = 0.25, min_age_seconds: float = 60):
+        if client.player_cache is None:
+            raise ValueError("The client has to have a player cache to refresh.")
+        if not 0 < budget_fraction <= 1:
+            raise ValueError("The budget fraction has to be between 0 and 1.")
+
+        self._client = client
+        self.budget_fraction = budget_fraction
+        self.min_age_seconds = min_age_seconds
+
+        self.requests = 0
+        self.refreshed = 0
+        self.last_error = None
+        self._task = None
+
+    @property
+    def spacing_seconds(self):
+        """The least time between two refreshes."""
+        return basic_requests.throughput_time_seconds / self.budget_fraction
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def refresh(self):
+        """
+        Refreshes the most valuable players now.
+
+        :return How many players were refreshed.
+        :rtype :class:`int`
+        """
+        player_cache = self._client.player_cache
+        players = player_cache.most_valuable(self.batch_size, self.min_age_seconds)
+        if not players:
+            return 0
+
+        # Players from leaderboards and searches have the api's platform names, which get_players doesn't know
+        pairs = [(player.uid, _PLATFORM_CONSTANTS.get(player.platform.casefold(), player.platform))
+                 for player in players]
+        self.requests += 1
+        try:
+            refreshed_players = await self._client.get_players(pairs, force_request=True)
+        except custom_exceptions.APINotFoundError:
+            refreshed_players = [None] * len(pairs)
+
+        for (unique_id, platform), player in zip(pairs, refreshed_players):
+            if player is None:
+                # The player is gone, so there is nothing to keep fresh
+                player_cache.discard(unique_id, platform)
+
+        refreshed = sum(player is not None for player in refreshed_players)
+        self.refreshed += refreshed
+        return refreshed
+
+    def start(self):
+        """Starts refreshing in the background on the client's event loop. Does nothing if already running."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run(), loop=self._client._event_loop)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.spacing_seconds)
+
+            if not self._client._has_spare_budget():
+                # Live requests are waiting, they get this turn
+                continue
+
+            try:
+                await self.refresh()
+                self.last_error = None
+            except ConnectionError as e:
+                # The players are refreshed again on a later turn if they are still the most valuable
+                self.last_error = e
+            except Exception as e:
+                # Anything else is a bug, but it shouldn't stop the refreshing of the other players
+                self.last_error = e
+                self.logger.exception("Refreshing players failed")
@@ -0,0 +1,295 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Tracks the population of playlists over time. Samples are kept in fixed-size ring buffers at several resolutions
+(raw samples, and averages over longer buckets), so the memory used stays the same however long the tracker runs.
+"""
+
+import asyncio
+import bisect
+from array import array
+
+from . import basic_requests
+
+# (bucket seconds, capacity) of each resolution, where 0 seconds means raw samples. The defaults keep about a week of
+# raw samples (at one per 5 minutes), a week of 5 minute averages and 90 days of hourly averages.
+DEFAULT_RESOLUTIONS = ((0, 2016), (5 * 60, 2016), (60 * 60, 90 * 24))
+
+
+class _RingTimes(object):
+    """A sequence view of the times in a ring buffer, oldest first, so :mod:`bisect` can be used on it."""
+
+    def __init__(self, ring):
+        self._ring = ring
+
+    def __len__(self):
+        return len(self._ring)
+
+    def __getitem__(self, index):
+        return self._ring._times[(self._ring._start + index) % self._ring.capacity]
+
+
+class RingBuffer(object):
+    """
+    A fixed-size buffer of (time, value) pairs in time order, backed by two arrays of doubles.
+    When it's full, appending overwrites the oldest pair.
+
+    :param capacity: The maximum amount of pairs kept.
+    :type capacity: :class:`int`
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("The capacity of a ring buffer has to be at least 1.")
+
+        self.capacity = capacity
+        self._times = array("d", [0.0]) * capacity
+        self._values = array("d", [0.0]) * capacity
+        # The physical index of the oldest pair
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if not -self._length <= index < self._length:
+            raise IndexError("Ring buffer index out of range")
+
+        physical_index = (self._start + index % self._length) % self.capacity
+        return self._times[physical_index], self._values[physical_index]
+
+    @property
+    def full(self):
+        return self._length == self.capacity
+
+    def append(self, time: float, value: float):
+        """Appends a pair, which has to be at least as new as the newest pair."""
+        if self._length < self.capacity:
+            physical_index = (self._start + self._length) % self.capacity
+            self._length += 1
+        else:
+            physical_index = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._times[physical_index] = time
+        self._values[physical_index] = value
+
+    def range(self, start: float = None, end: float = None):
+        """Gets the pairs with start <= time < end, oldest first. None means no limit."""
+        times = _RingTimes(self)
+        first = 0 if start is None else bisect.bisect_left(times, start)
+        last = self._length if end is None else bisect.bisect_left(times, end)
+        return [self[index] for index in range(first, last)]
+
+
+class PopulationSeries(object):
+    """
+    The population of one playlist on one platform over time, at several resolutions.
+
+    :param resolutions: The (bucket seconds, capacity) of each resolution, see ``DEFAULT_RESOLUTIONS``.
+    :type resolutions: An iterable of :class:`tuple`
+    """
+
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS):
+        self.resolutions = tuple(sorted(resolutions))
+        self._buffers = [RingBuffer(capacity) for _, capacity in self.resolutions]
+        # [bucket start, sum, count] of the bucket being filled at each resolution, None for raw samples
+        self._pending = [None] * len(self.resolutions)
+        self.last_time = None
+
+    def add(self, time: float, population: float):
+        """
+        Adds a sample. Samples older than the newest one are ignored.
+
+        :return If the sample was added.
+        :rtype :class:`bool`
+        """
+        if self.last_time is not None and time <= self.last_time:
+            return False
+        self.last_time = time
+
+        for index, (bucket_seconds, _) in enumerate(self.resolutions):
+            if bucket_seconds == 0:
+                self._buffers[index].append(time, population)
+                continue
+
+            bucket_start = time - time % bucket_seconds
+            pending = self._pending[index]
+
+            if pending is not None and pending[0] != bucket_start:
+                # A bucket is only averaged when it's finished, the pending one is added to query results
+                self._buffers[index].append(pending[0], pending[1] / pending[2])
+                pending = None
+
+            if pending is None:
+                self._pending[index] = [bucket_start, population, 1]
+            else:
+                pending[1] += population
+                pending[2] += 1
+
+        return True
+
+    def _resolution_index(self, start, bucket_seconds):
+        if bucket_seconds is not None:
+            for index, (resolution_seconds, _) in enumerate(self.resolutions):
+                if resolution_seconds == bucket_seconds:
+                    return index
+            raise ValueError("There is no resolution of {0} seconds.".format(bucket_seconds))
+
+        # The finest resolution that still has everything from start on
+        for index, buffer in enumerate(self._buffers):
+            if not buffer.full or (start is not None and buffer[0][0] <= start):
+                return index
+        return len(self._buffers) - 1
+
+    def query(self, start: float = None, end: float = None, bucket_seconds: float = None):
+        """
+        Gets the population between two times.
+
+        :param start: The earliest time (inclusive), None for no limit.
+        :param end: The latest time (exclusive), None for no limit.
+        :param bucket_seconds: The resolution to use. If not supplied, the finest one that goes back to start is used.
+        :return (time, population) pairs, oldest first. For downsampled resolutions, the time is the start of a bucket
+            and the population is the average over it, including the bucket that is still being filled.
+        :rtype A :class:`list` of :class:`tuple`
+        """
+        index = self._resolution_index(start, bucket_seconds)
+        points = self._buffers[index].range(start, end)
+
+        pending = self._pending[index]
+        if pending is not None and (start is None or pending[0] >= start) and (end is None or pending[0] < end):
+            points.append((pending[0], pending[1] / pending[2]))
+
+        return points
+
+
+class PopulationTracker(object):
+    """
+    Polls the playlists in the background and keeps the population of each playlist on each platform as a
+    :class:`PopulationSeries`. Populations the api hasn't updated since the last poll (the same ``last_updated``) are
+    skipped, and samples are timed with ``last_updated``.
+
+    Polls only happen when nothing else is waiting for the client's rate limiting, so the tracker only uses spare
+    budget.
+
+    :param client: The client to do the requests with.
+    :param interval_seconds: How often the playlists should be polled.
+    :param resolutions: The resolutions of each series, see ``DEFAULT_RESOLUTIONS``.
+    :type client: :class:`rocket_snake.RLS_Client`
+    :type interval_seconds: :class:`float`, default is ``60``.
+    :type resolutions: An iterable of (bucket seconds, capacity) :class:`tuple`
+    """
+
+    def __init__(self, client, interval_seconds: float = 60, resolutions=DEFAULT_RESOLUTIONS):
+        self._client = client
+        self.interval_seconds = interval_seconds
+        self.resolutions = tuple(resolutions)
+
+        # {(playlist id, platform): PopulationSeries}
+        self._series = {}
+        # {(playlist id, platform): last_updated of the latest sample}
+        self._last_updated = {}
+
+        self.samples = 0
+        # How many populations were skipped because they hadn't been updated
+        self.skipped = 0
+        self.last_error = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def keys(self):
+        """Gets the (playlist id, platform) pairs that have a series."""
+        return list(self._series)
+
+    def series(self, playlist_id: int, platform: str):
+        """Gets the :class:`PopulationSeries` of a playlist on a platform, or None if it hasn't been sampled."""
+        return self._series.get((playlist_id, platform), None)
+
+    def query(self, playlist_id: int, platform: str, start: float = None, end: float = None,
+              bucket_seconds: float = None):
+        """Gets the population of a playlist on a platform over time, see :func:`PopulationSeries.query`."""
+        series = self.series(playlist_id, platform)
+        return [] if series is None else series.query(start, end, bucket_seconds)
+
+    def record(self, playlist):
+        """
+        Adds the population of a playlist, unless it's the same sample as the previous one.
+
+        :param playlist: The playlist, from :func:`RLS_Client.get_playlists` for example.
+        :type playlist: :class:`data_classes.Playlist`
+        :return If the population was added.
+        :rtype :class:`bool`
+        """
+        key = (playlist.id, playlist.platform)
+        if key in self._last_updated and self._last_updated[key] == playlist.last_updated:
+            self.skipped += 1
+            return False
+
+        series = self._series.get(key, None)
+        if series is None:
+            series = self._series[key] = PopulationSeries(self.resolutions)
+
+        time = basic_requests.clock() if playlist.last_updated is None else playlist.last_updated
+        if not series.add(time, playlist.population):
+            self.skipped += 1
+            return False
+
+        self._last_updated[key] = playlist.last_updated
+        self.samples += 1
+        return True
+
+    async def poll(self):
+        """
+        Fetches the playlists now, bypassing the client's reference snapshot and response cache, and adds their
+        populations. This also updates the client's playlists.
+
+        :return How many populations were added.
+        :rtype :class:`int`
+        """
+        raw_playlist_data = await self._client._get_reference_data("playlists", force_request=True)
+        return sum(self.record(playlist) for playlist in self._client._playlists_from_raw(raw_playlist_data))
+
+    def start(self):
+        """Starts polling in the background on the client's event loop. Does nothing if already running."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run(), loop=self._client._event_loop)
+
+    def stop(self):
+        """Stops polling in the background. The series are kept."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._client._has_spare_budget():
+                # Others are waiting for the rate limiting, we try again when a request could be done
+                await asyncio.sleep(basic_requests.throughput_time_seconds)
+                continue
+
+            try:
+                await self.poll()
+                self.last_error = None
+            except ConnectionError as e:
+                # We keep the series as they are if the api didn't cooperate
+                self.last_error = e
+
+            await asyncio.sleep(self.interval_seconds)
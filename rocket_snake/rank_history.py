@@ -0,0 +1,344 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+An append-only store for the rank history of players.
+
+A store is a directory with three files:
+    records.bin: A header followed by fixed-width records in timestamp order. Each record points to the previous record
+        of the same (player, season, playlist) series, so the history of a player can be read without scanning.
+    players.jsonl: One ``[uid, platform]`` JSON list per line, the line number is the player number used by the records.
+    index.bin: The last record of each series as of the last flush. Records after that are scanned when opening.
+The records file is read through a memory map, so queries only touch the parts of the file they need.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+
+from . import data_classes
+
+_RECORDS_MAGIC = b"RSRH"
+_INDEX_MAGIC = b"RSRI"
+_VERSION = 1
+
+# magic, version, record size, reserved
+_HEADER = struct.Struct("<4sIII")
+# timestamp, player number, season, playlist, rankPoints, division, tier, matchesPlayed, previous record in series
+_RECORD = struct.Struct("<dIHHihhiI")
+# magic, version, number of records covered by the index, number of entries
+_INDEX_HEADER = struct.Struct("<4sIQI")
+# player number, season, playlist, last record in series
+_INDEX_ENTRY = struct.Struct("<IHHI")
+_TIMESTAMP = struct.Struct("<d")
+
+# Used for "no previous record" and for fields that are None
+_NO_RECORD = 0xFFFFFFFF
+_MISSING = -1
+
+
+def _encode_value(value):
+    return _MISSING if value is None else int(value)
+
+
+def _decode_value(value):
+    return None if value == _MISSING else value
+
+
+class _RecordTimestamps(object):
+    """A sequence view of the timestamps in a records memory map, so :mod:`bisect` can be used on it."""
+
+    def __init__(self, records_map, num_records):
+        self._map = records_map
+        self._num_records = num_records
+
+    def __len__(self):
+        return self._num_records
+
+    def __getitem__(self, index):
+        return _TIMESTAMP.unpack_from(self._map, _HEADER.size + index * _RECORD.size)[0]
+
+
+class RankHistoryStore(object):
+    """
+    Stores the rank history of players, and only appends a record when a value has changed since the previous record
+    of the same player, season and playlist.
+    Records have to be appended in timestamp order.
+
+    :param directory: The directory of the store. It is created if it doesn't exist.
+    :type directory: :class:`str`
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._records_path = os.path.join(directory, "records.bin")
+        self._players_path = os.path.join(directory, "players.jsonl")
+        self._index_path = os.path.join(directory, "index.bin")
+
+        # [(uid, platform)] indexed by player number, and the inverse
+        self._players = []
+        self._player_numbers = {}
+        # {(player number, season, playlist): last record number}
+        self._series = {}
+        # {(player number, season, playlist): values of the last record}, so appending doesn't have to read the file
+        self._series_values = {}
+
+        self._num_records = 0
+        self._last_timestamp = float("-inf")
+        self._map = None
+        self._mapped_records = 0
+
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self._records_path) or os.path.getsize(self._records_path) < _HEADER.size:
+            with open(self._records_path, "wb") as records_file:
+                records_file.write(_HEADER.pack(_RECORDS_MAGIC, _VERSION, _RECORD.size, 0))
+
+        with open(self._records_path, "rb") as records_file:
+            magic, version, record_size, _ = _HEADER.unpack(records_file.read(_HEADER.size))
+        if magic != _RECORDS_MAGIC or version != _VERSION or record_size != _RECORD.size:
+            raise ValueError("{0} is not a version {1} rank history file.".format(self._records_path, _VERSION))
+
+        # A crash might have left a partial record at the end, which we throw away
+        records_size = os.path.getsize(self._records_path) - _HEADER.size
+        self._num_records = records_size // _RECORD.size
+        if records_size % _RECORD.size:
+            with open(self._records_path, "r+b") as records_file:
+                records_file.truncate(_HEADER.size + self._num_records * _RECORD.size)
+
+        self._records_file = open(self._records_path, "ab")
+
+        if os.path.exists(self._players_path):
+            with open(self._players_path, "r", encoding="utf-8") as players_file:
+                for line in players_file:
+                    if line.strip():
+                        uid, platform = json.loads(line)
+                        self._player_numbers[(uid, platform)] = len(self._players)
+                        self._players.append((uid, platform))
+
+        indexed_records = self._read_index()
+
+        # We catch up on the records that were appended after the index was last written
+        for record_num in range(indexed_records, self._num_records):
+            fields = self._read_raw(record_num)
+            self._series[(fields[1], fields[2], fields[3])] = record_num
+
+        self._players_file = open(self._players_path, "a", encoding="utf-8")
+
+        if self._num_records:
+            self._last_timestamp = self._read_raw(self._num_records - 1)[0]
+
+    def _read_index(self):
+        """Loads the series index, and returns how many records it covers."""
+        if not os.path.exists(self._index_path):
+            return 0
+
+        with open(self._index_path, "rb") as index_file:
+            data = index_file.read()
+
+        if len(data) < _INDEX_HEADER.size:
+            return 0
+
+        magic, version, indexed_records, num_entries = _INDEX_HEADER.unpack_from(data)
+        if magic != _INDEX_MAGIC or version != _VERSION or indexed_records > self._num_records or \
+                len(data) < _INDEX_HEADER.size + num_entries * _INDEX_ENTRY.size:
+            # The index is unusable, so we rebuild it from the records
+            return 0
+
+        for player_num, season, playlist, last_record in _INDEX_ENTRY.iter_unpack(
+                data[_INDEX_HEADER.size:_INDEX_HEADER.size + num_entries * _INDEX_ENTRY.size]):
+            self._series[(player_num, season, playlist)] = last_record
+
+        return indexed_records
+
+    def _records_map(self):
+        """Gets a memory map that covers all the records, remapping if records have been appended since."""
+        if self._map is None or self._mapped_records != self._num_records:
+            self._records_file.flush()
+            if self._map is not None:
+                self._map.close()
+            with open(self._records_path, "rb") as records_file:
+                self._map = mmap.mmap(records_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_records = self._num_records
+        return self._map
+
+    def _read_raw(self, record_num: int):
+        return _RECORD.unpack_from(self._records_map(), _HEADER.size + record_num * _RECORD.size)
+
+    def _to_record(self, fields):
+        uid, platform = self._players[fields[1]]
+        return data_classes.RankRecord(fields[0], uid, platform, fields[2], fields[3], *(
+            _decode_value(value) for value in (fields[4], fields[5], fields[6], fields[7])))
+
+    def __len__(self):
+        return self._num_records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def append(self, uid: str, platform: str, season: int, playlist: int, rank, timestamp: float = None):
+        """
+        Appends a record if the rank differs from the previous record of the same player, season and playlist.
+
+        :param rank: The rank to record.
+        :type rank: A :class:`data_classes.SeasonPlaylistRank`.
+        :param timestamp: When the rank was recorded. If not supplied, the current time is used.
+        :return Whether a record was appended.
+        :rtype :class:`bool`
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp < self._last_timestamp:
+            raise ValueError("Records have to be appended in timestamp order, {0} is before {1}."
+                             .format(timestamp, self._last_timestamp))
+
+        values = (_encode_value(rank.rankPoints), _encode_value(rank.division), _encode_value(rank.tier),
+                  _encode_value(rank.matchesPlayed))
+
+        player_num = self._player_numbers.get((uid, platform), None)
+        if player_num is None:
+            player_num = len(self._players)
+            self._players.append((uid, platform))
+            self._player_numbers[(uid, platform)] = player_num
+            self._players_file.write(json.dumps([uid, platform]) + "\n")
+            self._players_file.flush()
+
+        series = (player_num, int(season), int(playlist))
+        previous_record = self._series.get(series, _NO_RECORD)
+
+        previous_values = self._series_values.get(series, None)
+        if previous_values is None and previous_record != _NO_RECORD:
+            previous_values = self._read_raw(previous_record)[4:8]
+
+        if previous_values == values:
+            return False
+
+        self._records_file.write(_RECORD.pack(timestamp, player_num, series[1], series[2], *values, previous_record))
+        self._series[series] = self._num_records
+        self._series_values[series] = values
+        self._num_records += 1
+        self._last_timestamp = timestamp
+
+        return True
+
+    def record_player(self, player, timestamp: float = None):
+        """
+        Appends the ranks of all the seasons and playlists of a player that have changed.
+
+        :type player: A :class:`data_classes.Player`.
+        :return The number of records that were appended.
+        :rtype :class:`int`
+        """
+        if not player.ranked_seasons:
+            return 0
+
+        timestamp = time.time() if timestamp is None else timestamp
+
+        return sum(self.append(player.uid, player.platform, season_id, playlist_id, rank, timestamp)
+                   for season_id, ranked_season in player.ranked_seasons.items()
+                   for playlist_id, rank in ranked_season.items())
+
+    def query(self, start: float = None, end: float = None, season: int = None, playlist: int = None):
+        """
+        Gets all records with ``start <= timestamp < end``, in timestamp order.
+        Finding the range is a binary search, so only the records in the range are read.
+
+        :return The records.
+        :rtype A generator of :class:`data_classes.RankRecord` objects.
+        """
+        if not self._num_records:
+            return
+
+        # Season and playlist ids might come from the api as strings, the records store them as ints
+        season = None if season is None else int(season)
+        playlist = None if playlist is None else int(playlist)
+
+        timestamps = _RecordTimestamps(self._records_map(), self._num_records)
+        first = 0 if start is None else bisect.bisect_left(timestamps, start)
+        last = self._num_records if end is None else bisect.bisect_left(timestamps, end)
+
+        for record_num in range(first, last):
+            fields = self._read_raw(record_num)
+            if (season is None or fields[2] == season) and (playlist is None or fields[3] == playlist):
+                yield self._to_record(fields)
+
+    def history(self, uid: str, platform: str, season: int = None, playlist: int = None, start: float = None,
+                end: float = None):
+        """
+        Gets the records of a single player, by following the chain of records of each of the player's series
+        backwards, so other players' records are never read.
+
+        :return The records of the player, in timestamp order.
+        :rtype A :class:`list` of :class:`data_classes.RankRecord` objects.
+        """
+        player_num = self._player_numbers.get((uid, platform), None)
+        if player_num is None:
+            return []
+
+        season = None if season is None else int(season)
+        playlist = None if playlist is None else int(playlist)
+
+        records = []
+        for (series_player, series_season, series_playlist), record_num in self._series.items():
+            if series_player != player_num or (season is not None and series_season != season) or \
+                    (playlist is not None and series_playlist != playlist):
+                continue
+
+            while record_num != _NO_RECORD:
+                fields = self._read_raw(record_num)
+                if start is not None and fields[0] < start:
+                    break
+                if end is None or fields[0] < end:
+                    records.append(self._to_record(fields))
+                record_num = fields[8]
+
+        records.sort(key=lambda record: record.timestamp)
+        return records
+
+    def latest(self, uid: str, platform: str, season: int, playlist: int):
+        """Gets the latest :class:`data_classes.RankRecord` of a player in a season and playlist, or None."""
+        player_num = self._player_numbers.get((uid, platform), None)
+        record_num = self._series.get((player_num, int(season), int(playlist)), _NO_RECORD)
+        return None if record_num == _NO_RECORD else self._to_record(self._read_raw(record_num))
+
+    def flush(self):
+        """Writes the appended records and the series index to disk."""
+        self._records_file.flush()
+        self._players_file.flush()
+
+        temp_path = self._index_path + ".tmp"
+        with open(temp_path, "wb") as index_file:
+            index_file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _VERSION, self._num_records, len(self._series)))
+            for (player_num, season, playlist), record_num in self._series.items():
+                index_file.write(_INDEX_ENTRY.pack(player_num, season, playlist, record_num))
+        os.replace(temp_path, self._index_path)
+
+    def close(self):
+        """Flushes and closes the store."""
+        self.flush()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._records_file.close()
+        self._players_file.close()
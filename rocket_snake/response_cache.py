@@ -0,0 +1,233 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+A cache of api responses, used by :func:`basic_requests.basic_request` when it's given one. Responses are kept as the
+bytes the api sent, in a backend (in memory or on disk), and are fresh for a time that depends on the endpoint.
+"""
+
+import hashlib
+import os
+import struct
+import zlib
+from collections import OrderedDict
+
+from . import basic_requests
+
+# How long responses are fresh, in seconds, by endpoint (without the api version). If an endpoint isn't here,
+# the first part of its path is tried, so "leaderboard" is used for "leaderboard/ranked"
+DEFAULT_TTLS = {
+    "data": 24 * 60 * 60,  # Platforms, playlists, seasons and tiers rarely change
+    "leaderboard": 5 * 60,
+    "search": 60,
+    "player": 60,
+}
+
+
+class MemoryBackend(object):
+    """
+    Keeps responses in memory, and removes the least recently used ones when their total size is over max_bytes.
+
+    :param max_bytes: The maximum total size of the kept responses.
+    :type max_bytes: :class:`int`, default is 32 MiB.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        # {key: (stored at, body)}, least recently used first
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, stored_at: float, body: bytes):
+        self.delete(key)
+        if len(body) > self.max_bytes:
+            return
+
+        self._entries[key] = (stored_at, body)
+        self.size_bytes += len(body)
+
+        while self.size_bytes > self.max_bytes:
+            _, (_, evicted_body) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted_body)
+            self.evictions += 1
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+
+class DiskBackend(object):
+    """
+    Keeps responses in a directory, one zlib compressed file per response, so they are kept between runs.
+    Files are replaced atomically, so several processes can share a directory.
+
+    :param directory: The directory to keep the responses in. It's created if it doesn't exist.
+    :param compression_level: The zlib compression level, from 1 (fastest) to 9 (smallest).
+    :type directory: :class:`str`
+    :type compression_level: :class:`int`, default is ``6``.
+    """
+
+    # The time the response was stored at, followed by the compressed body
+    header = struct.Struct("<d")
+
+    def __init__(self, directory: str, compression_level: int = 6):
+        self.directory = directory
+        self.compression_level = compression_level
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".z")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as entry_file:
+                data = entry_file.read()
+            return self.header.unpack_from(data)[0], zlib.decompress(data[self.header.size:])
+        except (OSError, struct.error, zlib.error):
+            # Missing or broken files are the same as no response
+            return None
+
+    def set(self, key, stored_at: float, body: bytes):
+        path = self._path(key)
+        temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as entry_file:
+            entry_file.write(self.header.pack(stored_at) + zlib.compress(body, self.compression_level))
+        os.replace(temp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".z"):
+                os.remove(os.path.join(self.directory, file_name))
+
+
+class ResponseCache(object):
+    """
+    A cache of api responses, see the ``response_cache`` parameter of :class:`rocket_snake.RLS_Client`.
+
+    Fresh responses are returned without doing a request (so without waiting for the rate limiting). Responses that
+    aren't fresh anymore are kept, and if serve_stale is True, they are returned when the api responds with a 5xx or
+    429 response code instead of raising an exception.
+
+    :param backend: Where the responses are kept, a :class:`MemoryBackend` with the default size if not supplied.
+    :param ttls: How long responses are fresh, in seconds, by endpoint. These are used in addition to
+        ``DEFAULT_TTLS``, see it for how endpoints are matched. ``0`` means responses are only used when stale.
+    :param serve_stale: If stale responses should be returned when the api responds with an error.
+    :param max_stale_seconds: How old (after being stored) a stale response may be to be returned.
+    :type backend: :class:`MemoryBackend` or :class:`DiskBackend`
+    :type ttls: :class:`dict`, {:class:`str`: :class:`float`}
+    :type serve_stale: :class:`bool`, default is ``True``.
+    :type max_stale_seconds: :class:`float`, default is ``None`` (no maximum).
+    """
+
+    def __init__(self, backend=None, ttls: dict = None, serve_stale: bool = True, max_stale_seconds: float = None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.serve_stale = serve_stale
+        self.max_stale_seconds = max_stale_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.stores = 0
+
+    def ttl_seconds(self, endpoint: str):
+        """Gets how long responses from an endpoint (with or without the api version) are fresh."""
+        if endpoint.split("/", 1)[0].isdigit():
+            endpoint = endpoint.split("/", 1)[1]
+
+        ttl = self.ttls.get(endpoint, None)
+        if ttl is None:
+            ttl = self.ttls.get(endpoint.split("/", 1)[0], 0)
+        return ttl
+
+    def get(self, key, count: bool = True):
+        """
+        Gets a response and counts it as a hit or a miss.
+
+        :param key: The key from :func:`basic_requests.basic_request`, where the first item is the endpoint.
+        :param count: If the lookup should be counted, False when the response is only kept in case of an error.
+        :return (body, fresh), or None if there is no response for the key.
+        :rtype A :class:`tuple` of :class:`bytes` and :class:`bool`
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += count
+            return None
+
+        stored_at, body = entry
+        age = basic_requests.clock() - stored_at
+        fresh = age < self.ttl_seconds(key[0])
+        if fresh:
+            self.hits += count
+        else:
+            self.misses += count
+
+        if not fresh and self.max_stale_seconds is not None and age > self.max_stale_seconds:
+            self.backend.delete(key)
+            return None
+
+        return body, fresh
+
+    def get_stale(self, cached):
+        """Gets the body of a response from :func:`ResponseCache.get` to return on an error, or None if it can't be."""
+        if cached is None or not self.serve_stale:
+            return None
+
+        self.stale_hits += 1
+        return cached[0]
+
+    def store(self, key, body):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.backend.set(key, basic_requests.clock(), body)
+        self.stores += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups that returned a fresh response, from 0 to 1."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def stats(self):
+        """The hits, misses, stale_hits (stale responses returned on errors), stores and hit_rate, as a dict."""
+        return {"hits": self.hits, "misses": self.misses, "stale_hits": self.stale_hits, "stores": self.stores,
+                "hit_rate": self.hit_rate}
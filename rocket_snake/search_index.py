@@ -0,0 +1,149 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""An in-memory index of the display names of known players, so they can be searched without any requests."""
+
+import bisect
+import json
+import os
+from collections import OrderedDict
+
+from . import data_classes
+from .data_classes import player_key
+
+
+def _normalize(display_name: str):
+    return display_name.casefold()
+
+
+class PlayerSearchIndex(object):
+    """
+    Indexes players by display name, and supports case-insensitive exact and prefix searches.
+    Names are kept in a sorted list, so a search is a binary search followed by reading the matches.
+
+    Players are identified by :func:`data_classes.player_key`, so adding a player again replaces the old one (and its
+    old name). When there are more than max_players players, the least recently added ones are removed first, so the
+    index doesn't keep every player it has seen alive.
+
+    :param max_players: The maximum amount of players indexed.
+    :type max_players: :class:`int`, default is ``100000``.
+    """
+
+    def __init__(self, max_players: int = 100000):
+        self.max_players = max_players
+        # {player key: data_classes.Player}, least recently added first
+        self._players = OrderedDict()
+        # {player key: the display name the player is indexed by}, which players updated in place (by an
+        # identity map) no longer have
+        self._indexed_names = {}
+        # A sorted list of (normalized display name, uid, casefolded platform)
+        self._names = []
+
+    def __len__(self):
+        return len(self._players)
+
+    def __contains__(self, player):
+        return player_key(player.uid, player.platform) in self._players
+
+    def add(self, player):
+        """Adds a :class:`data_classes.Player` to the index, or replaces the player if it's already indexed."""
+        key = player_key(player.uid, player.platform)
+        indexed = key in self._players
+        old_name = self._indexed_names.get(key, None)
+
+        if indexed and old_name != player.display_name:
+            self._remove_name(old_name, key)
+
+        self._players.pop(key, None)
+        self._players[key] = player
+        self._indexed_names[key] = player.display_name
+
+        if not indexed or old_name != player.display_name:
+            if player.display_name is not None:
+                bisect.insort(self._names, (_normalize(player.display_name),) + key)
+
+        while len(self._players) > self.max_players:
+            evicted_key, _ = self._players.popitem(last=False)
+            self._remove_name(self._indexed_names.pop(evicted_key), evicted_key)
+
+    def remove(self, player):
+        """Removes a player from the index, if the player is indexed."""
+        key = player_key(player.uid, player.platform)
+        if self._players.pop(key, None) is not None:
+            self._remove_name(self._indexed_names.pop(key), key)
+
+    def _remove_name(self, display_name: str, key):
+        if display_name is None:
+            return
+
+        entry = (_normalize(display_name),) + key
+        index = bisect.bisect_left(self._names, entry)
+        if index < len(self._names) and self._names[index] == entry:
+            del self._names[index]
+
+    def search(self, display_name: str, prefix: bool = True, limit: int = None):
+        """
+        Searches the index for players by display name, ignoring case.
+
+        :param display_name: The display name (or start of one) to search for.
+        :param prefix: If True, players whose display names start with display_name match.
+            If False, only players with exactly display_name match.
+        :param limit: The maximum number of results, or None for all of them.
+        :return The matching players, with exact matches first and then in alphabetical order.
+        :rtype A :class:`list` of :class:`data_classes.Player` objects.
+        """
+        query = _normalize(display_name)
+        results = []
+
+        # An exact match sorts before every longer name with the same start, so the exact matches come first
+        for index in range(bisect.bisect_left(self._names, (query,)), len(self._names)):
+            name, uid, platform = self._names[index]
+
+            if name != query and not (prefix and name.startswith(query)):
+                break
+            if limit is not None and len(results) >= limit:
+                break
+
+            results.append(self._players[(uid, platform)])
+
+        return results
+
+    def save(self, path: str):
+        """
+        Saves the index to a JSON file. Only the identifying fields of the players are saved, not their stats
+        or ranked data.
+        """
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump([[player.uid, player.display_name, player.platform, player.avatar_url, player.profile_url,
+                        player.signature_url] for player in self._players.values()], index_file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, max_players: int = 100000):
+        """
+        Loads an index saved with :func:`PlayerSearchIndex.save`.
+
+        :param max_players: The maximum amount of players indexed, see :class:`PlayerSearchIndex`.
+        :return The loaded index. The players in it only have their identifying fields populated.
+        :rtype A :class:`PlayerSearchIndex`.
+        """
+        index = cls(max_players)
+        with open(path, "r", encoding="utf-8") as index_file:
+            for uid, display_name, platform, avatar_url, profile_url, signature_url in json.load(index_file):
+                index.add(data_classes.Player(uid, display_name, platform, avatar_url=avatar_url,
+                                              profile_url=profile_url, signature_url=signature_url))
+        return index
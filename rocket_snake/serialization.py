@@ -0,0 +1,180 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+A compact, versioned binary serialization of players, ranked data and reference data, for caches and passing
+objects between processes.
+
+The objects are flattened to tuples of plain values, which are encoded with :mod:`marshal` (format version 4, which
+every supported Python version reads and writes the same way) after a small header. Repeated strings, like stat names
+and the parts of urls before the last slash, are only stored once per payload.
+
+.. warning::
+    Like pickle, this isn't safe for data from untrusted sources.
+"""
+
+import marshal
+import struct
+import sys
+
+from . import data_classes
+from .constants import ID_PLATFORM_LUT, PLATFORM_ID_LUT
+
+# The version of the format, payloads with other versions can't be loaded
+FORMAT_VERSION = 1
+
+_MAGIC = b"RSNK"
+# magic, format version, marshal version, payload kind
+_HEADER = struct.Struct("<4sBBB")
+_MARSHAL_VERSION = 4
+
+# The kinds of payloads
+_SINGLE = 0
+_MANY = 1
+
+# The type codes of the encoded objects
+_PLAYER = 0
+_RANKED_SEASONS = 1
+_TIER = 2
+_SEASON = 3
+_PLAYLIST = 4
+
+_intern = sys.intern
+
+
+def _encode_url(url):
+    if url is None:
+        return None
+
+    # The start of the urls is almost always shared with other players, and interned strings are only marshalled once
+    split_index = url.rfind("/") + 1
+    return _intern(url[:split_index]), url[split_index:]
+
+
+def _decode_url(encoded):
+    return None if encoded is None else encoded[0] + encoded[1]
+
+
+def _encode_ranked_seasons(ranked_seasons):
+    return tuple((_intern(str(season_id)), tuple((_intern(str(playlist_id)),) + tuple(rank)
+                                                 for playlist_id, rank in ranked_season.items()))
+                 for season_id, ranked_season in ranked_seasons.ranked_seasons.items())
+
+
+def _decode_ranked_seasons(encoded):
+    ranked_seasons = data_classes.RankedSeasons.__new__(data_classes.RankedSeasons)
+    make_rank = data_classes.SeasonPlaylistRank._make
+    ranked_seasons.ranked_seasons = {
+        season_id: data_classes.RankedSeason({rank[0]: make_rank(rank[1:]) for rank in ranks})
+        for season_id, ranks in encoded}
+    return ranked_seasons
+
+
+def _encode(obj):
+    if isinstance(obj, data_classes.Player):
+        return (_PLAYER, obj.uid, obj.display_name, PLATFORM_ID_LUT.get(obj.platform, obj.platform),
+                _encode_url(obj.avatar_url), _encode_url(obj.profile_url), _encode_url(obj.signature_url),
+                None if obj.stats is None else tuple((_intern(key), value) for key, value in obj.stats.items()),
+                None if obj.ranked_seasons is None else _encode_ranked_seasons(obj.ranked_seasons))
+    elif isinstance(obj, data_classes.RankedSeasons):
+        return _RANKED_SEASONS, _encode_ranked_seasons(obj)
+    elif isinstance(obj, data_classes.Tier):
+        return (_TIER,) + tuple(obj)
+    elif isinstance(obj, data_classes.Season):
+        return (_SEASON,) + tuple(obj)
+    elif isinstance(obj, data_classes.Playlist):
+        return (_PLAYLIST, obj.id, obj.name, PLATFORM_ID_LUT.get(obj.platform, obj.platform), obj.population,
+                obj.last_updated)
+    else:
+        raise TypeError("Objects of type {0} can't be serialized.".format(type(obj).__name__))
+
+
+def _decode(encoded):
+    type_code = encoded[0]
+
+    if type_code == _PLAYER:
+        player = data_classes.Player(encoded[1], encoded[2], ID_PLATFORM_LUT.get(encoded[3], encoded[3]),
+                                     avatar_url=_decode_url(encoded[4]), profile_url=_decode_url(encoded[5]),
+                                     signature_url=_decode_url(encoded[6]),
+                                     stats=None if encoded[7] is None else dict(encoded[7]),
+                                     ranked_seasons=None if encoded[8] is None else _decode_ranked_seasons(encoded[8]))
+        return player
+    elif type_code == _RANKED_SEASONS:
+        return _decode_ranked_seasons(encoded[1])
+    elif type_code == _TIER:
+        return data_classes.Tier._make(encoded[1:])
+    elif type_code == _SEASON:
+        return data_classes.Season._make(encoded[1:])
+    elif type_code == _PLAYLIST:
+        return data_classes.Playlist(encoded[1], encoded[2], ID_PLATFORM_LUT.get(encoded[3], encoded[3]), encoded[4],
+                                     encoded[5])
+    else:
+        raise ValueError("Unknown type code {0} in serialized data.".format(type_code))
+
+
+def _check_header(data: bytes, kind: int):
+    if len(data) < _HEADER.size:
+        raise ValueError("The data is too short to be serialized rocket snake data.")
+
+    magic, version, marshal_version, data_kind = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("The data isn't serialized rocket snake data.")
+    if version != FORMAT_VERSION:
+        raise ValueError("The data has format version {0}, but only version {1} is supported."
+                         .format(version, FORMAT_VERSION))
+    if data_kind != kind:
+        raise ValueError("The data is a {0}, use {1} to load it.".format(
+                *(("single object", "loads") if data_kind == _SINGLE else ("list of objects", "loads_many"))))
+
+
+def dumps(obj):
+    """
+    Serializes a single object.
+
+    :param obj: The object to serialize.
+    :type obj: A :class:`data_classes.Player`, :class:`data_classes.RankedSeasons`, :class:`data_classes.Tier`,
+        :class:`data_classes.Season` or :class:`data_classes.Playlist`.
+    :rtype :class:`bytes`
+    """
+    return _HEADER.pack(_MAGIC, FORMAT_VERSION, _MARSHAL_VERSION, _SINGLE) + marshal.dumps(_encode(obj),
+                                                                                         _MARSHAL_VERSION)
+
+
+def loads(data: bytes):
+    """Deserializes an object serialized with :func:`dumps`."""
+    _check_header(data, _SINGLE)
+    return _decode(marshal.loads(memoryview(data)[_HEADER.size:]))
+
+
+def dumps_many(objs):
+    """
+    Serializes a list of objects (of any of the types :func:`dumps` supports) into a single payload.
+    This is smaller and faster than serializing them one by one, since repeated strings are only stored once.
+
+    :rtype :class:`bytes`
+    """
+    return _HEADER.pack(_MAGIC, FORMAT_VERSION, _MARSHAL_VERSION, _MANY) + marshal.dumps(
+            tuple(_encode(obj) for obj in objs), _MARSHAL_VERSION)
+
+
+def loads_many(data: bytes):
+    """
+    Deserializes a list of objects serialized with :func:`dumps_many`.
+
+    :rtype :class:`list`
+    """
+    _check_header(data, _MANY)
+    return [_decode(encoded) for encoded in marshal.loads(memoryview(data)[_HEADER.size:])]
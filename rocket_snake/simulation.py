@@ -0,0 +1,380 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+An offline simulator for the rate limiting. The real client, scheduling and rate limiting code runs on an event loop
+with a virtual clock, against a modeled api server, so a workload that would take minutes against the api runs in
+seconds, and gives the same results every time.
+"""
+
+import asyncio
+import json
+import math
+import random
+import selectors
+from collections import deque
+
+from . import basic_requests
+from .constants import LEADERBOARD_TYPES, RANKED_PLAYLISTS_IDS
+from .monitoring import PHASE_QUEUE
+
+
+def default_latency(rng: random.Random):
+    """The default one way network latency of the modeled server, about 50 ms."""
+    return rng.lognormvariate(math.log(0.05), 0.4)
+
+
+def default_processing_time(rng: random.Random):
+    """The default time the modeled server takes to respond once a request has arrived, about 100 ms."""
+    return rng.lognormvariate(math.log(0.1), 0.6)
+
+
+def _make_raw_player(unique_id: str, platform_id: int = 1):
+    number = sum(map(ord, unique_id))
+    return {
+        "uniqueId": unique_id,
+        "displayName": "Player {0}".format(unique_id),
+        "platform": {"id": platform_id, "name": "Steam"},
+        "avatar": None,
+        "profileUrl": "https://rocketleaguestats.com/profile/steam/{0}".format(unique_id),
+        "signatureUrl": "https://signature.rocketleaguestats.com/normal/steam/{0}.png".format(unique_id),
+        "stats": {stat_type: number % 1000 for stat_type in LEADERBOARD_TYPES},
+        "rankedSeasons": {"5": {str(playlist_id): {"rankPoints": 500 + number % 900, "division": number % 4,
+                                                   "matchesPlayed": number % 300, "tier": number % 16}
+                                for playlist_id in RANKED_PLAYLISTS_IDS}},
+    }
+
+
+def default_responder(method: str, endpoint: str, params: dict, json_data):
+    """
+    Creates the response of the modeled server to a successful request, in the same form as the api's responses.
+    The players are made up, but are the same for the same unique ids.
+
+    :return The decoded JSON of the response body.
+    """
+    if endpoint.endswith("/player/batch"):
+        return [_make_raw_player(entry["uniqueId"], int(entry["platformId"])) for entry in json_data]
+    if endpoint.endswith("/player"):
+        return _make_raw_player(str(params["unique_id"]), int(params["platform_id"]))
+    if "/leaderboard/" in endpoint:
+        return [_make_raw_player(str(number)) for number in range(100)]
+    if endpoint.endswith("/search/players"):
+        return {"page": params["page"], "results": 20, "totalResults": 20, "maxResultsPerPage": 20,
+                "data": [_make_raw_player("{0}{1}".format(params["display_name"], number)) for number in range(20)]}
+    return []
+
+
+class _SimulatedResponse(object):
+    """What :mod:`basic_requests` uses of an :class:`aiohttp.ClientResponse`."""
+
+    def __init__(self, status: int, headers: dict, text: str):
+        self.status = status
+        self.headers = headers
+        self._text = text
+
+    async def text(self):
+        return self._text
+
+
+class _SimulatedRequest(object):
+
+    def __init__(self, coroutine):
+        self._coroutine = coroutine
+
+    async def __aenter__(self):
+        return await self._coroutine
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class _SimulatedSession(object):
+    """What :mod:`basic_requests` uses of an :class:`aiohttp.ClientSession`, with requests going to the server."""
+
+    def __init__(self, server, loop: asyncio.AbstractEventLoop):
+        self._server = server
+        self._loop = loop
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def get(self, url: str, **kwargs):
+        return _SimulatedRequest(self._server.respond(self._loop, "get", url, **kwargs))
+
+    def post(self, url: str, **kwargs):
+        return _SimulatedRequest(self._server.respond(self._loop, "post", url, **kwargs))
+
+
+class SimulatedServer(object):
+    """
+    A model of the api server. Each request is delayed by the network latency on the way to the server, the processing
+    time and the network latency on the way back. The server allows at most max_requests requests per api key in any
+    window_seconds long window, and responds to requests over that with 429 and a ``retry-after-ms`` header.
+
+    :param max_requests: How many requests a key may do per window.
+    :param window_seconds: The length of the rate limiting window.
+    :param latency: A function that returns a one way network latency in seconds, given a :class:`random.Random`.
+    :param processing_time: A function that returns a processing time in seconds, given a :class:`random.Random`.
+    :param responder: A function that returns the decoded JSON the server responds with to a successful request,
+        given the method, the endpoint, the params and the sent JSON (see :func:`default_responder`). If it returns
+        None, the server responds with 404.
+    :param seed: The seed of the random numbers, so the latencies are the same every run.
+    :type max_requests: :class:`int`, default is ``2``.
+    :type window_seconds: :class:`float`, default is ``1``.
+    :type latency: A function, default is :func:`default_latency`.
+    :type processing_time: A function, default is :func:`default_processing_time`.
+    :type responder: A function, default is :func:`default_responder`.
+    :type seed: :class:`int`, default is ``0``.
+    """
+
+    def __init__(self, max_requests: int = 2, window_seconds: float = 1, latency=default_latency,
+                 processing_time=default_processing_time, responder=default_responder, seed: int = 0):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.latency = latency
+        self.processing_time = processing_time
+        self.responder = responder
+        self.random = random.Random(seed)
+
+        # {api key: deque([arrival times of the requests in the current window])}
+        self._arrivals = {}
+
+        self.requests = 0
+        self.rate_limited = 0
+        # The virtual times requests arrived at the server (including the rate limited ones)
+        self.arrival_times = []
+
+    async def respond(self, loop: asyncio.AbstractEventLoop, method: str, url: str, params: dict = None,
+                      headers: dict = None, **kwargs):
+        await asyncio.sleep(self.latency(self.random))
+
+        arrival_time = loop.time()
+        self.requests += 1
+        self.arrival_times.append(arrival_time)
+
+        arrivals = self._arrivals.setdefault((headers or {}).get("Authorization"), deque())
+        while arrivals and arrivals[0] <= arrival_time - self.window_seconds:
+            arrivals.popleft()
+
+        if len(arrivals) >= self.max_requests:
+            self.rate_limited += 1
+            retry_after = arrivals[0] + self.window_seconds - arrival_time
+            status, response_headers, body = 429, {"retry-after-ms": str(math.ceil(retry_after * 1000))}, \
+                "{\"code\": 429}"
+        else:
+            arrivals.append(arrival_time)
+            # The responder only looks at the end of the endpoint, so other base urls work too
+            endpoint = url[len(basic_requests.api_url):] if url.startswith(basic_requests.api_url) else url
+            data = self.responder(method, endpoint, dict(params or {}), kwargs.get("json"))
+            status, response_headers, body = \
+                (404, {}, "{\"code\": 404}") if data is None else (200, {}, json.dumps(data))
+
+        await asyncio.sleep(self.processing_time(self.random) + self.latency(self.random))
+        return _SimulatedResponse(status, response_headers, body)
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    """
+    A selector that, instead of waiting for a timeout, moves the virtual clock of its loop forward.
+    While executor work is running, it waits for it for real instead, because that work takes no virtual time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    def select(self, timeout=None):
+        if timeout is None or (timeout > 0 and self.loop.executor_work):
+            # Only other threads (like executors) can wake the loop up, so we wait for them for real
+            return super().select(None)
+
+        events = super().select(0)
+        if not events and timeout > 0:
+            self.loop.virtual_time += timeout
+        return events
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    An event loop with a virtual clock. Whenever every task is waiting for a timer, the clock jumps to the next one,
+    so sleeps take no real time. Functions run with :func:`run_in_executor` take no virtual time, the clock waits for
+    them.
+    """
+
+    def __init__(self):
+        selector = _VirtualTimeSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self.virtual_time = 0.0
+        # How many functions are running in executors, the clock doesn't move while there are any
+        self.executor_work = 0
+
+    def time(self):
+        return self.virtual_time
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_work += 1
+        future.add_done_callback(self._executor_work_done)
+        return future
+
+    def _executor_work_done(self, future):
+        self.executor_work -= 1
+
+
+class _QueueWaitRecorder(object):
+    """Takes the place of a :class:`monitoring.LoopLagMonitor` in the simulated client, to record the queue waits."""
+
+    running = False
+
+    def __init__(self):
+        self.queue_waits = []
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        pass
+
+    def stop(self):
+        pass
+
+    def record_span(self, phase: str, start: float, end: float, endpoint: str = None):
+        if phase == PHASE_QUEUE:
+            self.queue_waits.append(end - start)
+
+
+def _percentiles(values: list):
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+
+    def percentile(percent):
+        return values[min(len(values) - 1, max(0, math.ceil(percent / 100 * len(values)) - 1))]
+
+    return {"count": len(values), "mean": sum(values) / len(values), "p50": percentile(50), "p90": percentile(90),
+            "p99": percentile(99), "max": values[-1]}
+
+
+def constant_rate_workload(request_factory, requests_per_second: float, count: int):
+    """
+    Creates a workload of count requests started at a constant rate.
+
+    :param request_factory: A function that takes the client and returns a coroutine that does the request,
+        for example ``lambda client: client.get_player("76561198033338223", constants.STEAM)``.
+    :return A workload for :func:`RateLimitSimulator.run`.
+    :rtype A :class:`list` of ``(start time in seconds, request_factory)`` :class:`tuple` s.
+    """
+    return [(index / requests_per_second, request_factory) for index in range(count)]
+
+
+class RateLimitSimulator(object):
+    """
+    Runs workloads with a real :class:`rocket_snake.RLS_Client` against a :class:`SimulatedServer`, on a
+    :class:`VirtualTimeEventLoop`, and reports the achieved throughput, the waits for the rate limiting and the amount
+    of 429 responses.
+
+    While a workload runs, the clock, HTTP sessions and ``throughput_time_seconds`` of :mod:`basic_requests` are
+    replaced, so nothing else should use them at the same time.
+
+    :param server: The modeled server. A new one with the default settings is created for each run if not supplied.
+    :param throughput_time_seconds: The spacing of requests to simulate, the current
+        ``basic_requests.throughput_time_seconds`` if not supplied.
+    :param client_kwargs: Keyword arguments for the :class:`rocket_snake.RLS_Client`, for example ``hedging`` or
+        ``max_queue_depth``. The ``monitor`` argument is used by the simulator.
+    :type server: :class:`SimulatedServer`
+    :type throughput_time_seconds: :class:`float`
+    :type client_kwargs: :class:`dict`
+    """
+
+    api_key = "simulated-api-key"
+
+    def __init__(self, server: SimulatedServer = None, throughput_time_seconds: float = None,
+                 client_kwargs: dict = None):
+        self.server = server
+        self.throughput_time_seconds = throughput_time_seconds
+        self.client_kwargs = client_kwargs or {}
+
+    def run(self, workload):
+        """
+        Runs a workload from the start, with a new client and rate limiting state.
+
+        :param workload: The requests to do, as ``(start time in seconds, request_factory)`` pairs, where
+            request_factory takes the client and returns a coroutine (see :func:`constant_rate_workload`).
+        :return The results: {"requests", "succeeded", "errors": {exception name: count}, "http_requests",
+            "rate_limited" (429 responses), "duration_seconds", "throughput" (succeeded requests per second),
+            "http_throughput", "queue_wait": summary, "latency": summary}, where the summaries have the count,
+            mean, p50, p90, p99 and max in seconds. All times are virtual.
+        :rtype :class:`dict`
+        """
+        from .client import RLS_Client
+
+        server = self.server if self.server is not None else SimulatedServer()
+        loop = VirtualTimeEventLoop()
+        recorder = _QueueWaitRecorder()
+
+        old_settings = (basic_requests.clock, basic_requests.trace_clock, basic_requests.session_factory,
+                        basic_requests.throughput_time_seconds)
+        basic_requests.clock = basic_requests.trace_clock = loop.time
+        basic_requests.session_factory = \
+            lambda session_loop, trace_configs=None: _SimulatedSession(server, session_loop)
+        if self.throughput_time_seconds is not None:
+            basic_requests.throughput_time_seconds = self.throughput_time_seconds
+        self._forget_key()
+
+        latencies = []
+        errors = {}
+
+        async def do_request(start_time, request_factory):
+            await asyncio.sleep(start_time)
+            request_start = loop.time()
+            try:
+                await request_factory(client)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            else:
+                latencies.append(loop.time() - request_start)
+
+        async def run_workload():
+            await asyncio.gather(*[do_request(start_time, request_factory) for start_time, request_factory in workload])
+
+        try:
+            client = RLS_Client(api_key=self.api_key, event_loop=loop, monitor=recorder, **self.client_kwargs)
+            loop.run_until_complete(run_workload())
+            duration = loop.time()
+        finally:
+            (basic_requests.clock, basic_requests.trace_clock, basic_requests.session_factory,
+             basic_requests.throughput_time_seconds) = old_settings
+            self._forget_key()
+            loop.close()
+
+        return {
+            "requests": len(workload),
+            "succeeded": len(latencies),
+            "errors": errors,
+            "http_requests": server.requests,
+            "rate_limited": server.rate_limited,
+            "duration_seconds": duration,
+            "throughput": len(latencies) / duration if duration else 0.0,
+            "http_throughput": server.requests / duration if duration else 0.0,
+            "queue_wait": _percentiles(recorder.queue_waits),
+            "latency": _percentiles(latencies),
+        }
+
+    def _forget_key(self):
+        for key_map in (basic_requests.ratelimit_key_queue_map, basic_requests.ratelimit_key_time_map,
+                        basic_requests.ratelimit_key_service_time_map):
+            key_map.pop(self.api_key, None)
@@ -0,0 +1,229 @@
+"""
+   Copyright 2017 Hugo Berg
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Resolves rank points to tiers, using the rank points and tiers of observed players.
+The api doesn't publish the rank point limits of the tiers, so they are estimated per season and playlist.
+If NumPy is installed, arrays of rank points can be resolved in one vectorized call.
+"""
+
+import bisect
+
+from .constants import RANKED_PLAYLISTS_IDS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TierResolutionTable(object):
+    """
+    Maps rank points to tiers for a single season and playlist.
+
+    Points below the lowest bound only resolve to the lowest tier of the table if it's the lowest tier there is (the
+    lowest id in tier_names). Otherwise the tiers under it haven't been observed, so those points can't be resolved.
+
+    :param season: The season id.
+    :param playlist: The playlist id.
+    :param lower_bounds: The lowest rank points of each tier, ascending.
+    :param tier_ids: The tier ids, in the same order as lower_bounds.
+    :param tier_names: The names of the tiers, {tier_id: name}.
+    """
+
+    def __init__(self, season: int, playlist: int, lower_bounds: list, tier_ids: list, tier_names: dict = None):
+        if len(lower_bounds) != len(tier_ids) or not tier_ids:
+            raise ValueError("A resolution table needs one lower bound for each tier, and at least one tier.")
+
+        self.season = season
+        self.playlist = playlist
+        self.lower_bounds = list(lower_bounds)
+        self.tier_ids = list(tier_ids)
+        self.tier_names = tier_names or {}
+        # If points below the lowest bound are in the lowest tier of the table
+        self._open_below = bool(self.tier_names) and self.tier_ids[0] == min(self.tier_names)
+
+        if numpy is not None:
+            self._lower_bounds_array = numpy.asarray(self.lower_bounds)
+            self._tier_ids_array = numpy.asarray(self.tier_ids)
+
+    @classmethod
+    def from_observations(cls, season: int, playlist: int, tier_ranges: dict, tier_names: dict = None):
+        """
+        Creates a table from the observed rank points of each tier.
+        The tiers are ordered by their observed rank points, not by their ids, and the limit between two tiers is put
+        halfway between the highest observed points of the lower tier and the lowest observed points of the higher
+        tier.
+
+        :param tier_ranges: {tier_id: (lowest observed rank points, highest observed rank points)}.
+        """
+        lower_bounds = []
+        tier_ids = []
+        previous_highest = None
+
+        for tier_id in sorted(tier_ranges, key=lambda tier_id: (sum(tier_ranges[tier_id]), tier_id)):
+            lowest, highest = tier_ranges[tier_id]
+
+            if previous_highest is not None and previous_highest < lowest:
+                lower_bound = (previous_highest + lowest) // 2 + 1
+            else:
+                lower_bound = lowest
+
+            # Noisy observations can overlap, but the limits have to be ascending
+            if lower_bounds and lower_bound <= lower_bounds[-1]:
+                lower_bound = lower_bounds[-1] + 1
+
+            lower_bounds.append(lower_bound)
+            tier_ids.append(tier_id)
+            previous_highest = highest if previous_highest is None else max(previous_highest, highest)
+
+        return cls(season, playlist, lower_bounds, tier_ids, tier_names)
+
+    def lookup(self, rank_points: int):
+        """
+        Gets the tier id for some rank points.
+
+        :return The tier id, or None if the points are below every observed tier (see :class:`TierResolutionTable`).
+        :rtype :class:`int`
+        """
+        index = bisect.bisect_right(self.lower_bounds, rank_points) - 1
+        if index < 0:
+            return self.tier_ids[0] if self._open_below else None
+        return self.tier_ids[index]
+
+    def lookup_name(self, rank_points: int):
+        """Gets the tier name for some rank points, or None if the tier or its name isn't known."""
+        return self.tier_names.get(self.lookup(rank_points), None)
+
+    def lookup_many(self, rank_points):
+        """
+        Gets the tier ids for many rank points at once.
+
+        :param rank_points: The rank points to look up.
+        :type rank_points: A NumPy array or an iterable of :class:`int`.
+        :return The tier ids, in the same order as rank_points. Points that can't be resolved (see
+            :func:`TierResolutionTable.lookup`) are None in lists and -1 in NumPy arrays.
+        :rtype A NumPy array if NumPy is installed, otherwise a :class:`list` of :class:`int`.
+        """
+        if numpy is None:
+            return [self.lookup(points) for points in rank_points]
+
+        indices = numpy.searchsorted(self._lower_bounds_array, numpy.asarray(rank_points), side="right") - 1
+        tier_ids = self._tier_ids_array[numpy.maximum(indices, 0)]
+        return tier_ids if self._open_below else numpy.where(indices < 0, -1, tier_ids)
+
+
+class TierResolver(object):
+    """
+    Keeps the observed rank points of each tier per season and playlist, and builds a :class:`TierResolutionTable`
+    for each of them on demand.
+
+    :param tiers: The tiers from :func:`rocket_snake.RLS_Client.get_tiers`, used for tier names.
+    :type tiers: A :class:`list` of :class:`data_classes.Tier`.
+    """
+
+    def __init__(self, tiers: list = None):
+        self.tier_names = {tier.id: tier.name for tier in tiers or ()}
+
+        # {(season, playlist): {tier_id: [lowest points, highest points]}}
+        self._tier_ranges = {}
+        # {(season, playlist): TierResolutionTable}, removed when new observations change the ranges
+        self._tables = {}
+
+    def observe(self, season: int, playlist: int, rank_points: int, tier: int):
+        """Adds a single observation of a tier and its rank points."""
+        if rank_points is None or tier is None:
+            return
+
+        key = (int(season), int(playlist))
+        ranges = self._tier_ranges.setdefault(key, {})
+        tier_range = ranges.get(tier, None)
+
+        if tier_range is None:
+            ranges[tier] = [rank_points, rank_points]
+        elif tier_range[0] <= rank_points <= tier_range[1]:
+            return
+        else:
+            tier_range[0] = min(tier_range[0], rank_points)
+            tier_range[1] = max(tier_range[1], rank_points)
+
+        self._tables.pop(key, None)
+
+    def observe_player(self, player):
+        """Adds the tiers and rank points in all the ranked seasons of a :class:`data_classes.Player`."""
+        if not player.ranked_seasons:
+            return
+
+        for season_id, ranked_season in player.ranked_seasons.items():
+            for playlist_id, rank in ranked_season.items():
+                self.observe(season_id, playlist_id, rank.rankPoints, rank.tier)
+
+    def observe_players(self, players):
+        for player in players:
+            self.observe_player(player)
+
+    def table(self, season: int, playlist: int):
+        """
+        Gets the resolution table for a season and playlist.
+
+        :rtype A :class:`TierResolutionTable`, or None if nothing has been observed for the season and playlist.
+        """
+        key = (int(season), int(playlist))
+        table = self._tables.get(key, None)
+
+        if table is None and key in self._tier_ranges:
+            table = TierResolutionTable.from_observations(key[0], key[1], self._tier_ranges[key], self.tier_names)
+            self._tables[key] = table
+
+        return table
+
+    def _table_or_raise(self, season: int, playlist: int):
+        table = self.table(season, playlist)
+        if table is None:
+            raise KeyError("No tiers have been observed in season {0} and playlist {1}.".format(season, playlist))
+        return table
+
+    def resolve(self, season: int, playlist: int, rank_points: int):
+        """
+        Gets the tier id for rank points in a season and playlist, see :func:`TierResolutionTable.lookup`.
+        Raises KeyError if nothing has been observed.
+        """
+        return self._table_or_raise(season, playlist).lookup(rank_points)
+
+    def resolve_name(self, season: int, playlist: int, rank_points: int):
+        """Gets the tier name for rank points in a season and playlist, see :func:`TierResolver.resolve`."""
+        return self._table_or_raise(season, playlist).lookup_name(rank_points)
+
+    def resolve_many(self, season: int, playlist: int, rank_points):
+        """Gets the tier ids for many rank points at once, see :func:`TierResolutionTable.lookup_many`."""
+        return self._table_or_raise(season, playlist).lookup_many(rank_points)
+
+
+async def build_resolver(client, playlists=RANKED_PLAYLISTS_IDS):
+    """
+    Creates a :class:`TierResolver` from the tiers and the ranked leaderboards of the api.
+    The leaderboards only have the top players, so the lower tiers are usually unknown until more players are observed
+    with :func:`TierResolver.observe_players`.
+
+    :param client: The client to do the requests with.
+    :param playlists: The ranked playlists to observe the leaderboards of.
+    :type client: :class:`rocket_snake.RLS_Client`
+    :rtype A :class:`TierResolver`.
+    """
+    resolver = TierResolver(await client.get_tiers())
+    merged_leaderboards = await client.get_all_leaderboards(playlists=playlists, stat_types=())
+    resolver.observe_players(merged_leaderboards.players.values())
+    return resolver
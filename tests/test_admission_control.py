@@ -0,0 +1,59 @@
+import unittest
+from collections import deque
+
+from rocket_snake import basic_requests, constants
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer
+
+
+def get_player(client):
+    return client.get_player("1", constants.STEAM)
+
+
+class AdmissionControlTester(unittest.TestCase):
+
+    def run_burst(self, count, **client_kwargs):
+        """Starts count requests at the same time, with a server that takes 1 second for each."""
+        server = SimulatedServer(max_requests=100, latency=lambda rng: 0, processing_time=lambda rng: 1)
+        return RateLimitSimulator(server=server, throughput_time_seconds=1,
+                                  client_kwargs=client_kwargs).run([(0, get_player)] * count)
+
+    def test_estimated_wait(self):
+        old_settings = (basic_requests.clock, basic_requests.throughput_time_seconds)
+        basic_requests.clock = lambda: 100.0
+        basic_requests.throughput_time_seconds = 1
+
+        try:
+            basic_requests.ratelimit_key_time_map["key"] = 99.75
+            self.assertEqual(basic_requests.estimated_wait("key"), 0.75)
+
+            # The spacing left is added to the turns of the queued requests
+            basic_requests.ratelimit_key_queue_map["key"] = deque([1, 2])
+            basic_requests.ratelimit_key_service_time_map["key"] = 2
+            self.assertEqual(basic_requests.estimated_wait("key"), 4.75)
+        finally:
+            basic_requests.clock, basic_requests.throughput_time_seconds = old_settings
+            for key_map in (basic_requests.ratelimit_key_time_map, basic_requests.ratelimit_key_queue_map,
+                            basic_requests.ratelimit_key_service_time_map):
+                key_map.pop("key", None)
+
+    def test_queue_depth(self):
+        report = self.run_burst(5, max_queue_depth=3)
+
+        self.assertEqual(report["errors"], {"QueueFullError": 2})
+        self.assertEqual(report["succeeded"], 3)
+
+        self.assertEqual(self.run_burst(5, max_queue_depth=5)["errors"], {})
+
+    def test_queue_wait(self):
+        # Nothing is known about the service time yet, so each queued request is estimated to take
+        # throughput_time_seconds, and the fourth request would wait for 3 seconds
+        report = self.run_burst(5, max_queue_wait_seconds=2.5)
+
+        self.assertEqual(report["errors"], {"QueueFullError": 2})
+        self.assertEqual(report["succeeded"], 3)
+
+        self.assertEqual(self.run_burst(5, max_queue_wait_seconds=10)["errors"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import unittest
+
+from aiohttp import web
+
+import rocket_snake
+from rocket_snake import basic_requests
+
+TIERS = [{"tierId": 0, "tierName": "Unranked"}, {"tierId": 1, "tierName": "Bronze I"}]
+
+
+class ValidatorServer(object):
+    """A stand-in for the api, that supports ETag and Last-Modified validators (unless told not to)."""
+
+    etag = "\"tiers-v1\""
+    last_modified = "Thu, 10 Aug 2017 12:00:00 GMT"
+
+    def __init__(self, support_validators: bool = True):
+        self.support_validators = support_validators
+        self.requests = []
+
+    async def handle_tiers(self, request):
+        self.requests.append(dict(request.headers))
+
+        if not self.support_validators:
+            return web.json_response(TIERS)
+
+        if request.headers.get("If-None-Match") == self.etag or \
+                request.headers.get("If-Modified-Since") == self.last_modified:
+            return web.Response(status=304)
+
+        return web.json_response(TIERS, headers={"ETag": self.etag, "Last-Modified": self.last_modified})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/v1/data/tiers", self.handle_tiers)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return "http://{0}:{1}/v".format(*self.runner.addresses[0][:2])
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class ConditionalRequestsTester(unittest.TestCase):
+
+    def setUp(self):
+        self.running_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.running_loop)
+
+        self.old_api_url = basic_requests.api_url
+        basic_requests.response_validator_map.clear()
+
+    def tearDown(self):
+        basic_requests.api_url = self.old_api_url
+        basic_requests.response_validator_map.clear()
+        self.running_loop.close()
+
+    def run_with_server(self, server, coro_func):
+        async def wrapper():
+            basic_requests.api_url = await server.start()
+            try:
+                return await coro_func()
+            finally:
+                await server.stop()
+
+        return self.running_loop.run_until_complete(wrapper())
+
+    def test_not_modified_reuses_parsed_response(self):
+        server = ValidatorServer()
+
+        async def requests():
+            first = await basic_requests.get_tiers(api_key="key", loop=self.running_loop, use_validators=True)
+            second = await basic_requests.get_tiers(api_key="key", loop=self.running_loop, use_validators=True)
+            return first, second
+
+        first, second = self.run_with_server(server, requests)
+
+        self.assertEqual(first, TIERS)
+        self.assertIs(first, second)
+        self.assertNotIn("If-None-Match", server.requests[0])
+        self.assertEqual(server.requests[1]["If-None-Match"], ValidatorServer.etag)
+        self.assertEqual(server.requests[1]["If-Modified-Since"], ValidatorServer.last_modified)
+
+    def test_validators_not_sent_when_disabled(self):
+        server = ValidatorServer()
+
+        async def requests():
+            await basic_requests.get_tiers(api_key="key", loop=self.running_loop)
+            await basic_requests.get_tiers(api_key="key", loop=self.running_loop)
+
+        self.run_with_server(server, requests)
+
+        self.assertEqual(len(basic_requests.response_validator_map), 0)
+        self.assertNotIn("If-None-Match", server.requests[1])
+
+    def test_server_ignoring_validators(self):
+        server = ValidatorServer(support_validators=False)
+
+        async def requests():
+            client = rocket_snake.RLS_Client(api_key="key", auto_rate_limit=False, event_loop=self.running_loop,
+                                             conditional_requests=True)
+            return await client.get_tiers(), await client.get_tiers()
+
+        first, second = self.run_with_server(server, requests)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[1].name, "Bronze I")
+        self.assertNotIn("If-None-Match", server.requests[1])
+        self.assertEqual(len(basic_requests.response_validator_map), 0)
+
+    def test_partial_parsers(self):
+        parse_ints = functools.partial(int, base=2)
+        parse_hex = functools.partial(int, base=16)
+
+        self.assertEqual(basic_requests._validator_key("/data/tiers", None, parse_ints),
+                         basic_requests._validator_key("/data/tiers", None, parse_ints))
+        self.assertNotEqual(basic_requests._validator_key("/data/tiers", None, parse_ints),
+                            basic_requests._validator_key("/data/tiers", None, parse_hex))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from rocket_snake import constants
+from rocket_snake.crawler import BloomFilter, PlayerCrawler
+from rocket_snake.simulation import RateLimitSimulator
+
+
+class CrawlerTester(unittest.TestCase):
+
+    def test_bloom_filter(self):
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        items = ["player {0}".format(number) for number in range(1000)]
+
+        self.assertTrue(all(bloom_filter.add(item) for item in items[:10]))
+        self.assertFalse(bloom_filter.add(items[0]))
+        for item in items[10:]:
+            bloom_filter.add(item)
+
+        # There are no false negatives, and about error_rate false positives
+        self.assertTrue(all(item in bloom_filter for item in items))
+        false_positives = sum("other {0}".format(number) in bloom_filter for number in range(1000))
+        self.assertLess(false_positives, 50)
+        self.assertLessEqual(len(bloom_filter), 1000)
+
+    def test_bloom_filter_arguments(self):
+        with self.assertRaises(ValueError):
+            BloomFilter(capacity=0)
+        with self.assertRaises(ValueError):
+            BloomFilter(capacity=10, error_rate=1)
+
+    def test_frontier_is_bounded(self):
+        crawler = PlayerCrawler(client=None, sink=None, max_frontier=2, expected_players=100)
+
+        for uid in ("1", "2", "3", "1"):
+            crawler.add_player(uid, constants.STEAM)
+        for query in ("Name", "name", "Other", "Third"):
+            crawler.add_search(query)
+
+        # The seen players and queries aren't queued again, and the rest is dropped when the frontier is full
+        self.assertEqual(list(crawler.player_frontier), [("1", constants.STEAM), ("2", constants.STEAM)])
+        self.assertEqual(list(crawler.search_frontier), ["name", "other"])
+        self.assertEqual(crawler.dropped, 2)
+
+    def test_dropped_items_can_be_added_again(self):
+        crawler = PlayerCrawler(client=None, sink=None, max_frontier=1, expected_players=100)
+
+        crawler.add_player("1", constants.STEAM)
+        crawler.add_player("2", constants.STEAM)
+        crawler.add_search("first")
+        crawler.add_search("second")
+        self.assertEqual(crawler.dropped, 2)
+
+        crawler.player_frontier.clear()
+        crawler.search_frontier.clear()
+        crawler.add_player("2", constants.STEAM)
+        crawler.add_search("second")
+
+        self.assertEqual(list(crawler.player_frontier), [("2", constants.STEAM)])
+        self.assertEqual(list(crawler.search_frontier), ["second"])
+        self.assertEqual(crawler.dropped, 2)
+
+    def test_crawl(self):
+        players = []
+        crawlers = []
+
+        async def crawl(client):
+            crawler = PlayerCrawler(client, players.append, max_frontier=5, expected_players=1000)
+            crawlers.append(crawler)
+            crawler.add_player("1", constants.STEAM)
+            crawler.add_search("player")
+            await crawler.run(max_requests=5)
+
+        report = RateLimitSimulator().run([(0, crawl)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(crawlers[0].requests, 5)
+        self.assertEqual(len({(player.uid, player.platform) for player in players}), len(players))
+        self.assertEqual(crawlers[0].discovered, len(players))
+        self.assertGreater(crawlers[0].dropped, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+from rocket_snake import RLS_Client, basic_requests
+from rocket_snake.gateway import Gateway
+
+LEADERBOARD = [{"uniqueId": "1", "displayName": "First", "platform": {"id": 1, "name": "Steam"}, "avatar": None,
+                "profileUrl": None, "signatureUrl": None, "stats": {"wins": 1}, "rankedSeasons": {}}]
+
+
+class SlowServer(object):
+    """A stand-in for the api, that takes a while to respond."""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def handle_leaderboard(self, request):
+        self.requests += 1
+        await asyncio.sleep(0.05)
+        return web.json_response(LEADERBOARD)
+
+    async def handle_missing(self, request):
+        self.requests += 1
+        return web.json_response({"code": 404, "message": "Not found"}, status=404)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/v1/leaderboard/stat", self.handle_leaderboard)
+        app.router.add_get("/v1/player", self.handle_missing)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        return "http://{0}:{1}/v".format(*self.runner.addresses[0][:2])
+
+
+class GatewayTester(unittest.TestCase):
+
+    def setUp(self):
+        self.running_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.running_loop)
+        self.old_api_url = basic_requests.api_url
+
+    def tearDown(self):
+        basic_requests.api_url = self.old_api_url
+        self.running_loop.close()
+
+    def run_with_gateway(self, coro_func):
+        server = SlowServer()
+        gateway = Gateway("gateway key")
+
+        async def wrapper():
+            basic_requests.api_url = await server.start()
+            runner = web.AppRunner(gateway.make_app())
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            try:
+                return await coro_func("http://{0}:{1}/v".format(*runner.addresses[0][:2]))
+            finally:
+                await runner.cleanup()
+                await server.runner.cleanup()
+
+        return server, gateway, self.running_loop.run_until_complete(wrapper())
+
+    def test_identical_requests_are_done_once(self):
+        async def requests(gateway_url):
+            client = RLS_Client(api_key="client key", api_url=gateway_url, event_loop=self.running_loop)
+            return await asyncio.gather(*[client.get_stats_leaderboard("wins") for _ in range(5)])
+
+        server, gateway, leaderboards = self.run_with_gateway(requests)
+
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(gateway.requests, 5)
+        self.assertEqual([[player.uid for player in leaderboard] for leaderboard in leaderboards], [["1"]] * 5)
+
+    def test_responses_are_cached_and_errors_passed_on(self):
+        async def requests(gateway_url):
+            async with aiohttp.ClientSession() as session:
+                for _ in range(2):
+                    async with session.get(gateway_url + "1/leaderboard/stat", params={"type": "wins"}) as response:
+                        self.assertEqual(response.status, 200)
+                        self.assertEqual(await response.json(), LEADERBOARD)
+                async with session.get(gateway_url + "1/player",
+                                       params={"unique_id": "x", "platform_id": "1"}) as response:
+                    self.assertEqual(response.status, 404)
+                async with session.get(gateway_url[:-len("v")] + "gateway/stats") as response:
+                    return await response.json()
+
+        server, gateway, stats = self.run_with_gateway(requests)
+
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(stats["cache"]["hits"], 1)
+        self.assertEqual(stats["requests"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
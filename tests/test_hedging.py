@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+
+from rocket_snake import basic_requests, constants
+from rocket_snake.hedging import Hedger
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer
+
+PLAYERS = [("1", constants.STEAM), ("2", constants.STEAM)]
+
+
+def get_players(client):
+    return client.get_players(PLAYERS)
+
+
+class HedgingTester(unittest.TestCase):
+
+    def run_workload(self, workload, hedger, processing_times):
+        """Runs a workload where the server takes the given processing times (0.1 s after they run out)."""
+        processing_times = iter(processing_times)
+        server = SimulatedServer(max_requests=10, latency=lambda rng: 0.01,
+                                 processing_time=lambda rng: next(processing_times, 0.1))
+        report = RateLimitSimulator(server=server, client_kwargs={"hedging": hedger}).run(workload)
+        return server, report
+
+    def test_slow_requests_are_hedged(self):
+        hedger = Hedger(min_samples=1, max_hedge_fraction=1, min_delay_seconds=0.5)
+        server, report = self.run_workload([(0, get_players), (2, get_players)], hedger, [0.1, 10])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual((hedger.hedges, hedger.hedge_wins), (1, 1))
+        self.assertEqual(server.requests, 3)
+        self.assertLess(report["latency"]["max"], 2)
+
+    def test_hedges_are_capped(self):
+        hedger = Hedger(min_samples=1, max_hedge_fraction=0.5, min_delay_seconds=0.5)
+        server, report = self.run_workload([(0, get_players), (2, get_players), (20, get_players)], hedger,
+                                           [0.1, 10, 10])
+
+        self.assertEqual(report["errors"], {})
+        # The second request may be a hedge (1 of 2 requests), the third can't be (2 of 3 would be over the cap)
+        self.assertEqual(hedger.hedges, 1)
+        self.assertEqual(server.requests, 4)
+
+    def test_no_hedge_when_others_are_waiting(self):
+        hedger = Hedger(min_samples=1, max_hedge_fraction=1, min_delay_seconds=0.5)
+        server, report = self.run_workload([(0, get_players), (2, get_players), (2.1, get_players)], hedger,
+                                           [0.1, 10])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(hedger.hedges, 0)
+        self.assertEqual(server.requests, 3)
+
+    def test_cancelled_requests_leave_the_queue(self):
+        hedger = Hedger(min_samples=1, max_hedge_fraction=1, min_delay_seconds=1)
+        queue_lengths = []
+
+        async def cancel_slow_request(client):
+            request = asyncio.ensure_future(get_players(client))
+            await asyncio.sleep(0.5)
+            request.cancel()
+            await asyncio.sleep(0.1)
+            queue_lengths.append(len(basic_requests.ratelimit_key_queue_map.get(client._api_key, ())))
+
+        server, report = self.run_workload([(0, get_players), (2, cancel_slow_request)], hedger, [0.1, 10])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(queue_lengths, [0])
+        self.assertEqual(hedger.hedges, 0)
+
+    def test_min_samples_has_to_be_positive(self):
+        with self.assertRaises(ValueError):
+            Hedger(min_samples=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import gc
+import unittest
+
+from rocket_snake import constants, leaderboards
+from rocket_snake.data_classes import Player, player_key
+from rocket_snake.identity_map import PlayerIdentityMap
+from rocket_snake.search_index import PlayerSearchIndex
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer
+
+
+class IdentityMapTester(unittest.TestCase):
+
+    def test_results_share_players(self):
+        identity_map = PlayerIdentityMap()
+        results = []
+
+        async def get_players(client):
+            leaderboard = await client.get_ranked_leaderboard(constants.RANKED_DUEL_ID)
+            player = await client.get_player(leaderboard[0].uid, leaderboard[0].platform)
+            results.extend((leaderboard[0], player))
+
+        report = RateLimitSimulator(client_kwargs={"identity_map": identity_map}).run([(0, get_players)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertIs(results[0], results[1])
+        self.assertEqual(identity_map.reused, 1)
+
+    def test_refresher_diffs_against_the_leaderboard(self):
+        wins = [10]
+
+        def raw_player():
+            return {"uniqueId": "1", "displayName": "One", "platform": {"id": 1, "name": constants.STEAM},
+                    "avatar": None, "profileUrl": None, "signatureUrl": None, "stats": {"wins": wins[0]},
+                    "rankedSeasons": {}}
+
+        def responder(method, endpoint, params, json_data):
+            return [raw_player()] if "/leaderboard/" in endpoint else raw_player()
+
+        board = (leaderboards.STATS, constants.LEADERBOARD_WINS)
+        diffs = []
+
+        async def refresh(client):
+            refresher = leaderboards.LeaderboardRefresher(client, boards=[board])
+            await refresher.refresh(board)
+            wins[0] = 12
+            # The shared player is updated before the leaderboard is refreshed again
+            player = await client.get_player("1", constants.STEAM)
+            diffs.append(await refresher.refresh(board))
+            self.assertIsNot(refresher.players(board)[0], player)
+            self.assertEqual(refresher.players(board)[0].stats, {"wins": 12})
+
+        report = RateLimitSimulator(server=SimulatedServer(responder=responder),
+                                    client_kwargs={"identity_map": True}).run([(0, refresh)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(diffs[0].stat_deltas, {player_key("1", constants.STEAM): {"wins": 2}})
+
+    def test_unchanged_leaderboard_keeps_newer_data(self):
+        def raw_player(wins):
+            return {"uniqueId": "1", "displayName": "One", "platform": {"id": 1, "name": constants.STEAM},
+                    "avatar": None, "profileUrl": None, "signatureUrl": None, "stats": {"wins": wins},
+                    "rankedSeasons": {}}
+
+        def responder(method, endpoint, params, json_data):
+            # The leaderboard lags behind the player endpoint
+            return [raw_player(10)] if "/leaderboard/" in endpoint else raw_player(12)
+
+        board = (leaderboards.STATS, constants.LEADERBOARD_WINS)
+        stats = []
+
+        async def refresh(client):
+            refresher = leaderboards.LeaderboardRefresher(client, boards=[board])
+            await refresher.refresh(board)
+            player = await client.get_player("1", constants.STEAM)
+            await refresher.refresh(board)
+            stats.append(player.stats)
+            stats.append(client.identity_map.get("1", constants.STEAM).stats)
+
+        report = RateLimitSimulator(server=SimulatedServer(responder=responder),
+                                    client_kwargs={"identity_map": True}).run([(0, refresh)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(stats, [{"wins": 12}] * 2)
+
+    def test_older_data_is_ignored(self):
+        identity_map = PlayerIdentityMap()
+        player = identity_map.canonical(Player("1", "New Name", constants.STEAM, stats={"wins": 2}), fetched_at=10)
+
+        older = identity_map.canonical(Player("1", "Old Name", constants.STEAM, stats={"wins": 1}), fetched_at=5)
+
+        self.assertIs(older, player)
+        self.assertEqual((player.display_name, player.stats), ("New Name", {"wins": 2}))
+        self.assertEqual(identity_map.reused, 1)
+
+    def test_updates_in_place(self):
+        identity_map = PlayerIdentityMap()
+        search_index = PlayerSearchIndex()
+
+        player = identity_map.canonical(Player("1", "Old Name", constants.STEAM, avatar_url="avatar",
+                                               stats={"wins": 1}))
+        search_index.add(player)
+        old_stats = player.stats
+
+        newer = identity_map.canonical(Player("1", "New Name", "steam", stats={"wins": 2}))
+        search_index.add(newer)
+
+        self.assertIs(newer, player)
+        self.assertEqual((player.display_name, player.avatar_url, player.stats), ("New Name", "avatar", {"wins": 2}))
+        self.assertEqual(old_stats, {"wins": 1})
+        self.assertEqual(search_index.search("old"), [])
+        self.assertEqual(search_index.search("new"), [player])
+
+    def test_unused_players_are_forgotten(self):
+        identity_map = PlayerIdentityMap()
+        identity_map.canonical(Player("1", "Name", constants.STEAM))
+        gc.collect()
+
+        self.assertNotIn(("1", constants.STEAM), identity_map)
+        self.assertEqual(len(identity_map), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Runs in a fresh interpreter, and prints which heavy modules the import imported. Timing the import would be flaky,
+# but a regression to eagerly importing the client (and therefore aiohttp) always shows up here.
+IMPORT_SCRIPT = """
+import json, sys
+import {0}
+print(json.dumps([name for name in ("aiohttp", "async_timeout", "rocket_snake.client", "rocket_snake.data_classes")
+                  if name in sys.modules]))
+"""
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_modules(module_name: str):
+    """Imports a module in a fresh interpreter, and returns the heavy modules that were imported with it."""
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT.format(module_name)], cwd=PROJECT_ROOT)
+    return json.loads(output.decode("utf-8"))
+
+
+class ImportTimeTester(unittest.TestCase):
+
+    def test_package_import_is_lazy(self):
+        self.assertEqual(imported_modules("rocket_snake"), [])
+        self.assertIn("aiohttp", imported_modules("rocket_snake.client"))
+
+    def test_constants_import_is_lazy(self):
+        self.assertEqual(imported_modules("rocket_snake.constants"), [])
+
+    def test_public_api_unchanged(self):
+        import rocket_snake
+        from rocket_snake import RLS_Client
+        from rocket_snake.client import RLS_Client as ClientModuleRLS_Client
+
+        self.assertIs(RLS_Client, ClientModuleRLS_Client)
+        self.assertIs(rocket_snake.RLS_Client, RLS_Client)
+        self.assertIs(rocket_snake.exceptions.NoAPIKeyError, rocket_snake.custom_exceptions.NoAPIKeyError)
+        self.assertEqual(rocket_snake.constants.STEAM, "Steam")
+        self.assertIn("RLS_Client", dir(rocket_snake))
+
+        with self.assertRaises(AttributeError):
+            rocket_snake.this_does_not_exist
+
+
+if __name__ == "__main__":
+    unittest.main()
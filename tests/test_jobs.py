@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from rocket_snake import constants, custom_exceptions
+from rocket_snake.data_classes import Player
+from rocket_snake.jobs import KIND_PLAYER, KIND_STATS_LEADERBOARD, JobQueue
+
+
+class FakeClient(object):
+    """Stands in for RLS_Client, and fails the requests for the players it's told to."""
+
+    def __init__(self, failing_uids=()):
+        self.failing_uids = set(failing_uids)
+        self.requested_uids = []
+        self.requests = 0
+
+    async def get_players(self, unique_id_platform_pairs):
+        self.requests += 1
+        self.requested_uids.extend(uid for uid, _ in unique_id_platform_pairs)
+        if self.failing_uids.intersection(uid for uid, _ in unique_id_platform_pairs):
+            raise custom_exceptions.APIServerError("The server timed out.")
+        return [None if uid == "missing" else Player(uid, "Player " + uid, platform)
+                for uid, platform in unique_id_platform_pairs]
+
+    async def get_stats_leaderboard(self, stat_type):
+        self.requests += 1
+        return [Player("top", "Top", constants.STEAM, stats={stat_type: 1})]
+
+
+class JobQueueTester(unittest.TestCase):
+
+    def setUp(self):
+        self.running_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.running_loop)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jobs.sqlite")
+
+    def tearDown(self):
+        self.running_loop.close()
+        self.directory.cleanup()
+
+    def test_resumes_without_redoing_work(self):
+        pairs = [(str(number), constants.STEAM) for number in range(25)]
+
+        with JobQueue(self.path, checkpoint_every=5) as queue:
+            self.assertEqual(queue.add_players(pairs), 25)
+            client = FakeClient()
+            self.running_loop.run_until_complete(queue.run(client, concurrency=1, max_fetches=10))
+            self.assertEqual(queue.counts()["done"], 10)
+
+        with JobQueue(self.path) as queue:
+            # Adding the same players again does nothing
+            self.assertEqual(queue.add_players(pairs), 0)
+            self.assertEqual(queue.add_stats_leaderboards([constants.LEADERBOARD_WINS]), 1)
+
+            client = FakeClient()
+            self.assertEqual(self.running_loop.run_until_complete(queue.run(client)), 16)
+            self.assertEqual(sorted(client.requested_uids, key=int), [str(number) for number in range(10, 25)])
+
+            players = list(queue.results(KIND_PLAYER))
+            self.assertEqual([key for _, key, _ in players], pairs)
+            self.assertEqual(players[3][2].display_name, "Player 3")
+
+            (_, stat_type, leaderboard), = queue.results(KIND_STATS_LEADERBOARD)
+            self.assertEqual((stat_type, leaderboard[0].uid), (constants.LEADERBOARD_WINS, "top"))
+
+            progress = queue.progress()
+            self.assertEqual((progress["pending"], progress["finished_fraction"]), (0, 1.0))
+
+    def test_in_flight_work_is_redone_after_a_crash(self):
+        queue = JobQueue(self.path)
+        queue.add_players([("1", constants.STEAM), ("2", constants.PS4)])
+        queue._claim()
+        queue.checkpoint()
+        self.assertEqual(queue.counts()["in_flight"], 2)
+        # No close, like a crash
+        queue._connection.close()
+
+        with JobQueue(self.path) as queue:
+            self.assertEqual(queue.counts()["pending"], 2)
+
+    def test_failures_are_retried_then_recorded(self):
+        with JobQueue(self.path, max_attempts=2) as queue:
+            queue.add_players([("bad", constants.STEAM), ("missing", constants.STEAM)])
+            queue.players_per_request = 1
+            client = FakeClient(failing_uids=["bad"])
+
+            self.running_loop.run_until_complete(queue.run(client))
+
+            self.assertEqual(client.requested_uids.count("bad"), 2)
+            self.assertEqual(queue.counts(), {"pending": 0, "in_flight": 0, "done": 1, "failed": 1})
+            (kind, pair, error), = queue.failures()
+            self.assertEqual(pair, ("bad", constants.STEAM))
+            self.assertTrue(error.startswith("APIServerError"))
+            self.assertEqual([player for _, _, player in queue.results()], [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from rocket_snake import constants, leaderboards
+from rocket_snake.simulation import RateLimitSimulator
+
+WINS = (leaderboards.STATS, constants.LEADERBOARD_WINS)
+
+
+class Player(object):
+
+    def __init__(self, uid: str, wins: int):
+        self.uid = uid
+        self.platform = constants.STEAM
+        self.stats = {constants.LEADERBOARD_WINS: wins}
+        self.ranked_seasons = None
+
+
+class LeaderboardRanksTester(unittest.TestCase):
+
+    def test_rank_and_percentile(self):
+        ranks = leaderboards.LeaderboardRanks()
+        players = [Player(str(number), number * 10) for number in range(100)]
+        ranks.update(WINS, players)
+
+        self.assertEqual(ranks.rank(WINS, 990), 1)
+        self.assertEqual(ranks.rank(WINS, 10000), 1)
+        self.assertEqual(ranks.rank(WINS, 985), 2)
+        self.assertEqual(ranks.rank(WINS, -1), 101)
+        self.assertEqual(ranks.rank(WINS, players[50]), 50)
+        self.assertEqual(ranks.percentile(WINS, 495), 50)
+        self.assertIsNone(ranks.rank((leaderboards.STATS, constants.LEADERBOARD_GOALS), 5))
+
+    def test_incremental_updates(self):
+        ranks = leaderboards.LeaderboardRanks()
+        players = [Player(str(number), number * 10) for number in range(100)]
+        ranks.update(WINS, players)
+
+        # Some players leave, one enters, and some change, while the rest are the same objects
+        new_players = players[10:] + [Player("new", 5)] + [Player(player.uid, player.stats["wins"] + 1000)
+                                                           for player in players[:3]]
+        new_players = [player for player in new_players if player.uid not in {"0", "1", "2"} or
+                       player.stats["wins"] >= 1000]
+        ranks.update(WINS, new_players)
+
+        self.assertEqual(ranks.values(WINS), sorted(player.stats["wins"] for player in new_players))
+
+    def test_follows_refresher(self):
+        board = (leaderboards.RANKED, constants.RANKED_DUEL_ID)
+        results = []
+
+        async def refresh(client):
+            refresher = leaderboards.LeaderboardRefresher(client, boards=[board])
+            ranks = leaderboards.LeaderboardRanks(refresher)
+            await refresher.refresh(board)
+            # The simulated leaderboards aren't sorted
+            top_player = max(refresher.players(board),
+                             key=lambda player: leaderboards.rank_points(player, constants.RANKED_DUEL_ID))
+            results.append((ranks.rank(board, top_player), len(ranks.values(board))))
+
+        report = RateLimitSimulator().run([(0, refresh)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(results, [(1, 100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+from rocket_snake import constants, leaderboards
+from rocket_snake.data_classes import Player, player_key
+from rocket_snake.simulation import RateLimitSimulator
+
+
+def player(uid, wins, platform=constants.STEAM):
+    return Player(uid, "Player " + uid, platform, stats={"wins": wins})
+
+
+class MergedLeaderboardsTester(unittest.TestCase):
+
+    def test_top(self):
+        merged = leaderboards.MergedLeaderboards({
+            (leaderboards.STATS, constants.LEADERBOARD_WINS): [player("a", 10), player("b", 7), player("c", 7)],
+            (leaderboards.STATS, constants.LEADERBOARD_GOALS): [player("d", 9), player("e", None), player("f", 1)],
+        })
+
+        # Ties keep the order the players were first seen in, and players without a value are left out
+        self.assertEqual([top_player.uid for top_player in merged.top(4, constants.LEADERBOARD_WINS)],
+                         ["a", "d", "b", "c"])
+        self.assertEqual([top_player.uid for top_player in merged.top(10, constants.LEADERBOARD_WINS)],
+                         ["a", "d", "b", "c", "f"])
+        fewest_wins = merged.top(1, lambda p: None if p.stats["wins"] is None else -p.stats["wins"])
+        self.assertEqual([top_player.uid for top_player in fewest_wins], ["f"])
+
+    def test_players_are_merged_across_platform_names(self):
+        first = player("a", 10)
+        merged = leaderboards.MergedLeaderboards({
+            (leaderboards.STATS, constants.LEADERBOARD_WINS): [first],
+            # The api's platform names aren't the platform constants
+            (leaderboards.STATS, constants.LEADERBOARD_GOALS): [player("a", 10, platform="steam"),
+                                                               player("a", 3, platform=constants.PS4)],
+        })
+
+        self.assertEqual(len(merged), 2)
+        self.assertIs(merged.players[player_key("a", "STEAM")], first)
+        self.assertEqual([top_player.platform for top_player in merged.top(5, constants.LEADERBOARD_WINS)],
+                         [constants.STEAM, constants.PS4])
+
+    def test_get_all_leaderboards(self):
+        results = []
+
+        async def get_all_leaderboards(client):
+            results.append(await client.get_all_leaderboards(playlists=[constants.RANKED_DUEL_ID],
+                                                             stat_types=[constants.LEADERBOARD_WINS,
+                                                                         constants.LEADERBOARD_GOALS]))
+
+        report = RateLimitSimulator().run([(0, get_all_leaderboards)])
+
+        self.assertEqual(report["errors"], {})
+        merged = results[0]
+        # The simulated leaderboards all have the same 100 players
+        self.assertEqual(len(merged.boards), 3)
+        self.assertEqual(len(merged), 100)
+        for board_players in merged.boards.values():
+            for board_player in board_players:
+                self.assertIs(merged.players[player_key(board_player.uid, board_player.platform)], board_player)
+
+        top = merged.top(10, constants.LEADERBOARD_WINS)
+        wins = [top_player.stats["wins"] for top_player in top]
+        self.assertEqual(wins, sorted(wins, reverse=True))
+        self.assertEqual(wins[0], max(p.stats["wins"] for p in merged.players.values()))
+
+
+class DiffSnapshotsTester(unittest.TestCase):
+
+    board = (leaderboards.STATS, constants.LEADERBOARD_WINS)
+
+    def test_diff(self):
+        unchanged = player("a", 20)
+        old_players = [unchanged, player("b", 15), player("c", 10), player("gone", 5)]
+        new_players = [unchanged, player("c", 18), player("b", 15), player("new", 12)]
+
+        diff = leaderboards.diff_snapshots(self.board, old_players, new_players)
+
+        self.assertEqual(diff.board, self.board)
+        self.assertEqual([entered.uid for entered in diff.entered], ["new"])
+        self.assertEqual([exited.uid for exited in diff.exited], ["gone"])
+        self.assertEqual(diff.moved, {player_key("b", constants.STEAM): (2, 3),
+                                      player_key("c", constants.STEAM): (3, 2)})
+        self.assertEqual(diff.stat_deltas, {player_key("c", constants.STEAM): {"wins": 8}})
+
+    def test_first_snapshot(self):
+        new_players = [player("a", 20), player("b", 15)]
+        diff = leaderboards.diff_snapshots(self.board, (), new_players)
+
+        self.assertEqual(diff.entered, new_players)
+        self.assertEqual((diff.exited, diff.moved, diff.stat_deltas), ([], {}, {}))
+
+    def test_platform_names_are_the_same_player(self):
+        diff = leaderboards.diff_snapshots(self.board, [player("a", 20)], [player("a", 21, platform="steam")])
+
+        self.assertEqual((diff.entered, diff.exited, diff.moved), ([], [], {}))
+        self.assertEqual(diff.stat_deltas, {player_key("a", constants.STEAM): {"wins": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import unittest
+
+from rocket_snake import RLS_Client, monitoring
+
+
+class HistogramTester(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = monitoring.Histogram(bounds=(0.01, 0.1, 1))
+        for seconds in [0.005] * 50 + [0.05] * 40 + [0.5] * 9 + [3]:
+            histogram.add(seconds)
+
+        self.assertEqual(histogram.counts, [50, 40, 9, 1])
+        self.assertEqual((histogram.percentile(50), histogram.percentile(90), histogram.percentile(99)),
+                         (0.01, 0.1, 1))
+        # Percentiles in the last bucket, and bounds over the maximum, are the maximum
+        self.assertEqual(histogram.percentile(100), 3)
+        self.assertAlmostEqual(histogram.summary()["mean"], (0.25 + 2 + 4.5 + 3) / 100)
+
+    def test_empty(self):
+        self.assertEqual(monitoring.Histogram().summary(),
+                         {"count": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0})
+
+
+class LoopLagMonitorTester(unittest.TestCase):
+
+    def test_lag_is_attributed_to_phases(self):
+        monitor = monitoring.LoopLagMonitor(slow_seconds=0.01)
+        monitor.record_span(monitoring.PHASE_BUILD, 1.0, 1.5, "get_player")
+        monitor.record_span(monitoring.PHASE_DECODE, 2.0, 2.1, "get_player")
+        monitor.record_span(monitoring.PHASE_HTTP, 1.0, 1.5, "get_player")
+
+        monitor.add_lag(0.9, 1.6)
+        monitor.add_lag(3.0, 3.5)
+        monitor.add_lag(1.0, 1.005)
+
+        self.assertEqual(monitor.lag_phases, {monitoring.PHASE_BUILD: 1})
+        self.assertEqual(monitor.unattributed_lag, 1)
+        self.assertEqual(monitor.lag.count, 3)
+        self.assertEqual(monitor.slow_phases, {monitoring.PHASE_BUILD: 1, monitoring.PHASE_DECODE: 1})
+        self.assertIn("build 1", monitor.format_report())
+
+    def test_blocking_phase_causes_lag(self):
+        loop = asyncio.new_event_loop()
+        monitor = monitoring.LoopLagMonitor(interval_seconds=0.01, slow_seconds=0.02)
+
+        async def block():
+            await asyncio.sleep(0.005)
+            start = time.perf_counter()
+            time.sleep(0.1)
+            monitor.record_span(monitoring.PHASE_BUILD, start, time.perf_counter(), "get_player")
+            await asyncio.sleep(0.05)
+
+        try:
+            monitor.start(loop)
+            loop.run_until_complete(block())
+            monitor.stop()
+            loop.run_until_complete(asyncio.sleep(0))
+        finally:
+            loop.close()
+
+        self.assertGreaterEqual(monitor.lag.max, 0.05)
+        self.assertGreaterEqual(monitor.lag_phases.get(monitoring.PHASE_BUILD, 0), 1)
+
+    def test_started_by_requests_and_stopped_by_close(self):
+        loop = asyncio.new_event_loop()
+        client = RLS_Client(api_key="key", event_loop=loop, monitor=True)
+
+        async def request_func(*args, **kwargs):
+            return []
+
+        try:
+            self.assertFalse(client.monitor.running)
+            loop.run_until_complete(client._request(request_func))
+            self.assertTrue(client.monitor.running)
+
+            client.close()
+            loop.run_until_complete(asyncio.sleep(0))
+            self.assertFalse(client.monitor.running)
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
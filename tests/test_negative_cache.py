@@ -0,0 +1,80 @@
+import unittest
+
+from rocket_snake import constants
+from rocket_snake.negative_cache import NegativeCache
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer, default_responder
+
+MISSING = {"typo", "private"}
+
+
+def responder(method, endpoint, params, json_data):
+    """Like the default responder, but the players in MISSING don't exist."""
+    if endpoint.endswith("/player/batch"):
+        json_data = [entry for entry in json_data if entry["uniqueId"] not in MISSING]
+        return default_responder(method, endpoint, params, json_data) if json_data else None
+    if endpoint.endswith("/player") and params["unique_id"] in MISSING:
+        return None
+    return default_responder(method, endpoint, params, json_data)
+
+
+class NegativeCacheTester(unittest.TestCase):
+
+    def run_workload(self, workload, negative_cache):
+        server = SimulatedServer(responder=responder)
+        report = RateLimitSimulator(server=server, client_kwargs={"negative_cache": negative_cache}).run(
+                [(index, request_factory) for index, request_factory in enumerate(workload)])
+        return server, report
+
+    def test_missing_player_is_only_requested_once(self):
+        negative_cache = NegativeCache()
+        server, report = self.run_workload([lambda client: client.get_player("typo", constants.STEAM)] * 5,
+                                           negative_cache)
+
+        self.assertEqual(report["errors"], {"APINotFoundError": 5})
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(negative_cache.skipped, 4)
+
+    def test_batches_skip_missing_players(self):
+        batch = [("typo", constants.STEAM), ("found", constants.STEAM), ("private", constants.PS4)]
+        results = []
+        remembered = []
+
+        async def get_players(client):
+            results.append(await client.get_players(batch))
+            # The cache's times are virtual, so we check them during the simulation
+            remembered.append([pair in client.negative_cache for pair in batch])
+
+        negative_cache = NegativeCache()
+        server, report = self.run_workload([get_players] * 2, negative_cache)
+
+        self.assertEqual(report["succeeded"], 2)
+        self.assertEqual(negative_cache.skipped, 2)
+        for players in results:
+            self.assertEqual([player is None for player in players], [True, False, True])
+        self.assertEqual(remembered, [[True, False, True]] * 2)
+
+    def test_bounded_and_expiring(self):
+        negative_cache = NegativeCache(ttl_seconds=0, max_entries=2)
+        negative_cache.add("typo", constants.STEAM)
+        self.assertNotIn(("typo", constants.STEAM), negative_cache)
+
+        negative_cache.ttl_seconds = 60
+        for unique_id in ("a", "b", "c"):
+            negative_cache.add(unique_id, constants.STEAM)
+
+        self.assertEqual(len(negative_cache), 2)
+        self.assertNotIn(("a", constants.STEAM), negative_cache)
+        self.assertIn(("c", constants.STEAM), negative_cache)
+
+    def test_platforms_are_case_insensitive(self):
+        negative_cache = NegativeCache()
+        negative_cache.add("typo", constants.STEAM)
+        self.assertIn(("typo", constants.STEAM.upper()), negative_cache)
+
+        # Players from the api have the api's platform names
+        negative_cache.discard("typo", constants.STEAM.swapcase())
+        self.assertNotIn(("typo", constants.STEAM), negative_cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
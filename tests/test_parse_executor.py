@@ -0,0 +1,69 @@
+import asyncio
+import json
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from rocket_snake import basic_requests, constants
+from rocket_snake.client import _parse_players, _parse_search_page
+from rocket_snake.simulation import RateLimitSimulator, default_responder
+
+
+class ParseExecutorTester(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(max_workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def decode(self, response_text, parser, parse_executor):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(basic_requests._decode_response(
+                    loop, response_text, "endpoint", parser=parser, parse_executor=parse_executor))
+        finally:
+            loop.close()
+
+    def test_process_pool_parses_like_inline(self):
+        leaderboard_text = json.dumps(default_responder("get", "/v1/leaderboard/ranked", {}, None))
+        search_text = json.dumps(default_responder("get", "/v1/search/players", {"display_name": "x", "page": 0},
+                                                   None))
+        # The responses are long enough to be parsed in the executor
+        self.assertGreaterEqual(len(leaderboard_text), basic_requests.parse_offload_length)
+
+        inline = [player.to_dict() for player in self.decode(leaderboard_text, _parse_players, None)]
+        offloaded = [player.to_dict() for player in self.decode(leaderboard_text, _parse_players, self.executor)]
+        self.assertEqual(offloaded, inline)
+
+        old_offload_length = basic_requests.parse_offload_length
+        basic_requests.parse_offload_length = 0
+        try:
+            inline_page = self.decode(search_text, _parse_search_page, None)
+            offloaded_page = self.decode(search_text, _parse_search_page, self.executor)
+        finally:
+            basic_requests.parse_offload_length = old_offload_length
+
+        self.assertEqual([player.to_dict() for player in offloaded_page["data"]],
+                         [player.to_dict() for player in inline_page["data"]])
+        self.assertEqual({key: value for key, value in offloaded_page.items() if key != "data"},
+                         {key: value for key, value in inline_page.items() if key != "data"})
+
+    def test_client_with_process_pool(self):
+        results = []
+
+        async def get_leaderboard(client):
+            results.append([player.to_dict() for player in
+                            await client.get_ranked_leaderboard(constants.RANKED_DUEL_ID)])
+
+        inline_report = RateLimitSimulator().run([(0, get_leaderboard)])
+        offloaded_report = RateLimitSimulator(client_kwargs={"parse_executor": self.executor}).run(
+                [(0, get_leaderboard)])
+
+        self.assertEqual((inline_report["errors"], offloaded_report["errors"]), ({}, {}))
+        self.assertEqual(results[1], results[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from rocket_snake import constants
+from rocket_snake.player_cache import PlayerCache
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer, default_responder
+
+
+class PlayerCacheTester(unittest.TestCase):
+
+    def run_workload(self, workload, player_cache):
+        server = SimulatedServer()
+        report = RateLimitSimulator(server=server, client_kwargs={"player_cache": player_cache}).run(workload)
+        self.assertEqual(report["errors"], {})
+        return server
+
+    def test_leaderboard_players_are_harvested(self):
+        results = []
+
+        async def get_players(client):
+            results.append(await client.get_player("0", constants.STEAM))
+            results.extend(await client.get_players([("1", constants.STEAM), ("not on it", constants.STEAM)]))
+
+        player_cache = PlayerCache()
+        server = self.run_workload([(0, lambda client: client.get_ranked_leaderboard(constants.RANKED_DUEL_ID)),
+                                    (10, get_players)], player_cache)
+
+        # The leaderboard, and a batch with only the player who wasn't on it
+        self.assertEqual(server.requests, 2)
+        self.assertEqual([player.uid for player in results], ["0", "1", "not on it"])
+        self.assertEqual(player_cache.hits, 2)
+
+    def test_old_players_are_requested(self):
+        player_cache = PlayerCache(max_age_seconds=5)
+        server = self.run_workload([(0, lambda client: client.get_player("0", constants.STEAM)),
+                                    (2, lambda client: client.get_player("0", constants.STEAM)),
+                                    (20, lambda client: client.get_player("0", constants.STEAM))], player_cache)
+
+        self.assertEqual(server.requests, 2)
+
+    def test_missing_players_are_left_out(self):
+        results = []
+
+        def responder(method, endpoint, params, json_data):
+            # The api leaves out the players it can't find
+            return default_responder(method, endpoint, params,
+                                     [entry for entry in json_data or () if entry["uniqueId"] != "typo"])
+
+        async def get_players(client):
+            results.extend(await client.get_players([("typo", constants.STEAM), ("found", constants.PS4)]))
+            results.append(player_cache.get("found", constants.PS4))
+
+        player_cache = PlayerCache()
+        report = RateLimitSimulator(server=SimulatedServer(responder=responder),
+                                    client_kwargs={"player_cache": player_cache}).run([(0, get_players)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertIsNone(results[0])
+        self.assertEqual((results[1].uid, results[1].platform), ("found", constants.PS4))
+        self.assertIs(results[2], results[1])
+
+    def test_same_uid_on_several_platforms(self):
+        results = []
+
+        async def get_players(client):
+            results.extend(await client.get_players([("1", constants.STEAM), ("1", constants.PS4)]))
+            results.append(player_cache.get("1", constants.STEAM))
+            results.append(player_cache.get("1", constants.PS4))
+
+        player_cache = PlayerCache()
+        self.run_workload([(0, get_players)], player_cache)
+
+        self.assertEqual([player.platform for player in results[:2]], [constants.STEAM, constants.PS4])
+        self.assertIs(results[2], results[0])
+        self.assertIs(results[3], results[1])
+
+    def test_bounded(self):
+        player_cache = PlayerCache(max_players=2)
+
+        class Player(object):
+            def __init__(self, uid):
+                self.uid, self.platform = uid, constants.STEAM
+
+        for uid in ("a", "b", "c"):
+            player_cache.add(Player(uid), fetched_at=0)
+
+        self.assertEqual(len(player_cache), 2)
+        self.assertIsNone(player_cache.fetched_at("a", constants.STEAM))
+        self.assertEqual(player_cache.fetched_at("c", "steam"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
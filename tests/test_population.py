@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+from rocket_snake import RLS_Client, constants
+from rocket_snake.data_classes import Playlist
+from rocket_snake.population import PopulationSeries, PopulationTracker, RingBuffer
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer, default_responder
+
+
+class PopulationTester(unittest.TestCase):
+
+    def test_ring_buffer_overwrites_oldest(self):
+        ring = RingBuffer(3)
+        for time in range(5):
+            ring.append(time, time * 10)
+
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring[0], (2, 20))
+        self.assertEqual(ring[-1], (4, 40))
+        self.assertEqual(ring.range(3, None), [(3, 30), (4, 40)])
+        self.assertEqual(ring.range(None, 3), [(2, 20)])
+
+    def test_downsampling(self):
+        series = PopulationSeries(resolutions=((0, 4), (10, 4)))
+        for time in range(0, 30, 2):
+            series.add(time, time)
+
+        # The raw samples only go back 4 samples, so older queries use the 10 second averages
+        self.assertEqual(series.query(start=22), [(22, 22), (24, 24), (26, 26), (28, 28)])
+        self.assertEqual(series.query(start=0), [(0, 4), (10, 14), (20, 24)])
+        self.assertEqual(series.query(start=0, end=20, bucket_seconds=10), [(0, 4), (10, 14)])
+        self.assertFalse(series.add(28, 1))
+
+    def test_unchanged_populations_are_skipped(self):
+        tracker = PopulationTracker(client=None)
+
+        self.assertTrue(tracker.record(Playlist(10, "Ranked Duels", constants.STEAM, 100, 1000)))
+        self.assertFalse(tracker.record(Playlist(10, "Ranked Duels", constants.STEAM, 100, 1000)))
+        self.assertTrue(tracker.record(Playlist(10, "Ranked Duels", constants.STEAM, 120, 1060)))
+        self.assertTrue(tracker.record(Playlist(10, "Ranked Duels", constants.PS4, 50, 1000)))
+
+        self.assertEqual(tracker.query(10, constants.STEAM, bucket_seconds=0), [(1000, 100), (1060, 120)])
+        self.assertEqual((tracker.samples, tracker.skipped), (3, 1))
+
+    def test_poll(self):
+        loop = asyncio.new_event_loop()
+        client = RLS_Client(api_key="key", event_loop=loop)
+        raw_playlists = [{"id": 10, "name": "Ranked Duels", "platformId": 1,
+                          "population": {"players": 100, "updatedAt": 1000}}]
+
+        async def get_reference_data(name, force_request=False):
+            return raw_playlists
+
+        client._get_reference_data = get_reference_data
+        tracker = PopulationTracker(client)
+
+        try:
+            self.assertEqual(loop.run_until_complete(tracker.poll()), 1)
+            self.assertEqual(loop.run_until_complete(tracker.poll()), 0)
+        finally:
+            loop.close()
+
+        self.assertEqual(tracker.keys(), [(10, constants.STEAM)])
+
+    def test_poll_bypasses_response_cache(self):
+        polls = []
+
+        def responder(method, endpoint, params, json_data):
+            if endpoint.endswith("/data/playlists"):
+                polls.append(endpoint)
+                return [{"id": 10, "name": "Ranked Duels", "platformId": 1,
+                         "population": {"players": 100 * len(polls), "updatedAt": 1000 + len(polls)}}]
+            return default_responder(method, endpoint, params, json_data)
+
+        trackers = []
+
+        async def poll(client):
+            if not trackers:
+                trackers.append(PopulationTracker(client))
+            await trackers[0].poll()
+
+        report = RateLimitSimulator(server=SimulatedServer(responder=responder),
+                                    client_kwargs={"response_cache": True}).run([(time, poll) for time in range(5)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual((trackers[0].samples, trackers[0].skipped), (5, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
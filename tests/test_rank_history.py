@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from rocket_snake import constants
+from rocket_snake.data_classes import SeasonPlaylistRank
+from rocket_snake.rank_history import RankHistoryStore
+
+
+def rank(points, matches=10):
+    return SeasonPlaylistRank(rankPoints=points, division=1, matchesPlayed=matches, tier=None)
+
+
+class RankHistoryTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "history")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        with RankHistoryStore(self.path) as store:
+            self.assertTrue(store.append("1", constants.STEAM, 5, 10, rank(1000), timestamp=1))
+            # Unchanged ranks aren't recorded again
+            self.assertFalse(store.append("1", constants.STEAM, "5", "10", rank(1000), timestamp=2))
+            self.assertTrue(store.append("2", constants.PS4, 5, 10, rank(900), timestamp=3))
+            self.assertTrue(store.append("1", constants.STEAM, 5, 11, rank(800), timestamp=4))
+            self.assertTrue(store.append("1", constants.STEAM, 5, 10, rank(1020, 11), timestamp=5))
+
+            self.assertEqual(len(store), 4)
+            self.assertEqual([record.timestamp for record in store.query(start=3, end=5)], [3, 4])
+            self.assertEqual([record.rankPoints for record in store.history("1", constants.STEAM, playlist=10)],
+                             [1000, 1020])
+            latest = store.latest("1", constants.STEAM, "5", "10")
+            self.assertEqual((latest.rankPoints, latest.matchesPlayed, latest.tier), (1020, 11, None))
+
+            with self.assertRaises(ValueError):
+                store.append("1", constants.STEAM, 5, 10, rank(1100), timestamp=4)
+
+    def test_string_seasons_and_playlists(self):
+        with RankHistoryStore(self.path) as store:
+            store.append("1", constants.STEAM, "5", "10", rank(1000), timestamp=1)
+            store.append("1", constants.STEAM, "6", "10", rank(1100), timestamp=2)
+
+            self.assertEqual([record.season for record in store.history("1", constants.STEAM, season="5")], [5])
+            self.assertEqual([record.timestamp for record in store.query(season="6", playlist="10")], [2])
+
+    def test_reopen(self):
+        with RankHistoryStore(self.path) as store:
+            store.append("1", constants.STEAM, 5, 10, rank(1000), timestamp=1)
+
+        store = RankHistoryStore(self.path)
+        # These records aren't in the index, so they are caught up on when reopening
+        store.append("1", constants.STEAM, 5, 10, rank(1010), timestamp=2)
+        store.append("2", constants.STEAM, 5, 10, rank(900), timestamp=3)
+        store._records_file.flush()
+        store._players_file.flush()
+
+        reopened = RankHistoryStore(self.path)
+        try:
+            self.assertEqual(len(reopened), 3)
+            self.assertEqual([record.rankPoints for record in reopened.history("1", constants.STEAM)], [1000, 1010])
+            self.assertFalse(reopened.append("1", constants.STEAM, 5, 10, rank(1010), timestamp=4))
+            self.assertEqual(reopened.latest("2", constants.STEAM, 5, 10).rankPoints, 900)
+        finally:
+            reopened.close()
+            store.close()
+
+    def test_partial_records_are_truncated(self):
+        with RankHistoryStore(self.path) as store:
+            store.append("1", constants.STEAM, 5, 10, rank(1000), timestamp=1)
+            store.append("1", constants.STEAM, 5, 10, rank(1010), timestamp=2)
+
+        # A crash in the middle of writing a record
+        records_path = os.path.join(self.path, "records.bin")
+        with open(records_path, "ab") as records_file:
+            records_file.write(b"\0" * 7)
+
+        with RankHistoryStore(self.path) as store:
+            self.assertEqual(len(store), 2)
+            self.assertTrue(store.append("1", constants.STEAM, 5, 10, rank(1020), timestamp=3))
+            self.assertEqual([record.rankPoints for record in store.history("1", constants.STEAM)],
+                             [1000, 1010, 1020])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from rocket_snake import constants
+from rocket_snake.client import REFERENCE_SNAPSHOT_VERSION
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer, default_responder
+
+
+def raw_playlists(population):
+    return [{"id": 10, "name": "Ranked Duels", "platformId": 1,
+             "population": {"players": population, "updatedAt": 1000 + population}}]
+
+
+class ReferenceSnapshotTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "reference.json")
+        # If the server fails the reference data requests
+        self.failing = False
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_snapshot(self, playlists_age_seconds):
+        now = time.time()
+        with open(self.path, "w", encoding="utf-8") as snapshot_file:
+            json.dump({"version": REFERENCE_SNAPSHOT_VERSION, "api_version": 1, "saved_at": now,
+                       "fetched_at": {"platforms": now - 3600, "playlists": now - playlists_age_seconds,
+                                      "seasons": now - 3600, "tiers": now - 3600},
+                       "data": {"platforms": [{"id": 1, "name": "Steam"}], "playlists": raw_playlists(100),
+                                "seasons": [], "tiers": []}}, snapshot_file)
+
+    def responder(self, method, endpoint, params, json_data):
+        if "/data/" in endpoint:
+            if self.failing:
+                return None
+            if endpoint.endswith("/data/playlists"):
+                return raw_playlists(200)
+            if endpoint.endswith("/data/platforms"):
+                return [{"id": 1, "name": "Steam"}, {"id": 2, "name": "PS4"}]
+        return default_responder(method, endpoint, params, json_data)
+
+    def run_client(self, request_factory):
+        server = SimulatedServer(responder=self.responder)
+        report = RateLimitSimulator(server=server).run([(0, request_factory)])
+        self.assertEqual(report["errors"], {})
+        return server
+
+    def test_load(self):
+        self.write_snapshot(playlists_age_seconds=10)
+        results = []
+
+        async def get_reference_data(client):
+            self.assertTrue(client.load_reference_snapshot(self.path, refresh=False))
+            results.append(await client.get_platforms())
+            results.append(await client.get_playlists())
+
+        server = self.run_client(get_reference_data)
+
+        self.assertEqual(server.requests, 0)
+        self.assertEqual(results[0], [constants.STEAM])
+        self.assertEqual(results[1][0].population, 100)
+
+    def test_stale_playlists_are_requested(self):
+        self.write_snapshot(playlists_age_seconds=3600)
+        results = []
+
+        async def get_reference_data(client):
+            client.load_reference_snapshot(self.path, refresh=False)
+            results.append(await client.get_platforms())
+            results.append(await client.get_playlists())
+            # The requested playlists are fresh, so they are served from then on
+            results.append(await client.get_playlists())
+
+        server = self.run_client(get_reference_data)
+
+        # The platforms don't change, so they are still served from the snapshot
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(results[0], [constants.STEAM])
+        self.assertEqual([playlists[0].population for playlists in results[1:]], [200, 200])
+
+    def test_failed_refresh(self):
+        self.write_snapshot(playlists_age_seconds=10)
+        self.failing = True
+        results = []
+
+        async def refresh(client):
+            client.load_reference_snapshot(self.path)
+            await client._reference_refresh_task
+            results.append(await client.get_platforms())
+            results.append(await client.get_playlists())
+
+        self.run_client(refresh)
+
+        # The snapshot is still served, and hasn't been overwritten
+        self.assertEqual(results[0], [constants.STEAM])
+        self.assertEqual(results[1][0].population, 100)
+        with open(self.path, "r", encoding="utf-8") as snapshot_file:
+            self.assertEqual(json.load(snapshot_file)["data"]["playlists"], raw_playlists(100))
+
+    def test_refresh(self):
+        self.write_snapshot(playlists_age_seconds=10)
+        results = []
+
+        async def refresh(client):
+            client.load_reference_snapshot(self.path)
+            await client._reference_refresh_task
+            results.append(await client.get_platforms())
+
+        self.run_client(refresh)
+
+        self.assertEqual(results[0], [constants.STEAM, constants.PS4])
+        with open(self.path, "r", encoding="utf-8") as snapshot_file:
+            self.assertEqual(json.load(snapshot_file)["data"]["playlists"], raw_playlists(200))
+
+
+if __name__ == "__main__":
+    unittest.main()
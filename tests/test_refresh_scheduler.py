@@ -0,0 +1,105 @@
+import unittest
+
+from rocket_snake import basic_requests, constants
+from rocket_snake.player_cache import PlayerCache, RefreshScheduler
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer, default_responder
+
+
+class RefreshSchedulerTester(unittest.TestCase):
+
+    def test_popular_players_are_kept_fresh(self):
+        player_cache = PlayerCache(max_age_seconds=300)
+        server = SimulatedServer()
+        schedulers = []
+
+        async def fetch_players(client):
+            await client.get_players([(str(uid), constants.STEAM) for uid in range(10)])
+
+        async def start(client):
+            schedulers.append(RefreshScheduler(client, budget_fraction=0.5, min_age_seconds=30))
+            schedulers[0].start()
+
+        async def stop(client):
+            schedulers[0].stop()
+
+        workload = [(0, fetch_players), (0, start), (200, stop)]
+        workload.extend((time, lambda client: client.get_player("3", constants.STEAM)) for time in range(5, 200, 5))
+        report = RateLimitSimulator(server=server, client_kwargs={"player_cache": player_cache}).run(workload)
+
+        self.assertEqual(report["errors"], {})
+        # Only the popular player is refreshed, about once per min_age_seconds
+        self.assertGreater(player_cache.fetched_at("3", constants.STEAM), 150)
+        self.assertLess(player_cache.fetched_at("4", constants.STEAM), 10)
+        self.assertEqual(server.requests, 1 + schedulers[0].requests)
+        self.assertIn(schedulers[0].refreshed, range(5, 8))
+
+    def test_leaderboard_players_are_refreshed(self):
+        def responder(method, endpoint, params, json_data):
+            data = default_responder(method, endpoint, params, json_data)
+            if "/leaderboard/" in endpoint:
+                # The api's platform names aren't the platform constants
+                for raw_player in data:
+                    raw_player["platform"] = {"id": constants.STEAM_ID, "name": "steam"}
+            return data
+
+        player_cache = PlayerCache()
+        refreshed = []
+
+        async def refresh(client):
+            await client.get_ranked_leaderboard(constants.RANKED_DUEL_ID)
+            player_cache.get("0", constants.STEAM)
+            refreshed.append(await RefreshScheduler(client, min_age_seconds=0).refresh())
+
+        report = RateLimitSimulator(server=SimulatedServer(responder=responder),
+                                    client_kwargs={"player_cache": player_cache}).run([(0, refresh)])
+
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(refreshed, [1])
+
+    def test_unexpected_errors_dont_stop_refreshing(self):
+        player_cache = PlayerCache()
+        schedulers = []
+
+        async def start(client):
+            await client.get_player("0", constants.STEAM)
+            schedulers.append(RefreshScheduler(client, min_age_seconds=0))
+
+            async def broken_refresh():
+                raise KeyError("broken")
+
+            schedulers[0].refresh = broken_refresh
+            schedulers[0].start()
+
+        async def check(client):
+            self.assertTrue(schedulers[0].running)
+            self.assertIsInstance(schedulers[0].last_error, KeyError)
+            schedulers[0].stop()
+
+        with self.assertLogs("rocket_snake.player_cache", "ERROR"):
+            report = RateLimitSimulator(client_kwargs={"player_cache": player_cache}).run([(0, start), (20, check)])
+
+        self.assertEqual(report["errors"], {})
+
+    def test_value_is_staleness_times_popularity(self):
+        player_cache = PlayerCache(max_age_seconds=100, popularity_half_life_seconds=1e9)
+
+        class Player(object):
+            def __init__(self, uid):
+                self.uid, self.platform = uid, constants.STEAM
+
+        now = basic_requests.clock()
+        for uid, age in (("old", 90), ("new", 10), ("unused", 100)):
+            player_cache.add(Player(uid), fetched_at=now - age)
+        for _ in range(2):
+            player_cache.get("old", constants.STEAM)
+        for _ in range(10):
+            player_cache.get("new", constants.STEAM)
+
+        # 0.9 * 2 for old, 0.1 * 10 for new, and unused has never been looked up
+        self.assertEqual([player.uid for player in player_cache.most_valuable(10, min_age_seconds=0)],
+                         ["old", "new"])
+        self.assertEqual([player.uid for player in player_cache.most_valuable(10, min_age_seconds=50)], ["old"])
+
+
+if __name__ == "__main__":
+    unittest.main()
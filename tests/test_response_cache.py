@@ -0,0 +1,147 @@
+import asyncio
+import json
+import tempfile
+import unittest
+
+from aiohttp import web
+
+from rocket_snake import basic_requests
+from rocket_snake.response_cache import DiskBackend, MemoryBackend, ResponseCache
+
+LEADERBOARD = [{"uniqueId": "1", "displayName": "First"}, {"uniqueId": "2", "displayName": "Second"}]
+
+
+class FlakyServer(object):
+    """A stand-in for the api, that responds with the status codes it's told to (200 if it runs out)."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = 0
+
+    async def handle_leaderboard(self, request):
+        self.requests += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            return web.Response(status=status, text="Error")
+        return web.json_response(LEADERBOARD)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/v1/leaderboard/stat", self.handle_leaderboard)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return "http://{0}:{1}/v".format(*self.runner.addresses[0][:2])
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class ResponseCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.running_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.running_loop)
+        self.old_api_url = basic_requests.api_url
+
+    def tearDown(self):
+        basic_requests.api_url = self.old_api_url
+        self.running_loop.close()
+
+    def run_with_server(self, server, coro_func):
+        async def wrapper():
+            basic_requests.api_url = await server.start()
+            try:
+                return await coro_func()
+            finally:
+                await server.stop()
+
+        return self.running_loop.run_until_complete(wrapper())
+
+    def get_leaderboard(self, cache):
+        return basic_requests.get_stats_leaderboard("wins", api_key="key", loop=self.running_loop, cache=cache)
+
+    def test_fresh_responses_are_reused(self):
+        server = FlakyServer()
+        cache = ResponseCache()
+
+        async def requests():
+            return [await self.get_leaderboard(cache) for _ in range(3)]
+
+        results = self.run_with_server(server, requests)
+
+        self.assertEqual(results, [LEADERBOARD] * 3)
+        self.assertEqual(server.requests, 1)
+        self.assertEqual(cache.stats["hits"], 2)
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_bypassed_cache_is_updated(self):
+        server = FlakyServer()
+        cache = ResponseCache()
+
+        async def requests():
+            await self.get_leaderboard(cache)
+            await basic_requests.get_stats_leaderboard("wins", api_key="key", loop=self.running_loop, cache=cache,
+                                                       bypass_cache=True)
+            await self.get_leaderboard(cache)
+
+        self.run_with_server(server, requests)
+
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(cache.stats["stores"], 2)
+        self.assertEqual((cache.stats["hits"], cache.stats["misses"]), (1, 1))
+
+    def test_stale_responses_are_served_on_errors(self):
+        server = FlakyServer(statuses=(200, 503, 404))
+        cache = ResponseCache(ttls={"leaderboard": 0})
+
+        async def requests():
+            first = await self.get_leaderboard(cache)
+            second = await self.get_leaderboard(cache)
+            with self.assertRaises(basic_requests.custom_exceptions.APINotFoundError):
+                await self.get_leaderboard(cache)
+            return first, second
+
+        first, second = self.run_with_server(server, requests)
+
+        self.assertEqual(first, second)
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(cache.stats["stale_hits"], 1)
+
+    def test_stale_responses_not_served_when_disabled(self):
+        server = FlakyServer(statuses=(200, 503))
+        cache = ResponseCache(ttls={"leaderboard": 0}, serve_stale=False)
+
+        async def requests():
+            await self.get_leaderboard(cache)
+            with self.assertRaises(basic_requests.custom_exceptions.APIBadResponseCodeError):
+                await self.get_leaderboard(cache)
+
+        self.run_with_server(server, requests)
+
+    def test_memory_backend_byte_limit(self):
+        backend = MemoryBackend(max_bytes=10)
+        backend.set("a", 0, b"12345")
+        backend.set("b", 0, b"12345")
+        backend.get("a")
+        backend.set("c", 0, b"123")
+
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), (0, b"12345"))
+        self.assertLessEqual(backend.size_bytes, 10)
+        self.assertEqual(backend.evictions, 1)
+
+    def test_disk_backend_round_trip(self):
+        body = json.dumps(LEADERBOARD * 100).encode("utf-8")
+
+        with tempfile.TemporaryDirectory() as directory:
+            DiskBackend(directory).set(("1/leaderboard/stat", (("type", "wins"),), None), 12.5, body)
+
+            self.assertEqual(DiskBackend(directory).get(("1/leaderboard/stat", (("type", "wins"),), None)),
+                             (12.5, body))
+            self.assertIsNone(DiskBackend(directory).get(("1/leaderboard/stat", (("type", "goals"),), None)))
+
+
+if __name__ == "__main__":
+    unittest.main()
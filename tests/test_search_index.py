@@ -0,0 +1,71 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from rocket_snake import RLS_Client, constants
+from rocket_snake.data_classes import Player
+from rocket_snake.search_index import PlayerSearchIndex
+
+
+class PlayerSearchIndexTester(unittest.TestCase):
+
+    def test_search(self):
+        index = PlayerSearchIndex()
+        for uid, name in (("1", "Kaydop"), ("2", "kay"), ("3", "Kaiser"), ("4", "Other")):
+            index.add(Player(uid, name, constants.STEAM))
+
+        # Exact matches come first, then the prefix matches in alphabetical order
+        self.assertEqual([player.uid for player in index.search("KAY")], ["2", "1"])
+        self.assertEqual([player.uid for player in index.search("kay", prefix=False)], ["2"])
+        self.assertEqual([player.uid for player in index.search("k", limit=2)], ["3", "2"])
+        self.assertEqual(index.search("nobody"), [])
+
+    def test_players_are_replaced(self):
+        index = PlayerSearchIndex()
+        index.add(Player("1", "Old Name", constants.STEAM))
+        # The api's platform names are the same platform
+        index.add(Player("1", "New Name", "steam"))
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.search("old"), [])
+        self.assertEqual([player.display_name for player in index.search("new")], ["New Name"])
+
+        index.remove(Player("1", None, constants.STEAM))
+        self.assertEqual((len(index), index.search("new")), (0, []))
+
+    def test_bounded(self):
+        index = PlayerSearchIndex(max_players=2)
+        for uid in ("a", "b", "c"):
+            index.add(Player(uid, "Player " + uid, constants.STEAM))
+        # Adding a player again makes it the most recent one
+        index.add(Player("b", "Player b", constants.STEAM))
+        index.add(Player("d", "Player d", constants.STEAM))
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual([player.uid for player in index.search("player")], ["b", "d"])
+
+    def test_save_and_load(self):
+        index = PlayerSearchIndex()
+        index.add(Player("1", "Kaydop", constants.STEAM, avatar_url="avatar", stats={"wins": 1}))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.json")
+            index.save(path)
+            loaded = PlayerSearchIndex.load(path)
+
+        player = loaded.search("kaydop")[0]
+        self.assertEqual((player.uid, player.platform, player.avatar_url, player.stats),
+                         ("1", constants.STEAM, "avatar", None))
+
+    def test_empty_index_is_used_by_the_client(self):
+        index = PlayerSearchIndex()
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertIs(RLS_Client(api_key="key", event_loop=loop, search_index=index).search_index, index)
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import pickle
+import unittest
+
+from rocket_snake import data_classes, serialization
+from rocket_snake.constants import ID_PLATFORM_LUT, LEADERBOARD_TYPES, RANKED_PLAYLISTS_IDS
+
+
+def make_raw_player(number: int):
+    """Creates player data in the same form as the api returns it."""
+    return {
+        "uniqueId": str(76561198000000000 + number),
+        "displayName": "Player {0}".format(number),
+        "platform": {"id": 1, "name": "Steam"},
+        "avatar": "https://example.com/avatar/{0}.jpg".format(number),
+        "profileUrl": "https://rocketleaguestats.com/profile/steam/{0}".format(number),
+        "signatureUrl": "https://signature.rocketleaguestats.com/normal/steam/{0}.png".format(number),
+        "stats": {stat_type: number * 7 % 1000 for stat_type in sorted(LEADERBOARD_TYPES)},
+        "rankedSeasons": {str(season_id): {str(playlist_id): {"rankPoints": 500 + number % 900 + playlist_id,
+                                                               "division": number % 4, "matchesPlayed": number % 300,
+                                                               "tier": number % 16}
+                                           for playlist_id in sorted(RANKED_PLAYLISTS_IDS)}
+                          for season_id in (4, 5)},
+    }
+
+
+class SerializationTester(unittest.TestCase):
+
+    def setUp(self):
+        self.raw_players = [make_raw_player(number) for number in range(1000)]
+        self.players = [data_classes.Player.from_raw(raw_player_data) for raw_player_data in self.raw_players]
+
+    def test_player_round_trip(self):
+        player = self.players[3]
+        loaded = serialization.loads(serialization.dumps(player))
+
+        self.assertEqual(loaded.to_dict(), player.to_dict())
+        self.assertEqual(loaded.platform_id, player.platform_id)
+        self.assertEqual(loaded.ranked_seasons["5"]["10"], player.ranked_seasons["5"]["10"])
+        self.assertIsInstance(loaded.ranked_seasons["5"]["10"], data_classes.SeasonPlaylistRank)
+
+    def test_partial_player_round_trip(self):
+        player = data_classes.Player("SomeGamertag", "Some Gamertag", ID_PLATFORM_LUT[3])
+        self.assertEqual(serialization.loads(serialization.dumps(player)).to_dict(), player.to_dict())
+
+    def test_reference_data_round_trip(self):
+        objs = [data_classes.Tier(1, "Bronze I"), data_classes.Season(5, True, 1490000000, None),
+                data_classes.Playlist(10, "Ranked Duels", "PS4", 1234, 1500000000),
+                self.players[0].ranked_seasons]
+        loaded = serialization.loads_many(serialization.dumps_many(objs))
+
+        self.assertEqual(loaded[:3], objs[:3])
+        self.assertIsInstance(loaded[0], data_classes.Tier)
+        self.assertEqual(loaded[3].to_dict(), objs[3].to_dict())
+
+    def test_dict_round_trip(self):
+        player = self.players[5]
+        self.assertEqual(data_classes.Player.from_dict(json.loads(json.dumps(player.to_dict()))).to_dict(),
+                         player.to_dict())
+
+    def test_bad_data(self):
+        data = serialization.dumps(self.players[0])
+
+        with self.assertRaises(ValueError):
+            serialization.loads(b"not serialized data")
+        with self.assertRaises(ValueError):
+            serialization.loads_many(data)
+        with self.assertRaises(ValueError):
+            serialization.loads(data[:4] + bytes([serialization.FORMAT_VERSION + 1]) + data[5:])
+        with self.assertRaises(TypeError):
+            serialization.dumps({"not": "a player"})
+
+    def test_pickle_still_works(self):
+        loaded = pickle.loads(pickle.dumps(self.players[0]))
+        self.assertEqual(loaded.to_dict(), self.players[0].to_dict())
+
+    def test_size(self):
+        """The serialized players are smaller than both pickle and the api's JSON."""
+        ours = serialization.dumps_many(self.players)
+
+        self.assertLess(len(ours), len(pickle.dumps(self.players, pickle.HIGHEST_PROTOCOL)))
+        self.assertLess(len(ours), len(json.dumps(self.raw_players).encode("utf-8")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from rocket_snake import basic_requests, constants
+from rocket_snake.simulation import RateLimitSimulator, SimulatedServer, constant_rate_workload
+
+
+def get_player(client):
+    return client.get_player("76561198033338223", constants.STEAM)
+
+
+class RateLimitSimulatorTester(unittest.TestCase):
+
+    def test_default_spacing_is_never_rate_limited(self):
+        report = RateLimitSimulator().run(constant_rate_workload(get_player, 10, 100))
+
+        self.assertEqual(report["succeeded"], 100)
+        self.assertEqual(report["rate_limited"], 0)
+        # The server allows 2 requests per second
+        self.assertLessEqual(report["http_throughput"], 2)
+
+    def test_too_small_spacing_is_rate_limited(self):
+        report = RateLimitSimulator(throughput_time_seconds=0.1).run(constant_rate_workload(get_player, 10, 100))
+
+        self.assertGreater(report["rate_limited"], 0)
+        self.assertEqual(report["errors"]["RateLimitError"], report["rate_limited"])
+
+    def test_runs_are_fast_and_repeatable(self):
+        workload = constant_rate_workload(get_player, 10, 100) + \
+            constant_rate_workload(lambda client: client.get_ranked_leaderboard(constants.RANKED_DUEL_ID), 1, 5)
+
+        start = time.perf_counter()
+        first = RateLimitSimulator(server=SimulatedServer(seed=1)).run(workload)
+        second = RateLimitSimulator(server=SimulatedServer(seed=1)).run(workload)
+
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertGreater(first["duration_seconds"], 60)
+        self.assertEqual(first, second)
+
+    def test_restores_basic_requests(self):
+        old_settings = (basic_requests.clock, basic_requests.session_factory, basic_requests.throughput_time_seconds)
+
+        RateLimitSimulator(throughput_time_seconds=0.2).run(constant_rate_workload(get_player, 1, 2))
+
+        self.assertEqual(old_settings,
+                         (basic_requests.clock, basic_requests.session_factory, basic_requests.throughput_time_seconds))
+
+    def test_parse_executor(self):
+        old_offload_length = basic_requests.parse_offload_length
+        # Every response is parsed in the executor
+        basic_requests.parse_offload_length = 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                report = RateLimitSimulator(client_kwargs={"parse_executor": executor}).run(
+                        constant_rate_workload(lambda client: client.get_ranked_leaderboard(constants.RANKED_DUEL_ID),
+                                               10, 5))
+        finally:
+            basic_requests.parse_offload_length = old_offload_length
+
+        # The virtual clock doesn't move while the executor works, so the requests don't time out
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(report["succeeded"], 5)
+        self.assertLess(report["latency"]["max"], 5)
+
@@ -0,0 +1,57 @@
+import unittest
+
+from rocket_snake import tiers
+from rocket_snake.data_classes import Tier
+from rocket_snake.tiers import TierResolutionTable, TierResolver
+
+TIERS = [Tier(tier_id, "Tier {0}".format(tier_id)) for tier_id in range(20)]
+
+
+class TierResolverTester(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = TierResolver(TIERS)
+        for rank_points, tier in ((1000, 15), (1040, 15), (1100, 16), (1150, 16), (1300, 17), (1500, 17)):
+            self.resolver.observe("5", "10", rank_points, tier)
+
+    def test_resolves_across_boundaries(self):
+        # The limits are halfway between the observed points of neighbouring tiers
+        self.assertEqual([self.resolver.resolve(5, 10, points) for points in (1040, 1070, 1071, 1225, 1226, 2000)],
+                         [15, 15, 16, 16, 17, 17])
+        self.assertEqual(self.resolver.resolve_name(5, 10, 1100), "Tier 16")
+        self.assertEqual(list(self.resolver.resolve_many(5, 10, [1070, 1071, 1300])), [15, 16, 17])
+
+    def test_sparse_data(self):
+        # Only the top tiers have been observed, so lower points can't be resolved
+        self.assertIsNone(self.resolver.resolve(5, 10, 500))
+        self.assertIsNone(self.resolver.resolve_name(5, 10, 500))
+        self.assertEqual(list(self.resolver.resolve_many(5, 10, [500, 1000])), [-1, 15])
+
+        with self.assertRaises(KeyError):
+            self.resolver.resolve(5, 11, 1000)
+
+    def test_list_lookups_without_numpy(self):
+        old_numpy = tiers.numpy
+        tiers.numpy = None
+        try:
+            table = TierResolutionTable(5, 10, [100, 200], [3, 4], {tier.id: tier.name for tier in TIERS})
+            self.assertEqual(table.lookup_many([50, 150, 250]), [None, 3, 4])
+        finally:
+            tiers.numpy = old_numpy
+
+    def test_lowest_tier_is_open_below(self):
+        table = TierResolutionTable.from_observations(5, 10, {0: (0, 100), 1: (150, 200)}, {0: "Unranked", 1: "B1"})
+
+        self.assertEqual(table.lookup(-50), 0)
+        self.assertEqual(table.lookup(126), 1)
+
+    def test_tiers_are_ordered_by_points(self):
+        # The tier ids don't have to ascend with the rank points
+        table = TierResolutionTable.from_observations(5, 10, {1: (500, 600), 2: (100, 200), 3: (300, 400)})
+
+        self.assertEqual(table.tier_ids, [2, 3, 1])
+        self.assertEqual([table.lookup(points) for points in (150, 250, 251, 450, 451, 1000)], [2, 2, 3, 3, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from rocket_snake import constants, data_classes, monitoring
+from rocket_snake.simulation import RateLimitSimulator
+
+
+class TracingTester(unittest.TestCase):
+
+    def test_spans_of_each_request(self):
+        spans = []
+
+        async def get_players(client):
+            client.add_trace_hook(spans.append)
+            await client.get_player("1", constants.STEAM)
+            await client.get_players([("2", constants.STEAM), ("3", constants.STEAM)])
+
+        report = RateLimitSimulator().run([(0, get_players)])
+
+        self.assertEqual(report["errors"], {})
+        phases = [monitoring.PHASE_QUEUE, monitoring.PHASE_TTFB, monitoring.PHASE_BODY, monitoring.PHASE_HTTP,
+                  monitoring.PHASE_DECODE, monitoring.PHASE_BUILD, monitoring.PHASE_REQUEST]
+        self.assertEqual([span.phase for span in spans], phases * 2)
+        self.assertEqual({span.request_id for span in spans[:len(phases)]}, {0})
+        self.assertEqual({span.endpoint for span in spans[len(phases):]}, {"get_player_batch"})
+        for span in spans:
+            self.assertLessEqual(span.start, span.end)
+
+    def test_slow_request_log(self):
+        logs = []
+
+        async def get_player(client):
+            logs.append(client.slow_request_log)
+            await client.get_player("1", constants.STEAM)
+
+        # The second request waits for the rate limiting, so it's slow
+        with self.assertLogs("rocket_snake.monitoring", "WARNING"):
+            RateLimitSimulator(throughput_time_seconds=2,
+                               client_kwargs={"slow_request_seconds": 1}).run([(0, get_player), (0, get_player)])
+
+        slow_requests = logs[0].entries
+        self.assertEqual(len(slow_requests), 1)
+        request_span, phase_spans = slow_requests[0]
+        self.assertGreaterEqual(request_span.end - request_span.start, 1)
+        self.assertIn(monitoring.PHASE_QUEUE, {span.phase for span in phase_spans})
+
+    def test_merged_leaderboards_are_traced_as_requests(self):
+        logs = []
+
+        async def get_all_leaderboards(client):
+            logs.append(client.slow_request_log)
+            await client.get_all_leaderboards()
+
+        report = RateLimitSimulator(client_kwargs={"slow_request_seconds": 1}).run(
+                [(time, get_all_leaderboards) for time in range(5)])
+
+        self.assertEqual(report["errors"], {})
+        # Every span has been collected by a request span
+        self.assertEqual(logs[0]._pending, {})
+
+    def test_slow_request_log_ignores_spans_without_requests(self):
+        slow_request_log = monitoring.SlowRequestLog()
+        slow_request_log(data_classes.TraceSpan(monitoring.PHASE_BUILD, 0, 1, "endpoint", None))
+
+        self.assertEqual(slow_request_log._pending, {})
+
+
+if __name__ == "__main__":
+    unittest.main()